@@ -0,0 +1,403 @@
+"""
+Benchmarks of the transformer, the recording probes, an instrumented app
+and the GUI's type table, e.g.
+
+    python benchmarks.py                    runs them all and compares with the last saved run
+    python benchmarks.py --save             also keeps this run in .benchmarks/results.jsonl
+    python benchmarks.py -k transform       only the benchmarks whose name contains 'transform'
+
+Every result is the best of a few repeats, in seconds.  Runs are saved with
+the commit they were run on; comparisons only use runs from the same
+machine and Python, and report results that got slower by more than the
+threshold (exit code 1), so the suite can gate a CI job.
+"""
+from rtti import Rtti
+from rtti_importer import instrument_source
+from rtti_transformer import RttiTransformer, RttiLoopTransformer, rtti_globals, record_rtti
+import argparse
+import ast
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+results_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.benchmarks', 'results.jsonl')
+benchmarks = {}
+
+def benchmark(function):
+    # Registers a benchmark; it returns {result name: seconds}
+    benchmarks[function.__name__.removeprefix('bench_')] = function
+    return function
+
+
+def best_of(function, repeat=5, number=1):
+    return min(timeit.repeat(function, repeat=repeat, number=number)) / number
+
+
+def nested_module_source(line_count: int, depth=8):
+    # Functions of If / For / While blocks nested depth deep, with assignments at every level
+    lines = []
+    k = 0
+    while len(lines) < line_count:
+        lines.append(f'def f{k}(a, items):')
+        indent = '    '
+        for level in range(depth):
+            lines.append(f'{indent}x{level} = a + {level}')
+            lines.append(f'{indent}{("if a > 0:", "for item in items:", "while a < 0:")[level % 3]}')
+            indent += '    '
+            lines.append(f'{indent}y{level} = [x{level}]')
+        lines.append(f'{indent}return a')
+        k += 1
+    return '\n'.join(lines) + '\n'
+
+
+@benchmark
+def bench_transform():
+    results = {}
+    for line_count in (1000, 10000, 50000):
+        source = nested_module_source(line_count)
+        trees = [ast.parse(source) for _ in range(3)]
+        results[f'{line_count} lines'] = best_of(lambda: RttiTransformer('bench.py').visit(trees.pop()), repeat=3)
+    return results
+
+
+@benchmark
+def bench_probe():
+    # Per iteration of a tight loop assigning an int (and a list), instrumented minus plain
+    iterations = 200000
+    source = f'for i in range({iterations}):\n    x = i\n    y = [i]\n'
+    plain = compile(source, 'bench_probe.py', 'exec')
+    instrumented = instrument_source(source.encode(), 'bench_probe.py')
+    plain_time = best_of(lambda: exec(plain, {}))
+
+    results = {}
+    for label, saturation in (('site probe', 0), ('site probe, adaptive', 1000)):
+        Rtti.set_adaptive(saturation=saturation)
+        instrumented_time = best_of(lambda: exec(instrumented, rtti_globals()))
+        results[label] = (instrumented_time - plain_time) / iterations / 2
+    Rtti.set_adaptive(saturation=0)
+
+    # The loop's countdown test once its first iterations were recorded
+    hoisted = instrument_source(source.encode(), 'bench_probe.py', RttiLoopTransformer)
+    results['hoisted loop probe'] = (best_of(lambda: exec(hoisted, rtti_globals())) - plain_time) / iterations / 2
+
+    # The name-list probe the site tables replaced, for reference
+    results['record_rtti'] = best_of(lambda: record_rtti(1, ['bench.pyx']), number=100000) - \
+        best_of(lambda: 1, number=100000)
+    return results
+
+
+sample_app_source = """
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel, QPushButton
+from PyQt6.QtCore import QTimer
+
+class Counter(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.labels = []
+        layout = QVBoxLayout(self)
+        for k in range(50):
+            label = QLabel(str(k))
+            layout.addWidget(label)
+            self.labels.append(label)
+        button = QPushButton('Count')
+        layout.addWidget(button)
+
+    def count(self, n):
+        total = 0
+        for k in range(n):
+            value = k * 2
+            total = total + value
+        text = str(total)
+        self.labels[0].setText(text)
+        return total
+
+app = QApplication([])
+window = Counter()
+window.show()
+for k in range(20):
+    window.count(10000)
+QTimer.singleShot(0, app.quit)
+app.exec()
+"""
+
+@benchmark
+def bench_app():
+    # A small PyQt app, whole process, on the offscreen platform
+    importer_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rtti_importer.py')
+    environment = {**os.environ, 'QT_QPA_PLATFORM': 'offscreen'}
+    with tempfile.TemporaryDirectory() as app_folder:
+        app_filename = os.path.join(app_folder, 'main.py')
+        with open(app_filename, 'w') as app_file:
+            app_file.write(sample_app_source)
+
+        def run(*arguments):
+            subprocess.run([sys.executable, *arguments], env=environment, cwd=app_folder, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        return {
+            'plain': best_of(lambda: run(app_filename), repeat=3),
+            'instrumented': best_of(lambda: run(importer_script, app_filename), repeat=3),
+            'instrumented, hoisted loop probes': best_of(lambda: run(importer_script, app_filename,
+                                                                     '--hoist-loop-probes'), repeat=3),
+        }
+
+
+@benchmark
+def bench_type_table():
+    from rtti_table import RttiTypeTable
+    from rtti_type_model import RttiTypeModel
+
+    scoped_names = [f'module{k // 100}.pyf{k % 100}x' for k in range(100000)]
+
+    def fill():
+        table = RttiTypeTable()
+        type_ids = table.intern_types(['builtins.int', 'builtins.str', 'builtins.list[builtins.int]'])
+        for row in table.add_sites(scoped_names):
+            table.add_type(row, type_ids[row % 3])
+        return table
+
+    # The type tab's models on a view, as the main window wires them, on the offscreen platform
+    from PyQt6.QtWidgets import QApplication, QTableView
+    from rtti_type_model import RttiTypeFilterModel
+    if QApplication.instance() is None:
+        os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+    app = QApplication.instance() or QApplication([])
+    view = QTableView()
+    view.resize(1200, 800)
+    view.show()
+
+    def fill_view():
+        # Up to the first layout and paint of the visible rows
+        type_filter = RttiTypeFilterModel(parent=view)
+        type_filter.setSourceModel(RttiTypeModel(fill(), parent=type_filter))
+        old_filter = view.model()
+        view.setModel(type_filter)
+        view.doItemsLayout()
+        view.grab()
+        if old_filter is not None:
+            old_filter.deleteLater()
+        app.processEvents()
+
+    table = fill()
+    model = RttiTypeModel(table)
+    return {
+        'fill 100k rows': best_of(fill, repeat=3),
+        'sort 100k rows': best_of(lambda: model.sort(1), repeat=3),
+        'save 100k rows': best_of(table.to_bytes, repeat=3),
+        'view 100k rows': best_of(fill_view, repeat=3),
+    }
+
+
+def branchy_function_source(signature='f(a)', indent='', branch_count=50):
+    # A function of if / else blocks each assigning a local of its own
+    lines = [f'{indent}def {signature}:']
+    for i in range(branch_count):
+        lines += [f'{indent}    if a > {i}:', f'{indent}        x{i} = a + {i}',
+                  f'{indent}    else:', f'{indent}        x{i} = a - {i}']
+    lines.append(f'{indent}    return a')
+    return '\n'.join(lines) + '\n'
+
+
+def write_modules(folder: str, module_count: int, module_source):
+    # module{k}.py for every k, module_source(k) being its source
+    for k in range(module_count):
+        with open(os.path.join(folder, f'module{k}.py'), 'w') as module_file:
+            module_file.write(module_source(k))
+
+
+@benchmark
+def bench_code_cache():
+    # Importing a generated package through the import hook, transforming every module and then from the cache
+    from rtti_cache import RttiCodeCache
+    from rtti_importer import RttiImportFinder
+    import importlib
+
+    module_count = 100
+    results = {}
+    with tempfile.TemporaryDirectory() as project_root:
+        package_dir = os.path.join(project_root, 'bench_app')
+        os.makedirs(package_dir)
+        open(os.path.join(package_dir, '__init__.py'), 'w').close()
+        write_modules(package_dir, module_count, lambda k: branchy_function_source() * 4)
+
+        cache = RttiCodeCache(project_root)
+        sys.path.insert(0, project_root)
+        try:
+            for label in ('cold', 'warm'):
+                finder = RttiImportFinder(project_root, cache=cache)
+                finder.install()
+                start = time.perf_counter()
+                for k in range(module_count):
+                    importlib.import_module(f'bench_app.module{k}')
+                results[f'{label}, {module_count} modules'] = time.perf_counter() - start
+                finder.uninstall()
+                for name in [name for name in sys.modules if name.startswith('bench_app')]:
+                    del sys.modules[name]
+        finally:
+            sys.path.remove(project_root)
+    return results
+
+
+backends_main_source = """
+import time
+{imports}
+startup = time.perf_counter()
+def hot_loop(n):
+    total = 0
+    for i in range(n):
+        value = i * 2
+        total = total + value
+    return total
+result = hot_loop(1000000)
+print(time.perf_counter() - startup)
+"""
+
+@benchmark
+def bench_backends():
+    # Startup and steady-state cost of the AST and sys.monitoring backends on the same generated app
+    module_count = 50
+    importer_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rtti_importer.py')
+    results = {}
+    with tempfile.TemporaryDirectory() as project_root:
+        write_modules(project_root, module_count, lambda k: branchy_function_source() * 4)
+        main_filename = os.path.join(project_root, 'main.py')
+        with open(main_filename, 'w') as main_file:
+            main_file.write(backends_main_source.format(
+                imports='\n'.join(f'import module{k}' for k in range(module_count))))
+
+        runs = {
+            'plain': [sys.executable, main_filename],
+            'ast': [sys.executable, importer_script, main_filename, '--backend', 'ast'],
+        }
+        if sys.version_info >= (3, 12):
+            runs['monitoring'] = [sys.executable, importer_script, main_filename, '--backend', 'monitoring']
+
+        for label, command in runs.items():
+            start = time.perf_counter()
+            output = subprocess.run(command, cwd=project_root, capture_output=True, text=True, check=True).stdout
+            total = time.perf_counter() - start
+            hot_loop = float(output.split()[-1])
+            results[f'{label} startup'] = total - hot_loop
+            results[f'{label} hot loop'] = hot_loop
+    return results
+
+
+@benchmark
+def bench_generate():
+    # Full vs. incremental C++ generation of a generated project
+    from cpp_generator import generate_project
+
+    module_count = 200
+    results = {}
+    with tempfile.TemporaryDirectory() as project_root, tempfile.TemporaryDirectory() as output_folder:
+        write_modules(project_root, module_count,
+                      lambda k: f'class Module{k}:\n' + branchy_function_source('f(self, a)', '    '))
+
+        for label in ('full', 'incremental, nothing changed', 'incremental, one module changed'):
+            if label.endswith('one module changed'):
+                with open(os.path.join(project_root, 'module0.py'), 'a') as module_file:
+                    module_file.write('y = 1\n')
+            start = time.perf_counter()
+            generate_project(project_root, output_folder, {})
+            results[label] = time.perf_counter() - start
+    return results
+
+
+def current_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{commit}+' if dirty else commit
+
+
+def environment_key():
+    # Only runs on the same machine and Python are compared
+    return f'{platform.node()} {platform.machine()} Python {platform.python_version()}'
+
+
+def load_runs(filename: str):
+    runs = []
+    if os.path.exists(filename):
+        with open(filename) as results_file:
+            runs = [json.loads(line) for line in results_file if line.strip()]
+    return runs
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    # Prints every result against the baseline run's; returns the names that regressed
+    regressions = []
+    for name, seconds in results.items():
+        before = baseline['results'].get(name)
+        if before:
+            change = (seconds - before) / before
+            mark = ' REGRESSION' if change > threshold else ''
+            print(f'    {name}: {format_seconds(seconds)} ({change:+.0%} vs. {baseline["commit"]}){mark}')
+            if mark:
+                regressions.append(name)
+        else:
+            print(f'    {name}: {format_seconds(seconds)}')
+    return regressions
+
+
+def format_seconds(seconds: float):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if abs(seconds) >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds * 1e9:.1f} ns'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the benchmarks and compare with earlier runs.")
+    parser.add_argument('-k', '--filter', default='', help="Only benchmarks whose name contains this")
+    parser.add_argument('--save', action='store_true', help=f"Keep the results in {results_filename}")
+    parser.add_argument('--results', default=results_filename)
+    parser.add_argument('--threshold', type=float, default=0.1, help="Slowdown counted as a regression")
+    parser.add_argument('--list', action='store_true')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(benchmarks))
+        sys.exit(0)
+
+    runs = [run for run in load_runs(args.results) if run['environment'] == environment_key()]
+    results = {}
+    regressions = []
+
+    for benchmark_name, function in benchmarks.items():
+        if args.filter not in benchmark_name:
+            continue
+        print(f'{benchmark_name}:')
+        start = time.perf_counter()
+        benchmark_results = {f'{benchmark_name}: {name}': seconds for name, seconds in function().items()}
+        results.update(benchmark_results)
+
+        # The last saved run that had each result
+        for name, seconds in benchmark_results.items():
+            baseline = next((run for run in reversed(runs) if name in run['results']), None)
+            if baseline is None:
+                print(f'    {name}: {format_seconds(seconds)}')
+            else:
+                regressions += compare({name: seconds}, baseline, args.threshold)
+        print(f'    ({time.perf_counter() - start:.1f} s)')
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+        with open(args.results, 'a') as results_file:
+            results_file.write(json.dumps({
+                'commit': current_commit(),
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'environment': environment_key(),
+                'results': results,
+            }) + '\n')
+
+    sys.exit(1 if regressions else 0)
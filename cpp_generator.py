@@ -0,0 +1,537 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from rtti_monitoring import RttiSiteCollector
+from cpp_type_lattice import CppTypeLattice, cpp_variant_type, split_type_name
+from qt_class_index import qt_class_index
+import ast
+import filecmp
+import hashlib
+import json
+import os
+import traceback
+
+def output_filenames(rel_path: str):
+    # module/file.py -> (module/file.h, module/file.cpp), relative to the output folder
+    stem = os.path.splitext(rel_path)[0]
+    return f'{stem}.h', f'{stem}.cpp'
+
+
+def python_module_name(rel_path: str):
+    # module/file.py -> module.file, package/__init__.py -> package
+    return os.path.splitext(rel_path)[0].replace('/', '.').removesuffix('.__init__')
+
+
+def import_names(tree: ast.Module):
+    # {name bound by a module-level import: the dotted name it stands for}
+    names = {}
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            names.update((alias.asname or alias.name, f'{node.module}.{alias.name}') for alias in node.names)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname is not None:
+                    names[alias.asname] = alias.name
+                else:
+                    top_name = alias.name.partition('.')[0]
+                    names[top_name] = top_name
+    return names
+
+
+def module_classes(tree: ast.Module, module_name: str):
+    """
+    Yields (type name, base type names, C++ name) of every class of a
+    module, nested ones included, named as the type table names them: the
+    entry script's module_name is __main__.
+    """
+    names = import_names(tree)
+    scopes = [('', tree.body)]
+    while scopes:
+        scope, body = scopes.pop(0)
+        for node in body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+            qualname = f'{scope}.{node.name}'.lstrip('.')
+            base_names = []
+            for base in node.bases:
+                first, dot, rest = ast.unparse(base).partition('.')
+                if first in names:
+                    base_names.append(f'{names[first]}{dot}{rest}')
+                else:
+                    base_names.append(f'{module_name}.{first}{dot}{rest}')
+            yield f'{module_name}.{qualname}', tuple(base_names), qualname.replace('.', '::')
+            scopes.append((qualname, node.body))
+
+
+class CppModuleGenerator:
+    """
+    Generates the C++ header and source of one Python module as streams of
+    lines.  The output is a typed skeleton: classes, methods, functions and
+    variable declarations, typed from the runtime type table, with the
+    Python bodies kept as comments for porting by hand.  Sites are found
+    (and named) exactly as RttiTransformer names them, so module_types is
+    simply {scoped_name: type names} from the type table.
+
+    The lattice should know the project's classes (see project_classes()),
+    else a class is only joined by the bases this module itself defines or
+    imports.  module_name defaults to the module's dotted name; the entry
+    script's is __main__.
+    """
+    _version = 4    # Bump whenever the output changes; regenerates every module
+
+    def __init__(self, filename: str, source: str, module_types: dict, rel_path: str, lattice=None,
+                 module_name=None):
+        self._filename = filename
+        self._lines = source.splitlines()
+        self._relPath = rel_path
+        self._projectRoot = filename[:len(filename) - len(rel_path)] if filename.endswith(rel_path) else None
+        self._moduleName = python_module_name(rel_path) if module_name is None else module_name
+        self._tree = ast.parse(source, filename)
+        self._lattice = CppTypeLattice() if lattice is None else lattice
+        for type_name, base_names, cpp_name in module_classes(self._tree, self._moduleName):
+            self._lattice.register_class(type_name, base_names, cpp_name)
+
+        collector = RttiSiteCollector(filename)
+        collector.visit(self._tree)
+        # {scope: {local_id: set of type names}}, scope being '' or e.g. 'MyClass.method'
+        self._scopeLocals = {}
+        for scoped_name, scope, local_id in zip(collector.site_names(), collector.site_scopes(),
+                                                collector.site_local_ids()):
+            type_names = self._scopeLocals.setdefault(scope, {}).setdefault(local_id, set())
+            type_names.update(module_types.get(scoped_name, ()))
+
+    @classmethod
+    def version(cls):
+        return cls._version
+
+    def cpp_type(self, type_names) -> str:
+        return self._lattice.join(type_names)
+
+    def header_filename(self):
+        return output_filenames(self._relPath)[0]
+
+    def source_filename(self):
+        return output_filenames(self._relPath)[1]
+
+    def header_lines(self):
+        yield f'// Generated by PyQtToCpp from {self._relPath}'
+        yield '#pragma once'
+        yield ''
+        yield from self.include_lines()
+        yield ''
+
+        for local_id, type_names in self._scopeLocals.get('', {}).items():
+            yield f'extern {self.cpp_type(type_names)} {local_id};'
+
+        for node in self._tree.body:
+            if isinstance(node, ast.ClassDef):
+                yield ''
+                yield from self.class_declaration_lines(node, '')
+            elif isinstance(node, ast.FunctionDef):
+                yield f'{self.function_signature(node, "")};'
+
+    def source_lines(self):
+        yield f'// Generated by PyQtToCpp from {self._relPath}'
+        yield f'#include "{os.path.basename(self.header_filename())}"'
+        yield ''
+
+        for local_id, type_names in self._scopeLocals.get('', {}).items():
+            yield f'{self.cpp_type(type_names)} {local_id};'
+
+        module_code = []
+        for node in self._tree.body:
+            if isinstance(node, ast.ClassDef):
+                yield from self.class_definition_lines(node, '')
+            elif isinstance(node, ast.FunctionDef):
+                yield ''
+                yield from self.function_definition_lines(node, '', '')
+            elif not isinstance(node, (ast.Import, ast.ImportFrom)):
+                module_code.append(node)
+
+        if module_code:
+            yield ''
+            yield '// Module-level code:'
+            yield from self.comment_lines(module_code, '')
+
+    def include_lines(self):
+        includes = []
+        for node in self._tree.body:
+            if isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                # from package import module needs the module's header, from module import name the module's
+                modules = [(f'{node.module}.{alias.name}', node.module) for alias in node.names]
+            elif isinstance(node, ast.Import):
+                modules = [(alias.name, None) for alias in node.names]
+            else:
+                continue
+            for module, parent_module in modules:
+                if module.startswith('PyQt6.'):
+                    class_index = self._lattice.class_index()
+                    if module in class_index:
+                        include = f'#include <{class_index.header(module)}>'
+                    else:
+                        include = f'#include <{module.split(".")[1]}>'
+                else:
+                    header_filename = self.project_header_filename(module)
+                    if header_filename is None and parent_module is not None:
+                        header_filename = self.project_header_filename(parent_module)
+                    if header_filename is None:
+                        continue
+                    include = f'#include "{header_filename}"'
+                if include not in includes:
+                    includes.append(include)
+        yield from includes or ['#include <QtCore>']
+
+    def project_header_filename(self, module: str):
+        # Only project modules get a generated header; the standard library etc. have no C++ counterpart
+        if self._projectRoot is None:
+            return None
+        rel_path = module.replace('.', '/')
+        for rel_filename in (f'{rel_path}.py', f'{rel_path}/__init__.py'):
+            if os.path.exists(os.path.join(self._projectRoot, rel_filename)):
+                return output_filenames(rel_filename)[0]
+        return None
+
+    def class_declaration_lines(self, node: ast.ClassDef, scope: str, indent=''):
+        qualname = f'{scope}.{node.name}'.lstrip('.')
+        bases = [ast.unparse(base) for base in node.bases]
+        inherits = f' : {", ".join(f"public {base}" for base in bases)}' if bases else ''
+        yield f'{indent}class {node.name}{inherits}'
+        yield f'{indent}{{'
+        if any(base.startswith('Q') for base in bases):
+            yield f'{indent}    Q_OBJECT'
+            yield ''
+        yield f'{indent}public:'
+
+        for local_id, type_names in self._scopeLocals.get(qualname, {}).items():
+            yield f'{indent}    static {self.cpp_type(type_names)} {local_id};'
+
+        for child in node.body:
+            if isinstance(child, ast.ClassDef):
+                yield from self.class_declaration_lines(child, qualname, indent + '    ')
+            elif isinstance(child, ast.FunctionDef):
+                yield f'{indent}    {self.function_signature(child, qualname, node.name)};'
+        yield f'{indent}}};'
+
+    def class_definition_lines(self, node: ast.ClassDef, scope: str):
+        qualname = f'{scope}.{node.name}'.lstrip('.')
+        cpp_qualname = qualname.replace('.', '::')
+
+        for local_id, type_names in self._scopeLocals.get(qualname, {}).items():
+            yield f'{self.cpp_type(type_names)} {cpp_qualname}::{local_id};'
+
+        for child in node.body:
+            if isinstance(child, ast.ClassDef):
+                yield from self.class_definition_lines(child, qualname)
+            elif isinstance(child, ast.FunctionDef):
+                yield ''
+                yield from self.function_definition_lines(child, qualname, f'{cpp_qualname}::', node.name)
+
+    def function_signature(self, node: ast.FunctionDef, scope: str, class_name=None, prefix=''):
+        qualname = f'{scope}.{node.name}'.lstrip('.')
+        local_types = self._scopeLocals.get(qualname, {})
+        args = node.args.posonlyargs + node.args.args + node.args.kwonlyargs
+
+        is_static = any(isinstance(decorator, ast.Name) and decorator.id == 'staticmethod'
+                        for decorator in node.decorator_list)
+        if class_name is not None and not is_static:
+            args = args[1:]
+
+        # A parameter that is also assigned to gets that site's type
+        params = ', '.join(f'{self.cpp_type(local_types.get(arg.arg, ()))} {arg.arg}' for arg in args)
+
+        if class_name is not None and node.name == '__init__':
+            return f'{prefix}{class_name}({params})'
+        returns_value = any(isinstance(child, ast.Return) and child.value is not None for child in ast.walk(node))
+        static = 'static ' if is_static and not prefix else ''
+        return f'{static}{cpp_variant_type if returns_value else "void"} {prefix}{node.name}({params})'
+
+    def function_definition_lines(self, node: ast.FunctionDef, scope: str, prefix: str, class_name=None):
+        qualname = f'{scope}.{node.name}'.lstrip('.')
+        params = {arg.arg for arg in node.args.posonlyargs + node.args.args + node.args.kwonlyargs}
+        yield self.function_signature(node, scope, class_name, prefix)
+        yield '{'
+        for local_id, type_names in self._scopeLocals.get(qualname, {}).items():
+            if local_id not in params:
+                yield f'    {self.cpp_type(type_names)} {local_id};'
+        yield from self.comment_lines(node.body, '    ')
+        yield '}'
+
+    def comment_lines(self, nodes, indent: str):
+        # Whole source lines of statements in order, a line shared by several (a(); b()) only once;
+        # ast.get_source_segment() splits the entire source on every call
+        emitted = 0
+        for node in nodes:
+            first = node.lineno - 1
+            if isinstance(node, (ast.FunctionDef, ast.ClassDef)) and node.decorator_list:
+                first = node.decorator_list[0].lineno - 1
+            for line in self._lines[max(first, emitted):node.end_lineno]:
+                if line[:node.col_offset].isspace():
+                    line = line[node.col_offset:]
+                yield f'{indent}// {line}'.rstrip()
+            emitted = max(emitted, node.end_lineno)
+
+
+# One per worker process, so type sets joined for one module needn't be joined again for the next
+_lattice = CppTypeLattice()
+
+def write_lines(filename: str, lines) -> bool:
+    """
+    Streams lines into filename, leaving the file (and its mtime) alone when
+    the output is identical, so C++ builds don't see a change.  Returns
+    whether the file was (re)written.
+    """
+    temp_filename = f'{filename}.{os.getpid()}.tmp'
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    try:
+        with open(temp_filename, 'w', encoding='utf-8', newline='\n') as output_file:
+            for line in lines:
+                output_file.write(line)
+                output_file.write('\n')
+
+        if os.path.exists(filename) and filecmp.cmp(temp_filename, filename, shallow=False):
+            return False
+        os.replace(temp_filename, filename)
+        return True
+    finally:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+
+
+def module_key(rel_path: str, source: bytes, module_types: dict, dependencies=()) -> str:
+    digest = hashlib.sha256()
+    # Generated headers and class names also depend on the installed PyQt6
+    digest.update(f'{CppModuleGenerator.version()}:{qt_class_index().versions()}:{rel_path}'.encode())
+    digest.update(b'\0')
+    digest.update(source)
+    digest.update(json.dumps(sorted((name, sorted(types)) for name, types in module_types.items())).encode())
+    digest.update(json.dumps(dependencies).encode())
+    return digest.hexdigest()
+
+
+def class_dependencies(type_names, classes: dict) -> list:
+    # Sorted [type name, base type names, C++ name] of the project classes in type_names, their args and their bases
+    found = {}
+    pending = list(type_names)
+    while pending:
+        origin, args = split_type_name(pending.pop())
+        pending.extend(args)
+        if origin in classes and origin not in found:
+            found[origin] = classes[origin]
+            pending.extend(classes[origin][0])
+    return sorted([name, list(base_names), cpp_name] for name, (base_names, cpp_name) in found.items())
+
+
+def classes_digest(module_name: str, source: bytes) -> str:
+    return hashlib.sha256(module_name.encode() + b'\0' + source).hexdigest()
+
+
+def _find_classes(modules):
+    """
+    Runs in a worker process.  modules are (filename, module name); returns
+    (filename, digest, {type name: (base type names, C++ name)}) with the
+    classes of each module that parses, the others are left for generation
+    to report.
+    """
+    results = []
+    for filename, module_name in modules:
+        try:
+            with open(filename, 'rb') as source_file:
+                source = source_file.read()
+            tree = ast.parse(source, filename)
+        except (OSError, SyntaxError, ValueError):
+            continue
+        results.append((filename, classes_digest(module_name, source),
+                        {type_name: (base_names, cpp_name)
+                         for type_name, base_names, cpp_name in module_classes(tree, module_name)}))
+    return results
+
+
+def project_modules(project_root: str, include=None, exclude=None, entry_filename=None) -> list:
+    # (filename, module name) of every project module, entry_filename's being __main__ as in the type table
+    from rtti_importer import RttiImportFinder
+    from rtti_batch import project_source_files
+
+    finder = RttiImportFinder(project_root, include, exclude)
+    project_root = finder.project_root()
+    entry_filename = None if entry_filename is None else os.path.abspath(entry_filename)
+    return [(filename, '__main__' if filename == entry_filename else
+             python_module_name(os.path.relpath(filename, project_root).replace(os.sep, '/')))
+            for filename in project_source_files(finder)]
+
+
+def project_classes(modules, executor=None, chunk_size=8, known=None) -> dict:
+    """
+    {filename: (digest, {type name: (base type names, C++ name)})} of the
+    classes of modules (see project_modules()), found on executor when
+    given.  Every module's types are to be joined knowing all of them: a
+    class's bases may be in any other module.  known is an earlier result
+    (e.g. read back from JSON); modules whose digest (module name and
+    source) is unchanged aren't parsed again.
+    """
+    found = {}
+    changed = []
+    for filename, module_name in modules:
+        digest, classes = (known or {}).get(filename, (None, None))
+        if digest is not None:
+            try:
+                with open(filename, 'rb') as source_file:
+                    source = source_file.read()
+            except OSError:
+                source = None
+            if source is not None and classes_digest(module_name, source) == digest:
+                found[filename] = (digest, {type_name: (tuple(base_names), cpp_name)
+                                            for type_name, (base_names, cpp_name) in classes.items()})
+                continue
+        changed.append((filename, module_name))
+
+    chunks = [changed[k:k + chunk_size] for k in range(0, len(changed), chunk_size)]
+    results = executor.map(_find_classes, chunks) if executor is not None else map(_find_classes, chunks)
+    for chunk_results in results:
+        found.update((filename, (digest, classes)) for filename, digest, classes in chunk_results)
+    return found
+
+
+def _generate_modules(modules, project_root: str, output_folder: str, classes: dict):
+    """
+    Runs in a worker process.  modules are (filename, module name, module
+    types, class dependencies, key the module was last generated with); a
+    module whose key (source, types, classes and generator version) is
+    unchanged and whose files still exist is skipped.  classes are every
+    project class, {type name: (base type names, C++ name)}.
+    Returns (filename, key, status, traceback) with status one of
+    'unchanged', 'written' or 'identical' (regenerated to the same files).
+    """
+    _lattice.register_classes(classes)
+    results = []
+    for filename, module_name, module_types, dependencies, generated_key in modules:
+        try:
+            with open(filename, 'rb') as source_file:
+                source = source_file.read()
+            rel_path = os.path.relpath(filename, project_root).replace(os.sep, '/')
+            key = module_key(rel_path, source, module_types, dependencies)
+
+            header_filename, source_filename = (
+                os.path.join(output_folder, output_filename) for output_filename in output_filenames(rel_path))
+
+            if key == generated_key and os.path.exists(header_filename) and os.path.exists(source_filename):
+                results.append((filename, key, 'unchanged', None))
+                continue
+
+            generator = CppModuleGenerator(filename, source.decode('utf-8'), module_types, rel_path, _lattice,
+                                           module_name)
+            written = write_lines(header_filename, generator.header_lines())
+            written = write_lines(source_filename, generator.source_lines()) or written
+            results.append((filename, key, 'written' if written else 'identical', None))
+        except:
+            results.append((filename, None, 'error', traceback.format_exc()))
+    return results
+
+
+def site_types(type_table) -> dict:
+    # {scoped_name: type names} snapshot of a RttiTypeTable, e.g. to generate from while the table changes
+    return {type_table.scoped_name(row): type_table.type_names(row) for row in range(type_table.row_count())}
+
+
+def types_by_module(filenames, site_types: dict) -> dict:
+    # Splits {scoped_name: type names} by module; scoped names start with the module's filename
+    filenames = set(filenames)
+    module_types = {filename: {} for filename in filenames}
+    for scoped_name, type_names in site_types.items():
+        end = scoped_name.find('.py')
+        while end != -1:
+            filename = scoped_name[:end + 3]
+            if filename in filenames:
+                module_types[filename][scoped_name] = type_names
+                break
+            end = scoped_name.find('.py', end + 3)
+    return module_types
+
+
+def generate_project(project_root: str, output_folder: str, site_types: dict, include=None, exclude=None,
+                     max_workers=None, chunk_size=8, progress=None, cancelled=None, entry_filename=None):
+    """
+    Generates the C++ of every project module into output_folder, on a
+    process pool, typed from site_types (see site_types()).  Only modules whose source, types or generator version
+    changed since the last run (see the manifest in the output folder) are
+    generated again, and only files whose content changed are rewritten.
+    The project's classes are all found first, so each module's types join
+    the same whichever worker generates it; entry_filename is the app's
+    entry script, whose classes the type table has as __main__'s.
+    progress(done, total) and cancelled() work as in instrument_project().
+    Returns {filename: (status, traceback)}.
+    """
+    project_root = os.path.abspath(project_root)
+    module_names = dict(project_modules(project_root, include, exclude, entry_filename))
+    filenames = list(module_names)
+    module_types = types_by_module(filenames, site_types)
+
+    manifest_filename = os.path.join(output_folder, '.pyqt_to_cpp.json')
+    try:
+        with open(manifest_filename) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        manifest = {}
+
+    classes_filename = os.path.join(output_folder, '.pyqt_to_cpp_classes.json')
+    try:
+        with open(classes_filename) as classes_file:
+            classes_by_module = json.load(classes_file)
+    except (OSError, ValueError):
+        classes_by_module = {}
+
+    # The C++ of modules gone from the project goes too
+    for filename in [filename for filename in manifest if filename not in module_types]:
+        rel_path = os.path.relpath(filename, project_root).replace(os.sep, '/')
+        for output_filename in output_filenames(rel_path):
+            output_filename = os.path.join(output_folder, output_filename)
+            if os.path.exists(output_filename):
+                os.remove(output_filename)
+        del manifest[filename]
+
+    total = len(filenames)
+    done = 0
+    results = {}
+
+    if progress is not None:
+        progress(done, total)
+
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        classes_by_module = project_classes(list(module_names.items()), executor, chunk_size, classes_by_module)
+        classes = {}
+        for _, registrations in classes_by_module.values():
+            classes.update(registrations)
+
+        modules = []
+        for filename in filenames:
+            type_names = list(classes_by_module.get(filename, (None, {}))[1])
+            type_names.extend(type_name for types in module_types[filename].values() for type_name in types)
+            modules.append((filename, module_names[filename], module_types[filename],
+                            class_dependencies(type_names, classes), manifest.get(filename)))
+        chunks = [modules[k:k + chunk_size] for k in range(0, len(modules), chunk_size)]
+        pending = {executor.submit(_generate_modules, chunk, project_root, output_folder, classes)
+                   for chunk in chunks}
+
+        while pending:
+            if cancelled is not None and cancelled():
+                break
+
+            finished, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                for filename, key, status, error in future.result():
+                    results[filename] = (status, error)
+                    if key is not None:
+                        manifest[filename] = key
+                    done += 1
+
+            if finished and progress is not None:
+                progress(done, total)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+        os.makedirs(output_folder, exist_ok=True)
+        with open(manifest_filename, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=0)
+        with open(classes_filename, 'w') as classes_file:
+            json.dump(classes_by_module, classes_file)
+
+    return results
@@ -0,0 +1,39 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+from cpp_generator import generate_project, site_types
+import os
+import traceback
+
+class CppGeneratorRunner(QThread):
+    """
+    Runs generate_project() off the GUI thread.  The types of every module
+    are taken from the type table up front, so the table may change (e.g.
+    by a new type check) while the modules are generated.
+    """
+    progressChanged = pyqtSignal(int, int)
+    generated = pyqtSignal(dict)
+    generateError = pyqtSignal(str)
+
+    def __init__(self, project_root: str, output_folder: str, type_table, parent=None, include=None, exclude=None,
+                 entry_filename=None):
+        super().__init__(parent)
+        self._projectRoot = os.path.abspath(project_root)
+        self._entryFilename = entry_filename
+        self._outputFolder = os.path.abspath(output_folder)
+        self._include = include
+        self._exclude = exclude
+        self._siteTypes = site_types(type_table)
+
+    def run(self):
+        try:
+            results = generate_project(self._projectRoot, self._outputFolder, self._siteTypes, self._include,
+                                       self._exclude, progress=self.progressChanged.emit,
+                                       cancelled=self.isInterruptionRequested, entry_filename=self._entryFilename)
+            self.generated.emit(results)
+        except:
+            self.generateError.emit(traceback.format_exc())
+
+    def output_folder(self):
+        return self._outputFolder
+
+    def project_root(self):
+        return self._projectRoot
@@ -0,0 +1,280 @@
+from qt_class_index import qt_class_index
+import importlib
+
+# Python type names (as recorded, see rtti.type_name()) of the C++ value types they map to
+cpp_scalar_types = {
+    'builtins.bool': 'bool',
+    'builtins.int': 'int',
+    'builtins.float': 'double',
+    'builtins.complex': 'std::complex<double>',
+    'builtins.str': 'QString',
+    'builtins.bytes': 'QByteArray',
+    'builtins.bytearray': 'QByteArray',
+}
+# Containers to their C++ templates; list and tuple both become a QList, so they join
+cpp_container_types = {
+    'builtins.list': 'QList',
+    'builtins.tuple': 'QList',
+    'builtins.set': 'QSet',
+    'builtins.frozenset': 'QSet',
+    'collections.deque': 'QQueue',
+    'builtins.dict': 'QHash',
+}
+cpp_variant_type = 'QVariant'
+none_type_name = 'builtins.NoneType'
+
+
+class CppTypeNode:
+    # One interned Python type name: 'builtins.dict[builtins.str, builtins.int]' has origin 'builtins.dict' and two args
+    __slots__ = ('id', 'name', 'origin', 'args')
+
+    def __init__(self, node_id: int, name: str, origin: str, args: tuple):
+        self.id = node_id
+        self.name = name
+        self.origin = origin
+        self.args = args
+
+    def __repr__(self):
+        return f'CppTypeNode({self.name!r})'
+
+
+def split_type_name(type_name: str):
+    # 'builtins.dict[builtins.str, builtins.int]' -> ('builtins.dict', ['builtins.str', 'builtins.int'])
+    if not type_name.endswith(']'):
+        return type_name, []
+    origin, _, args = type_name[:-1].partition('[')
+    parts = []
+    depth = 0
+    start = 0
+    for k, char in enumerate(args):
+        if char == '[':
+            depth += 1
+        elif char == ']':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(args[start:k].strip())
+            start = k + 1
+    parts.append(args[start:].strip())
+    return origin, [part for part in parts if part != '...']
+
+
+class CppTypeLattice:
+    """
+    Joins the set of Python types observed at a site into one C++ type:
+
+        bool < int < float                      widened, e.g. {int, float} -> double
+        list[int], list[float], tuple[int]      joined per element -> QList<double>
+        QLabel, QPushButton                     nearest common base by MRO -> QWidget*
+        None with T                             T* stays a (nullable) pointer, else std::optional<T>
+        anything left over                      std::variant<A, B>
+        nothing observed                        QVariant
+
+    Type names are interned to CppTypeNode once, and every join is memoized
+    on the set of node IDs, so the many sites sharing a type set (most
+    sites: {int}, {str}, ...) cost a dict lookup each.  Classes are looked
+    up in the lattice's own registry (see register_class()), PyQt6's in the
+    prebuilt QtClassIndex, and otherwise imported, but only from the
+    standard containers' modules; project modules are never imported.
+    """
+    _importable_modules = ('builtins', 'collections')
+    _root_classes = frozenset(('builtins.object', 'PyQt6.sip.wrapper', 'PyQt6.sip.simplewrapper'))
+    _qobject_class = 'PyQt6.QtCore.QObject'
+    _numeric_order = ('builtins.bool', 'builtins.int', 'builtins.float')
+
+    def __init__(self, class_index=None):
+        self._classIndex = class_index
+        self._nodes = {}
+        self._mros = {}
+        self._classes = {}
+        self._joins = {}
+
+    def node(self, type_name: str) -> CppTypeNode:
+        node = self._nodes.get(type_name)
+        if node is None:
+            origin, args = split_type_name(type_name)
+            args = tuple(self.node(arg) for arg in args)
+            node = CppTypeNode(len(self._nodes), type_name, origin, args)
+            self._nodes[type_name] = node
+        return node
+
+    def node_count(self):
+        return len(self._nodes)
+
+    def class_index(self):
+        # Loaded on first use: most type sets never get to a PyQt6 class
+        if self._classIndex is None:
+            self._classIndex = qt_class_index()
+        return self._classIndex
+
+    def register_class(self, type_name: str, base_names, cpp_name: str):
+        # A (project) class the lattice can't import: its recorded type name, its bases' type names and C++ name
+        registration = (tuple(base_names), cpp_name)
+        if self._classes.get(type_name) != registration:
+            self._classes[type_name] = registration
+            # Every join involving the class looked up its MRO; if none did, nothing memoized depends on it
+            if type_name in self._mros:
+                self._mros.clear()
+                self._joins.clear()
+
+    def register_classes(self, classes: dict):
+        # {type name: (base type names, C++ name)}, e.g. every class of the project
+        for type_name, (base_names, cpp_name) in classes.items():
+            self.register_class(type_name, base_names, cpp_name)
+
+    def mro(self, type_name: str) -> tuple:
+        # Type names of the class and its bases, in method resolution order, roots (object, sip) left out
+        mro = self._mros.get(type_name)
+        if mro is None:
+            self._mros[type_name] = (type_name,)    # Guards against cyclic registrations
+            mro = self._mros[type_name] = self.compute_mro(type_name)
+        return mro
+
+    def compute_mro(self, type_name: str) -> tuple:
+        if type_name in self._classes:
+            # Good enough a linearization for joins: the class, then each base's MRO depth first
+            mro = [type_name]
+            for base_name in self._classes[type_name][0]:
+                mro.extend(name for name in self.mro(base_name) if name not in mro)
+            return tuple(mro)
+
+        if type_name.startswith('PyQt6.'):
+            class_index = self.class_index()
+            return class_index.mro(type_name) if type_name in class_index else (type_name,)
+
+        Type = self.import_class(type_name)
+        if Type is None:
+            return (type_name,)
+        mro = (f'{Base.__module__}.{Base.__qualname__}' for Base in Type.__mro__)
+        return tuple(name for name in mro if name not in self._root_classes)
+
+    def import_class(self, type_name: str):
+        module_name, _, qualname = type_name.rpartition('.')
+        if not module_name.startswith(self._importable_modules):
+            return None
+        try:
+            Type = importlib.import_module(module_name)
+            for name in qualname.split('.'):
+                Type = getattr(Type, name)
+        except (ImportError, AttributeError):
+            return None
+        return Type if isinstance(Type, type) else None
+
+    def is_qobject(self, type_name: str):
+        return self._qobject_class in self.mro(type_name)
+
+    def cpp_class_name(self, type_name: str):
+        if type_name in self._classes:
+            cpp_name = self._classes[type_name][1]
+        elif type_name.startswith('PyQt6.') and type_name in self.class_index():
+            cpp_name = self.class_index().cpp_name(type_name)
+        else:
+            cpp_name = type_name.rpartition('.')[2]
+        # QObjects live on the heap and are passed around by pointer
+        return f'{cpp_name}*' if self.is_qobject(type_name) else cpp_name
+
+    def join(self, type_names) -> str:
+        return self.join_nodes([self.node(type_name) for type_name in type_names])
+
+    def join_nodes(self, nodes) -> str:
+        key = frozenset(node.id for node in nodes)
+        cpp_type = self._joins.get(key)
+        if cpp_type is None:
+            cpp_type = self._joins[key] = self.compute_join({node.id: node for node in nodes}.values())
+        return cpp_type
+
+    def compute_join(self, nodes) -> str:
+        if not nodes:
+            return cpp_variant_type
+
+        optional = False
+        numeric = None
+        containers = {}
+        classes = []
+        for node in nodes:
+            if node.name == none_type_name:
+                optional = True
+            elif node.origin in self._numeric_order:
+                if numeric is None or self._numeric_order.index(node.origin) > self._numeric_order.index(numeric):
+                    numeric = node.origin
+            elif node.origin in cpp_container_types:
+                containers.setdefault(cpp_container_types[node.origin], []).append(node)
+            else:
+                classes.append(node.name)
+
+        parts = [cpp_scalar_types[numeric]] if numeric is not None else []
+        for template, container_nodes in sorted(containers.items()):
+            parts.append(self.join_containers(template, container_nodes))
+        parts.extend(self.join_classes(classes))
+
+        if not parts:
+            return 'std::nullptr_t'
+        cpp_type = parts[0] if len(parts) == 1 else f'std::variant<{", ".join(parts)}>'
+        if optional and not cpp_type.endswith('*'):
+            cpp_type = f'std::optional<{cpp_type}>'
+        return cpp_type
+
+    def join_containers(self, template: str, nodes) -> str:
+        # Elements are joined position by position; an unparameterized (empty when seen) container adds nothing
+        arity = 2 if template == 'QHash' else 1
+        element_nodes = [[] for _ in range(arity)]
+        for node in nodes:
+            if len(node.args) == arity:
+                for elements, arg in zip(element_nodes, node.args):
+                    elements.append(arg)
+        if not element_nodes[0]:
+            return 'QVariantHash' if template == 'QHash' else f'{template}<{cpp_variant_type}>'
+        return f'{template}<{", ".join(self.join_nodes(elements) for elements in element_nodes)}>'
+
+    def join_classes(self, type_names) -> list:
+        # The nearest base all classes share; failing that each class on its own
+        if len(type_names) > 1:
+            mros = [self.mro(type_name) for type_name in type_names]
+            common = set(mros[0]).intersection(*mros[1:])
+            base_name = next((name for name in mros[0] if name in common), None)
+            if base_name is not None:
+                type_names = [base_name]
+        return sorted(cpp_scalar_types.get(type_name) or self.cpp_class_name(type_name) for type_name in type_names)
+
+    def resolve_table(self, type_table) -> list:
+        # The C++ type of every row of a RttiTypeTable, each distinct type set joined once
+        nodes = [self.node(type_table.type_name(type_id)) for type_id in range(type_table.type_count())]
+        by_type_ids = {}
+        cpp_types = []
+        for row in range(type_table.row_count()):
+            type_ids = frozenset(type_table.type_ids(row))
+            cpp_type = by_type_ids.get(type_ids)
+            if cpp_type is None:
+                cpp_type = by_type_ids[type_ids] = self.join_nodes([nodes[type_id] for type_id in type_ids])
+            cpp_types.append(cpp_type)
+        return cpp_types
+
+
+if __name__ == '__main__':
+    # Resolves a project-sized type table
+    from rtti_table import RttiTypeTable
+    import random
+    import time
+
+    type_names = ['builtins.int', 'builtins.float', 'builtins.bool', 'builtins.str', 'builtins.NoneType',
+                  'builtins.list[builtins.int]', 'builtins.list[builtins.float]', 'builtins.tuple[builtins.int, ...]',
+                  'builtins.dict[builtins.str, builtins.int]', 'builtins.list', 'PyQt6.QtWidgets.QLabel',
+                  'PyQt6.QtWidgets.QPushButton', 'PyQt6.QtCore.QTimer', 'PyQt6.QtGui.QColor', 'app.Model']
+    table = RttiTypeTable()
+    type_ids = table.intern_types(type_names)
+    random.seed(0)
+    for row in table.add_sites(f'module{k // 100}.pyf{k % 100}x' for k in range(100000)):
+        for type_id in random.sample(type_ids, random.choice((1, 1, 1, 1, 2, 3))):
+            table.add_type(row, type_id)
+
+    lattice = CppTypeLattice()
+    for label in ('first', 'memoized'):
+        start = time.perf_counter()
+        cpp_types = lattice.resolve_table(table)
+        print(f'{label}: {(time.perf_counter() - start) * 1000:.1f} ms for {table.row_count()} rows, '
+              f'{len(set(cpp_types))} distinct C++ types')
+
+    for names in (['builtins.int', 'builtins.float'], ['PyQt6.QtWidgets.QLabel', 'PyQt6.QtWidgets.QPushButton'],
+                  ['PyQt6.QtWidgets.QLabel', 'builtins.NoneType'], ['builtins.int', 'builtins.NoneType'],
+                  ['builtins.list[builtins.int]', 'builtins.tuple[builtins.float, ...]', 'builtins.list'],
+                  ['builtins.str', 'builtins.int'], ['PyQt6.QtWidgets.QLabel', 'PyQt6.QtCore.QTimer']):
+        print(f'{", ".join(names)} -> {lattice.join(names)}')
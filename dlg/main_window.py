@@ -1,45 +1,81 @@
 from ui.ui_main_window import Ui_MainWindow
-from PyQt6.QtWidgets import QMainWindow, QFileDialog
+from PyQt6.QtWidgets import QMainWindow, QFileDialog, QTreeWidgetItem, QTableWidgetItem
+from PyQt6.QtCore import Qt
 import _pickle as pickle
 import os
 from dlg.error_dialog import ErrorDialog
 from PyQt6.QtGui import QIcon
+from rtti_runner import RttiRunner
+from rtti_transformer import RttiTransformer
+from rtti_channel import RttiChannelReader
+from rtti_table import RttiTypeTable
+from rtti_type_model import RttiTypeModel, RttiTypeFilterModel
+from rtti_store import RttiTypeStore
+from project_file import ProjectFile
+import rtti_trace
+from cpp_generator import output_filenames, project_modules, project_classes
+from cpp_type_lattice import CppTypeLattice
+from cpp_generator_runner import CppGeneratorRunner
 import traceback
+import sys
 
 class MainWindow(QMainWindow, Ui_MainWindow):
     _appTitle = "PyQtToCpp"
     _appExt = "pyqt-c++"
     _lastSessionPtr = 'last-session.pickle'
     
-    def __init__(self, parent=None, pickled=False):
+    def __init__(self, parent=None):
         super().__init__(parent)
         super().__init__()
         self.setupUi(self)
         self._saveFilename = None
+        self._project = None
+        self._savedTypesRevision = None
         self._saved = False
         self._appEntrypoint = None
         self._runtimeCheckFolder = None
+        self._rttiRunner = None
+        self._rttiChannel = None
+        self._typeCheckSpan = None
+        self._cppOutputFolder = None
+        self._cppGenerator = None
+        self._typeTable = RttiTypeTable()
+        self._typeModel = RttiTypeModel(self._typeTable, parent=self)
+        self._typeFilter = RttiTypeFilterModel(parent=self)
+        self._typeFilter.setSourceModel(self._typeModel)
+        self.runtimeTypeCheckTable.setModel(self._typeFilter)
         
         # TODO: figure out how to do this in Resource file in PyQt6 (?)
         self.setWindowIcon(QIcon("img/Python_and_Qt.svg"))
         
         self.setWindowTitle(self._appTitle)
+        self.finish_setup()
+        
+    @staticmethod
+    def open_project(filename):
+        window = MainWindow()
+        window.load_project(ProjectFile(filename))
+        return window
         
-        if not pickled:
-            self.finish_setup()            
+    def load_project(self, project):
+        # Settings come from the project's small header; its type table is only read without a type store
+        self._project = project
+        self._saveFilename = project.filename()
+        self.set_app_entrypoint(project.setting('app entrypoint'))
+        self.set_cpp_output_folder(project.setting('cpp output folder'))
+        folder = project.setting('runtime check folder')
+        
+        if folder is not None and os.path.isdir(folder):
+            self.set_runtime_check_folder(folder)
+        else:
+            self._runtimeCheckFolder = folder
+            self.runtimeTypingFolderLine.setText(folder or '')
+            if project.has_section('types'):
+                self._typeTable.load_bytes(project.section('types'))
+                self._typeModel.reload()
+                self._savedTypesRevision = self._typeTable.revision()
             
-    def __setstate__(self, data):
-        self.__init__(pickled=True)
-        self.set_app_entrypoint(data['app entrypoint'])
-        self.set_runtime_check_folder(data['runtime check folder'])
         self.setWindowTitle(self._appTitle)
-        self.finish_setup()
-        
-    def __getstate__(self):
-        return {
-            'app entrypoint' : self.app_entrypoint(),
-            'runtime check folder' : self.runtime_check_folder(),
-        }
     
     def set_app_entrypoint(self, entrypoint):
         if self._appEntrypoint != entrypoint:
@@ -54,11 +90,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if self._runtimeCheckFolder != folder:
             self._runtimeCheckFolder = folder
             self.runtimeTypingFolderLine.setText(folder)
+            self.clear_type_rows()
+            self.load_type_store()
             self.app_changes_made()
             
     def runtime_check_folder(self):
         return self._runtimeCheckFolder
             
+    def set_cpp_output_folder(self, folder):
+        if self._cppOutputFolder != folder:
+            self._cppOutputFolder = folder
+            self.cppCodeOutputFolderLine.setText(folder)
+            self.app_changes_made()
+            
+    def cpp_output_folder(self):
+        return self._cppOutputFolder
+            
     def app_changes_made(self):
         self.setWindowTitle(f'{self._appTitle}*')
             
@@ -68,12 +115,254 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.pythonAppEntrypointLine.textChanged.connect(self.set_app_entrypoint)
         self.chooseAppEntryButton.clicked.connect(self.display_app_entrypoint_dialog)
         self.chooseRuntimeTypingButton.clicked.connect(self.display_runtime_check_folder_dialog)
+        self.cppCodeOutputFolderLine.textChanged.connect(self.set_cpp_output_folder)
+        self.chooseCppOutputButton.clicked.connect(self.display_cpp_output_folder_dialog)
+        self.generateCppCodeButton.clicked.connect(self.toggle_cpp_generation)
+        self.startTypeCheckButton.clicked.connect(self.toggle_type_check)
+        self.resetTypeCheckButton.clicked.connect(self.reset_type_check)
+        self.typeFilterLine.textChanged.connect(self._typeFilter.set_module_filter)
+        self.unresolvedOnlyCheck.toggled.connect(self._typeFilter.set_unresolved_only)
         
     def app_entrypoint_changed(self, entrypoint):
         if entrypoint != self._appEntrypoint:
             self._appEntrypoint = entrypoint
             self.app_changes_made()
         
+    def toggle_type_check(self):
+        if self._rttiRunner is not None:
+            self._rttiRunner.cancel()
+            self.statusbar.showMessage("Cancelling type check...")
+        else:
+            self.start_type_check()
+            
+    def start_type_check(self):
+        try:
+            if self._appEntrypoint is None:
+                self.statusbar.showMessage("Choose the Python app entrypoint first.")
+                return
+            
+            if self._rttiChannel is None:
+                self._rttiChannel = RttiChannelReader(self._typeTable, parent=self)
+                self._rttiChannel.rowsAdded.connect(self._typeModel.add_rows)
+                self._rttiChannel.rowsChanged.connect(self._typeModel.update_rows)
+                
+            if self.traceRunCheck.isChecked() and self._runtimeCheckFolder is not None:
+                # Every process of the run (this one, instrument workers, the app) traces into the folder
+                rtti_trace.enable(rtti_trace.trace_folder(self._runtimeCheckFolder))
+                rtti_trace.set_process_name(self._appTitle)
+            self._typeCheckSpan = rtti_trace.span('type check')
+            
+            runner = RttiRunner(self._appEntrypoint, RttiTransformer, parent=self,
+                                runtime_check_folder=self._runtimeCheckFolder, instrument_ahead=True,
+                                channel_name=self._rttiChannel.server_name())
+            runner.progressChanged.connect(self.type_check_progress)
+            runner.instrumentErrors.connect(self.type_check_instrument_errors)
+            runner.appStarted.connect(self.type_check_app_started)
+            runner.appOutput.connect(sys.stdout.write)
+            runner.appErrorOutput.connect(sys.stderr.write)
+            runner.appFinished.connect(self.type_check_finished)
+            self._rttiRunner = runner
+            self.startTypeCheckButton.setText("Cancel Type Check")
+            runner.launch()
+            
+        except:
+            self.display_error_message(MainWindow, MainWindow.start_type_check, None, traceback.format_exc(), parent=self)
+            
+    def type_check_progress(self, done, total):
+        if done < total:
+            self.statusbar.showMessage(f"Instrumenting modules: {done} / {total}")
+        else:
+            self.statusbar.showMessage(f"Instrumented {total} modules, running app...")
+            
+    def type_check_instrument_errors(self, errors):
+        msg = '\n'.join(f'{filename}:\n{error}' for filename, error in errors.items())
+        self.display_error_message(RttiRunner, RttiRunner.instrument_project, None, msg, parent=self)
+            
+    def type_check_app_started(self):
+        self.statusbar.showMessage("App running, type check in progress...")
+            
+    def type_check_finished(self, exit_code):
+        if self._rttiRunner.is_cancelled():
+            message = "Type check cancelled."
+        elif exit_code != 0:
+            message = f"Type check finished, app exited with code {exit_code}."
+        else:
+            message = "Type check finished."
+        self._rttiRunner.deleteLater()
+        self.load_project_classes()
+        with rtti_trace.span('load coverage', 'gui'):
+            self.load_type_coverage()
+        self._typeCheckSpan.finish()
+        
+        if rtti_trace.is_enabled():
+            trace_filename, totals = rtti_trace.merge_trace(rtti_trace.trace_folder(self._runtimeCheckFolder))
+            rtti_trace.disable()
+            if trace_filename is not None:
+                message += f" {rtti_trace.format_summary(totals)} (trace: {os.path.basename(trace_filename)})"
+        self.statusbar.showMessage(message)
+        self._rttiRunner = None
+        self.startTypeCheckButton.setText("Start Type Check")
+        
+    def load_type_store(self):
+        # Types observed by earlier sessions, kept in the runtime check folder
+        if self._runtimeCheckFolder is None:
+            return
+        try:
+            store = RttiTypeStore(self._runtimeCheckFolder)
+            store.merge_shards()
+            store.load(self._typeTable)
+            store.close()
+            self._typeModel.reload()
+            self.load_project_classes()
+            self.load_type_coverage()
+        except:
+            self.display_error_message(MainWindow, MainWindow.load_type_store, None, traceback.format_exc(), parent=self)
+            
+    def load_project_classes(self):
+        # The C++ type column joins project classes by their bases, wherever in the project those are
+        if self._appEntrypoint is None or not os.path.isfile(self._appEntrypoint):
+            return
+        project_root = os.path.dirname(os.path.abspath(self._appEntrypoint))
+        lattice = CppTypeLattice()
+        for _, classes in project_classes(project_modules(project_root, entry_filename=self._appEntrypoint)).values():
+            lattice.register_classes(classes)
+        self._typeModel.set_lattice(lattice)
+        
+    def load_type_coverage(self):
+        # Scopes are (module, class / function) tree items, with one child per site showing how often it ran
+        tree = self.typeCoverageTree
+        tree.setSortingEnabled(False)
+        tree.clear()
+        
+        if self._runtimeCheckFolder is None:
+            return
+        
+        store = RttiTypeStore(self._runtimeCheckFolder)
+        store.merge_shards()
+        coverage = store.site_coverage()
+        self._typeModel.set_site_locations(store.site_locations())
+        store.close()
+        
+        app_folder = os.path.dirname(self._appEntrypoint) if self._appEntrypoint else None
+        scope_items = {}
+        scope_counts = {}
+        
+        for filename, scope, local_id, lineno, hits in coverage:
+            key = (filename,)
+            item = scope_items.get(key)
+            if item is None:
+                module_name = os.path.relpath(filename, app_folder) if app_folder else filename
+                item = scope_items[key] = QTreeWidgetItem(tree, [module_name])
+            items = [item]
+            
+            for name in scope.split('.') if scope else ():
+                key += (name,)
+                item = scope_items.get(key)
+                if item is None:
+                    item = scope_items[key] = QTreeWidgetItem(items[-1], [name])
+                items.append(item)
+                
+            site_item = QTreeWidgetItem(items[-1], [local_id, '' if hits else 'never run'])
+            site_item.setData(2, Qt.ItemDataRole.DisplayRole, hits)
+            site_item.setData(3, Qt.ItemDataRole.DisplayRole, lineno)
+            
+            for item in items:
+                counts = scope_counts.setdefault(id(item), [item, 0, 0, 0])
+                counts[1] += hits != 0
+                counts[2] += 1
+                counts[3] += hits
+                
+        for item, run_count, site_count, hits in scope_counts.values():
+            item.setText(1, f'{run_count} / {site_count} ({100 * run_count // site_count}%)')
+            item.setData(2, Qt.ItemDataRole.DisplayRole, hits)
+            
+        tree.setSortingEnabled(True)
+        
+    def toggle_cpp_generation(self):
+        if self._cppGenerator is not None:
+            self._cppGenerator.requestInterruption()
+            self.statusbar.showMessage("Cancelling C++ generation...")
+        else:
+            self.start_cpp_generation()
+            
+    def start_cpp_generation(self):
+        try:
+            if self._appEntrypoint is None or not self._cppOutputFolder:
+                self.statusbar.showMessage("Choose the Python app entrypoint and the C++ output folder first.")
+                return
+            
+            # Only modules whose source or types changed since the last generation are written again
+            generator = CppGeneratorRunner(os.path.dirname(os.path.abspath(self._appEntrypoint)),
+                                           self._cppOutputFolder, self._typeTable, parent=self,
+                                           entry_filename=self._appEntrypoint)
+            generator.progressChanged.connect(self.cpp_generation_progress)
+            generator.generated.connect(self.cpp_generated)
+            generator.generateError.connect(self.cpp_generation_error)
+            generator.finished.connect(self.cpp_generation_finished)
+            self._cppGenerator = generator
+            self.generateCppCodeButton.setText("Cancel C++ Generation")
+            generator.start()
+            
+        except:
+            self.display_error_message(MainWindow, MainWindow.start_cpp_generation, None, traceback.format_exc(), parent=self)
+            
+    def cpp_generation_progress(self, done, total):
+        self.statusbar.showMessage(f"Generating C++: {done} / {total} modules")
+        
+    def cpp_generated(self, results):
+        # One row per module: Python module, its C++ files, and what happened to them
+        table = self.tableWidget
+        table.setSortingEnabled(False)
+        table.setRowCount(0)
+        table.setRowCount(len(results))
+        project_root = self._cppGenerator.project_root()
+        errors = {}
+        
+        for row, (filename, (status, error)) in enumerate(sorted(results.items())):
+            rel_path = os.path.relpath(filename, project_root).replace(os.sep, '/')
+            table.setItem(row, 0, QTableWidgetItem(rel_path))
+            table.setItem(row, 1, QTableWidgetItem(', '.join(output_filenames(rel_path))))
+            table.setItem(row, 2, QTableWidgetItem(status))
+            if error is not None:
+                errors[filename] = error
+                
+        table.setSortingEnabled(True)
+        written = sum(status == 'written' for status, _ in results.values())
+        self.statusbar.showMessage(f"Generated C++ for {len(results)} modules, {written} rewritten.")
+        
+        if errors:
+            msg = '\n'.join(f'{filename}:\n{error}' for filename, error in errors.items())
+            self.display_error_message(CppGeneratorRunner, CppGeneratorRunner.run, None, msg, parent=self)
+            
+    def cpp_generation_error(self, error):
+        self.display_error_message(CppGeneratorRunner, CppGeneratorRunner.run, None, error, parent=self)
+        
+    def cpp_generation_finished(self):
+        if self._cppGenerator.isInterruptionRequested():
+            self.statusbar.showMessage("C++ generation cancelled.")
+        self._cppGenerator.deleteLater()
+        self._cppGenerator = None
+        self.generateCppCodeButton.setText("Generate C++ Code")
+        
+    def reset_type_check(self):
+        if self._rttiRunner is not None:
+            self.statusbar.showMessage("Cancel the running type check first.")
+            return
+        try:
+            if self._runtimeCheckFolder is not None:
+                store = RttiTypeStore(self._runtimeCheckFolder)
+                store.clear()
+                store.close()
+            self.clear_type_rows()
+            self.load_type_coverage()
+            self.statusbar.showMessage("Type check reset.")
+        except:
+            self.display_error_message(MainWindow, MainWindow.reset_type_check, None, traceback.format_exc(), parent=self)
+            
+    def clear_type_rows(self):
+        self._typeTable.clear()
+        self._typeModel.reload()
+        
     def closeEvent(self, event):
         self.save()
         self.save_last_session()
@@ -83,9 +372,21 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if self._saveFilename is None:
             self.save_as()
         
-        try:            
-            with open(self._saveFilename, 'wb') as save_file:
-                pickle.dump(self, save_file)
+        try:
+            if self._project is None:
+                self._project = ProjectFile(self._saveFilename)
+                
+            project = self._project
+            project.set_setting('app entrypoint', self.app_entrypoint())
+            project.set_setting('runtime check folder', self.runtime_check_folder())
+            project.set_setting('cpp output folder', self.cpp_output_folder())
+            
+            # Only a changed type table is written again
+            if self._typeTable.revision() != self._savedTypesRevision:
+                project.set_section('types', self._typeTable.to_bytes())
+                self._savedTypesRevision = self._typeTable.revision()
+                
+            project.save(self._saveFilename)
             self._saved = True
             
             self.setWindowTitle(self._appTitle)
@@ -160,6 +461,23 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         except:            
             self.display_error_message(MainWindow, MainWindow.display_runtime_check_folder_dialog, None, traceback.format_exc(), parent=self)
             
+    def display_cpp_output_folder_dialog(self):
+        try:
+            if self._cppOutputFolder is None:
+                cpp_output_dir = '.'
+            else:
+                cpp_output_dir = os.path.dirname(self._cppOutputFolder)
+                
+            cpp_output_folder = QFileDialog.getExistingDirectory(
+                parent=self, caption="Choose C++ Code Output Folder",
+                directory=cpp_output_dir, options=QFileDialog.Option.ShowDirsOnly)
+            
+            if os.path.exists(cpp_output_folder):
+                self.set_cpp_output_folder(cpp_output_folder)
+            
+        except:            
+            self.display_error_message(MainWindow, MainWindow.display_cpp_output_folder_dialog, None, traceback.format_exc(), parent=self)
+            
     @staticmethod
     def load_last_session():
         try:
@@ -167,11 +485,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 with open(MainWindow._lastSessionPtr, 'rb') as last_session_ptr:
                     last_project_filename = pickle.load(last_session_ptr)
                     
-                with open(last_project_filename, 'rb') as last_project_file:
-                    window = pickle.load(last_project_file)
-                    window._saveFilename = last_project_filename
-                
-                return window
+                return MainWindow.open_project(last_project_filename)
             
         except:
             MainWindow.display_error_message(MainWindow, MainWindow.save, None, traceback.format_exc())
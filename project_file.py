@@ -0,0 +1,252 @@
+import json
+import mmap
+import os
+import pickle
+import struct
+
+class LegacyProject:
+    # Stands in for the MainWindow pickled by old versions, so reading one never builds a window
+    def __setstate__(self, state):
+        self.state = state
+
+
+class LegacyProjectUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if (module, name) == ('dlg.main_window', 'MainWindow'):
+            return LegacyProject
+        raise pickle.UnpicklingError(f"Unexpected {module}.{name} in a legacy project file")
+
+
+class ProjectFile:
+    """
+    A project on disk: a fixed preamble, then section blobs, then a JSON
+    directory holding the (small) settings and where each section is.
+
+        preamble:   magic, format version, directory offset and length
+        sections:   opaque bytes, e.g. RttiTypeTable.to_bytes()
+        directory:  {"settings": {...}, "sections": {name: [offset, length]}}
+
+    Opening reads only the preamble and the directory; a section is read
+    through a memory map the first time it is asked for.  Saving appends
+    the sections that changed and a new directory, then points the preamble
+    at it, so an unchanged type table is never rewritten.  The file is
+    compacted (rewritten whole) once superseded data outweighs live data.
+
+    Old projects were a pickled MainWindow holding a dict of settings; they
+    are read as format version 0 and saved in the current format.
+    """
+    _magic = b'PQ2C'
+    _format_version = 1
+    _preamble = struct.Struct('<4sHxxQQ')
+    _min_compact_bytes = 1024 * 1024
+
+    def __init__(self, filename: str):
+        self._filename = filename
+        self._version = self._format_version
+        self._settings = {}
+        self._sections = {}
+        self._dirtySections = {}
+        self._settingsDirty = False
+        self._fileSize = 0
+        self._map = None
+        self._file = None
+
+        if os.path.exists(filename):
+            self.read_directory()
+
+    def filename(self):
+        return self._filename
+
+    def version(self):
+        # Format version the file was read as; 0 for a legacy pickle
+        return self._version
+
+    def read_directory(self):
+        with open(self._filename, 'rb') as project_file:
+            preamble = project_file.read(self._preamble.size)
+
+            if preamble[:1] == pickle.PROTO:
+                project_file.seek(0)
+                self.read_legacy_pickle(project_file)
+                return
+
+            magic, version, offset, length = self._preamble.unpack(preamble)
+            if magic != self._magic:
+                raise ValueError(f"{self._filename} is not a project file")
+            if version > self._format_version:
+                raise ValueError(f"{self._filename} needs a newer version (format {version})")
+
+            project_file.seek(offset)
+            directory = json.loads(project_file.read(length))
+            self._fileSize = project_file.seek(0, os.SEEK_END)
+
+        self._version = version
+        self._settings = directory['settings']
+        self._sections = {name: tuple(location) for name, location in directory['sections'].items()}
+
+    def read_legacy_pickle(self, project_file):
+        legacy = LegacyProjectUnpickler(project_file).load()
+        self._version = 0
+        self._settings = dict(legacy.state)
+        self._settingsDirty = True
+
+    def settings(self):
+        return self._settings
+
+    def set_setting(self, name: str, value):
+        if self._settings.get(name) != value:
+            self._settings[name] = value
+            self._settingsDirty = True
+
+    def setting(self, name: str, default=None):
+        return self._settings.get(name, default)
+
+    def has_section(self, name: str):
+        return name in self._dirtySections or name in self._sections
+
+    def section(self, name: str):
+        # A read-only view valid until the next save; None if there's no such section
+        if name in self._dirtySections:
+            return memoryview(self._dirtySections[name])
+        if name not in self._sections:
+            return None
+
+        offset, length = self._sections[name]
+        if self._map is None:
+            self._file = open(self._filename, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)[offset:offset + length]
+
+    def set_section(self, name: str, data: bytes):
+        self._dirtySections[name] = bytes(data)
+
+    def is_modified(self):
+        return self._settingsDirty or bool(self._dirtySections)
+
+    def save(self, filename=None):
+        if filename is not None and filename != self._filename:
+            # Save as: the new file gets every section
+            for name in self._sections:
+                if name not in self._dirtySections:
+                    self._dirtySections[name] = bytes(self.section(name))
+            self.release()
+            self._filename = filename
+            self._sections = {}
+            self._fileSize = 0
+
+        if not self.is_modified() and self._version == self._format_version and os.path.exists(self._filename):
+            return
+
+        live_bytes = sum(length for name, (_, length) in self._sections.items() if name not in self._dirtySections)
+        garbage_bytes = self._fileSize - self._preamble.size - live_bytes
+
+        if self._version != self._format_version or not self._sections or \
+                garbage_bytes > max(live_bytes, self._min_compact_bytes):
+            self.rewrite()
+        else:
+            self.append()
+
+        self._version = self._format_version
+        self._dirtySections = {}
+        self._settingsDirty = False
+
+    def append(self):
+        # Incremental save: new data is written and synced before the preamble points at it
+        self.release()
+        with open(self._filename, 'r+b') as project_file:
+            project_file.seek(0, os.SEEK_END)
+            sections = dict(self._sections)
+
+            for name, data in self._dirtySections.items():
+                sections[name] = (project_file.tell(), len(data))
+                project_file.write(data)
+
+            directory_offset, directory_length = self.write_directory(project_file, sections)
+            project_file.flush()
+            os.fsync(project_file.fileno())
+
+            project_file.seek(0)
+            project_file.write(self._preamble.pack(self._magic, self._format_version, directory_offset, directory_length))
+            self._fileSize = project_file.seek(0, os.SEEK_END)
+
+        self._sections = sections
+
+    def rewrite(self):
+        # Writes every live section to a new file that then replaces the old one
+        data = {name: bytes(self.section(name)) for name in self._sections if name not in self._dirtySections}
+        data.update(self._dirtySections)
+        self.release()
+
+        temp_filename = f'{self._filename}.{os.getpid()}.tmp'
+        sections = {}
+        try:
+            with open(temp_filename, 'wb') as project_file:
+                project_file.write(self._preamble.pack(self._magic, self._format_version, 0, 0))
+                for name, section_data in data.items():
+                    sections[name] = (project_file.tell(), len(section_data))
+                    project_file.write(section_data)
+
+                directory_offset, directory_length = self.write_directory(project_file, sections)
+                project_file.seek(0)
+                project_file.write(self._preamble.pack(self._magic, self._format_version, directory_offset, directory_length))
+                self._fileSize = project_file.seek(0, os.SEEK_END)
+            os.replace(temp_filename, self._filename)
+        finally:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+
+        self._sections = sections
+
+    def write_directory(self, project_file, sections):
+        directory = json.dumps({'settings': self._settings, 'sections': sections}).encode()
+        offset = project_file.tell()
+        project_file.write(directory)
+        return offset, len(directory)
+
+    def release(self):
+        # Drops the memory map, e.g. before the file is written
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+            self._file = None
+
+    def close(self):
+        self.release()
+
+
+if __name__ == '__main__':
+    # Open / save times of a project holding a large type table
+    from rtti_table import RttiTypeTable
+    import tempfile
+    import time
+
+    table = RttiTypeTable()
+    rows = table.add_sites(f'module{k // 100}.pyf{k % 100}x' for k in range(100000))
+    type_ids = table.intern_types(['builtins.int', 'builtins.str', 'builtins.list[builtins.int]'])
+    for row in rows:
+        table.add_type(row, type_ids[row % 3])
+        table.set_hits(row, row)
+
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, 'bench.pyqt-c++')
+        project = ProjectFile(filename)
+        start = time.perf_counter()
+        project.set_setting('app entrypoint', 'main.py')
+        project.set_section('types', table.to_bytes())
+        project.save()
+        print(f'first save: {(time.perf_counter() - start) * 1000:.1f} ms, {os.path.getsize(filename)} bytes')
+
+        project.set_setting('app entrypoint', 'app.py')
+        start = time.perf_counter()
+        project.save()
+        print(f'settings-only save: {(time.perf_counter() - start) * 1000:.1f} ms')
+        project.close()
+
+        start = time.perf_counter()
+        project = ProjectFile(filename)
+        print(f'open: {(time.perf_counter() - start) * 1000:.2f} ms, {project.settings()}')
+        start = time.perf_counter()
+        loaded = RttiTypeTable.from_bytes(project.section('types'))
+        print(f'type table section: {(time.perf_counter() - start) * 1000:.1f} ms, {loaded.row_count()} rows')
+        project.close()
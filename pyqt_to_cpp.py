@@ -1,15 +1,235 @@
-from PyQt6.QtWidgets import QApplication
+import argparse
+import os
 import sys
-from dlg.main_window import MainWindow
 
-if __name__ == '__main__':
+# Without arguments the GUI starts; with a command everything runs headless and
+# only what that command needs is imported (QtWidgets never is).
+
+def instrument(args):
+    from rtti_batch import instrument_project
+
+    def progress(done, total):
+        print(f'\rInstrumenting modules: {done} / {total}', end='', file=sys.stderr)
+
+    errors = instrument_project(args.project_root, args.runtime_check_folder, args.include, args.exclude,
+                                transformer_type(args), max_workers=args.jobs, progress=progress)
+    print(file=sys.stderr)
+    print_instrument_errors(errors)
+    return 1 if errors else 0
+
+
+def transformer_type(args):
+    from rtti_transformer import RttiTransformer, RttiLoopTransformer
+    return RttiLoopTransformer if args.hoist_loop_probes else RttiTransformer
+
+
+def print_instrument_errors(errors):
+    for filename, error in errors.items():
+        print(f'{filename}:\n{error}', file=sys.stderr)
+
+
+def run(args):
+    """
+    Runs the same sessions the GUI runs, on a QCoreApplication.  With
+    --sessions N the app runs N times at once, each told its number by the
+    PYQT_TO_CPP_SESSION environment variable (e.g. to pick a script of
+    inputs).  Every session leaves its own shard, merged into the type store
+    once all have finished.
+    """
+    from PyQt6.QtCore import QCoreApplication
+    from rtti_runner import RttiRunner
+
+    app = QCoreApplication([])
+
+    if args.trace:
+        if args.runtime_check_folder is None:
+            print('--trace needs a --runtime-check-folder to write the trace into', file=sys.stderr)
+            return 1
+        import rtti_trace
+        rtti_trace.enable(rtti_trace.trace_folder(args.runtime_check_folder))
+        rtti_trace.set_process_name('pyqt_to_cpp run')
+
+    if args.instrument_ahead and args.runtime_check_folder is not None:
+        from rtti_batch import instrument_project
+        print_instrument_errors(instrument_project(
+            os.path.dirname(os.path.abspath(args.app_entry_filename)), args.runtime_check_folder,
+            args.include, args.exclude, transformer_type(args)))
+
+    environment = dict(variable.split('=', 1) for variable in args.env or ())
+    exit_codes = []
+
+    def session_finished(exit_code):
+        exit_codes.append(exit_code)
+        if len(exit_codes) == args.sessions:
+            app.quit()
+
+    for session in range(args.sessions):
+        runner = RttiRunner(args.app_entry_filename, transformer_type(args), parent=app, include=args.include,
+                            exclude=args.exclude, runtime_check_folder=args.runtime_check_folder,
+                            saturation=args.saturation, backend=args.backend,
+                            environment={**environment, 'PYQT_TO_CPP_SESSION': str(session)})
+        runner.appOutput.connect(sys.stdout.write)
+        runner.appErrorOutput.connect(sys.stderr.write)
+        runner.appFinished.connect(session_finished)
+        runner.launch()
+
+    app.exec()
+
+    if args.runtime_check_folder is not None:
+        from rtti_store import RttiTypeStore
+        store = RttiTypeStore(args.runtime_check_folder)
+        print(f'Merged {store.merge_shards()} session(s) into {store.filename()}', file=sys.stderr)
+        store.close()
+
+    if args.trace:
+        trace_filename, totals = rtti_trace.merge_trace(rtti_trace.trace_folder(args.runtime_check_folder))
+        print(f'{rtti_trace.format_summary(totals)}\nTrace: {trace_filename}', file=sys.stderr)
+
+    return next((exit_code for exit_code in exit_codes if exit_code != 0), 0)
+
+
+def report(args):
+    from rtti_store import RttiTypeStore
+    from rtti_table import RttiTypeTable
+
+    if not os.path.isdir(args.runtime_check_folder):
+        print(f'No runtime check folder {args.runtime_check_folder}', file=sys.stderr)
+        return 1
+
+    store = RttiTypeStore(args.runtime_check_folder)
+    store.merge_shards()
+
+    if args.coverage and not store.module_keys():
+        print(f'No modules are indexed in {args.runtime_check_folder}: instrument the project, '
+              f'or run the app with this runtime check folder, first', file=sys.stderr)
+        store.close()
+        return 1
+    if args.coverage:
+        for filename, scope, local_id, lineno, hits in store.site_coverage():
+            if hits == 0 or not args.unexecuted:
+                print(f'{filename}:{lineno}\t{scope or "<module>"}\t{local_id}\t{hits}')
+    else:
+        type_table = RttiTypeTable()
+        store.load(type_table)
+        for row in range(type_table.row_count()):
+            type_names = type_table.type_names(row)
+            if len(type_names) != 1 or not args.unresolved:
+                print(f'{type_table.scoped_name(row)}\t{", ".join(type_names)}\t{type_table.hits(row)}')
+
+    print(f'{store.run_count()} runs', file=sys.stderr)
+    store.close()
+    return 0
+
+
+def generate(args):
+    # Typed from the runtime check folder's store; only changed modules are rewritten
+    from cpp_generator import generate_project, site_types
+    from rtti_table import RttiTypeTable
+
+    type_table = RttiTypeTable()
+    if args.runtime_check_folder is not None:
+        from rtti_store import RttiTypeStore
+        store = RttiTypeStore(args.runtime_check_folder)
+        store.merge_shards()
+        store.load(type_table)
+        store.close()
+
+    def progress(done, total):
+        print(f'\rGenerating modules: {done} / {total}', end='', file=sys.stderr)
+
+    results = generate_project(args.project_root, args.output_folder, site_types(type_table), args.include,
+                               args.exclude, max_workers=args.jobs, progress=progress, entry_filename=args.entry)
+    print(file=sys.stderr)
+
+    counts = {}
+    for filename, (status, error) in sorted(results.items()):
+        counts[status] = counts.get(status, 0) + 1
+        if error is not None:
+            print(f'{filename}:\n{error}', file=sys.stderr)
+    print(', '.join(f'{count} {status}' for status, count in sorted(counts.items())), file=sys.stderr)
+    return 1 if 'error' in counts else 0
+
+
+def run_gui():
+    from PyQt6.QtWidgets import QApplication
+    from dlg.main_window import MainWindow
+
     app = QApplication([])
-    
+
     window = MainWindow.load_last_session()
-    
+
     if window is None:
         window = MainWindow()
-        
+
     window.show()
-    
-    sys.exit(app.exec())
\ No newline at end of file
+
+    return app.exec()
+
+
+def positive_int(text: str):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive number')
+    return value
+
+
+def argument_parser():
+    parser = argparse.ArgumentParser(prog='python -m pyqt_to_cpp',
+                                     description="PyQtToCpp; starts the GUI when no command is given.")
+    commands = parser.add_subparsers(dest='command')
+
+    command = commands.add_parser('instrument', help="Instrument every project module into the code cache")
+    command.add_argument('project_root')
+    command.add_argument('runtime_check_folder')
+    command.add_argument('-j', '--jobs', type=int, default=None)
+    command.add_argument('--hoist-loop-probes', action='store_true',
+                         help="Instrument for run --hoist-loop-probes")
+    command.add_argument('--include', action='append', default=None)
+    command.add_argument('--exclude', action='append', default=None)
+    command.set_defaults(handler=instrument)
+
+    command = commands.add_parser('run', help="Run the app with runtime type recording")
+    command.add_argument('app_entry_filename')
+    command.add_argument('--runtime-check-folder', default=None,
+                         help="Code cache and type store; without one nothing is kept after the run")
+    command.add_argument('--instrument-ahead', action='store_true',
+                         help="Instrument every module on a process pool first")
+    command.add_argument('--backend', choices=('ast', 'monitoring'), default='ast')
+    command.add_argument('--sessions', type=positive_int, default=1, help="Number of sessions to run at once")
+    command.add_argument('--env', action='append', default=None, metavar='NAME=VALUE',
+                         help="Environment variable for the app, e.g. QT_QPA_PLATFORM=offscreen")
+    command.add_argument('--saturation', type=int, default=0)
+    command.add_argument('--hoist-loop-probes', action='store_true',
+                         help="Record assignments in loops on their first iterations and on exit only")
+    command.add_argument('--trace', action='store_true',
+                         help="Write a Chrome trace of every phase of the run into the runtime check folder")
+    command.add_argument('--include', action='append', default=None)
+    command.add_argument('--exclude', action='append', default=None)
+    command.set_defaults(handler=run)
+
+    command = commands.add_parser('report', help="Print the types (or coverage) kept in a runtime check folder")
+    command.add_argument('runtime_check_folder')
+    command.add_argument('--unresolved', action='store_true', help="Only sites without exactly one type")
+    command.add_argument('--coverage', action='store_true', help="Per-site hit counts instead of types")
+    command.add_argument('--unexecuted', action='store_true', help="With --coverage, only the sites that never ran")
+    command.set_defaults(handler=report)
+
+    command = commands.add_parser('generate', help="Generate C++ from the project, typed from a runtime check folder")
+    command.add_argument('project_root')
+    command.add_argument('output_folder')
+    command.add_argument('--runtime-check-folder', default=None)
+    command.add_argument('--entry', default=None, help="The app's entry script, whose classes runs record as __main__'s")
+    command.add_argument('-j', '--jobs', type=int, default=None)
+    command.add_argument('--include', action='append', default=None)
+    command.add_argument('--exclude', action='append', default=None)
+    command.set_defaults(handler=generate)
+
+    return parser
+
+
+if __name__ == '__main__':
+    args = argument_parser().parse_args()
+
+    if args.command is None:
+        sys.exit(run_gui())
+    sys.exit(args.handler(args))
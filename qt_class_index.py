@@ -0,0 +1,226 @@
+from array import array
+import enum
+import importlib
+import os
+import pkgutil
+import struct
+
+class QtClassIndex:
+    """
+    What C++ generation needs to know about every PyQt6 class and enum,
+    keyed by its recorded type name (e.g. 'PyQt6.QtWidgets.QSizePolicy.Policy'):
+
+        C++ name    QSizePolicy::Policy; flag enums become QFlags<Qt::AlignmentFlag>
+        header      the class's own include, QSizePolicy (nested types use their outer class's)
+        flags       QObject-derived (passed by pointer) / enum / flag enum
+        MRO         its PyQt6 bases, as rows of the index
+
+    Introspecting PyQt6 means importing every Qt module, so the index is
+    built once per installed PyQt6 / Qt version and saved next to this
+    module; qt_class_index() loads it on first use.
+    """
+    _magic = b'PQCI'
+    _format_version = 1
+    # Magic, format version, PyQt6 / Qt version string size, class count, MRO row count, names size
+    _header = struct.Struct('<4sHHIII')
+
+    is_qobject_flag = 1
+    is_enum_flag = 2
+    is_flag_enum_flag = 4
+
+    def __init__(self, versions: str, type_names, cpp_names, headers, flags, mros):
+        self._versions = versions
+        self._typeNames = type_names
+        self._cppNames = cpp_names
+        self._headers = headers
+        self._flags = flags
+        self._mros = mros
+        self._rows = {type_name: row for row, type_name in enumerate(type_names)}
+
+    @staticmethod
+    def installed_versions():
+        from PyQt6.QtCore import PYQT_VERSION_STR, QT_VERSION_STR
+        return f'{PYQT_VERSION_STR}/{QT_VERSION_STR}'
+
+    def versions(self):
+        return self._versions
+
+    def class_count(self):
+        return len(self._typeNames)
+
+    def row(self, type_name: str):
+        return self._rows.get(type_name)
+
+    def __contains__(self, type_name: str):
+        return type_name in self._rows
+
+    def cpp_name(self, type_name: str):
+        return self._cppNames[self._rows[type_name]]
+
+    def header(self, type_name: str):
+        return self._headers[self._rows[type_name]]
+
+    def is_qobject(self, type_name: str):
+        return bool(self._flags[self._rows[type_name]] & self.is_qobject_flag)
+
+    def is_enum(self, type_name: str):
+        return bool(self._flags[self._rows[type_name]] & self.is_enum_flag)
+
+    def mro(self, type_name: str):
+        # The class and its PyQt6 bases, in method resolution order
+        return tuple(self._typeNames[row] for row in self._mros[self._rows[type_name]])
+
+    @classmethod
+    def build(cls):
+        # Imports every importable Qt module of the installed PyQt6
+        import PyQt6
+        from PyQt6.QtCore import QObject
+
+        classes = []
+        for module_info in pkgutil.iter_modules(PyQt6.__path__):
+            if not module_info.name.startswith('Qt'):
+                continue
+            try:
+                module = importlib.import_module(f'PyQt6.{module_info.name}')
+            except ImportError:
+                continue    # Its Qt libraries aren't installed
+            for Type in vars(module).values():
+                if isinstance(Type, type) and Type.__module__ == module.__name__:
+                    cls.collect_classes(Type, classes)
+
+        type_names = [f'{Type.__module__}.{Type.__qualname__}' for Type in classes]
+        rows = {Type: row for row, Type in enumerate(classes)}
+        cpp_names = []
+        headers = []
+        flags = array('B')
+        mros = []
+
+        for Type in classes:
+            cpp_name = Type.__qualname__.replace('.', '::')
+            is_enum = issubclass(Type, enum.Enum)
+            is_flag_enum = issubclass(Type, enum.Flag)
+            if is_flag_enum:
+                cpp_name = f'QFlags<{cpp_name}>'
+            cpp_names.append(cpp_name)
+
+            outer_name = Type.__qualname__.partition('.')[0]
+            # Qt's own namespace has no header named after it
+            headers.append('QtCore/qnamespace.h' if outer_name == 'Qt' else f'{Type.__module__[6:]}/{outer_name}')
+
+            flags.append((cls.is_qobject_flag if issubclass(Type, QObject) else 0) |
+                         (cls.is_enum_flag if is_enum else 0) | (cls.is_flag_enum_flag if is_flag_enum else 0))
+            mros.append([rows[Base] for Base in Type.__mro__ if Base in rows])
+
+        return cls(cls.installed_versions(), type_names, cpp_names, headers, flags, mros)
+
+    @classmethod
+    def collect_classes(cls, Type, classes):
+        # The class and the classes and enums nested in it, e.g. QSizePolicy.Policy
+        classes.append(Type)
+        for Nested in vars(Type).values():
+            if isinstance(Nested, type) and Nested.__qualname__ == f'{Type.__qualname__}.{Nested.__name__}':
+                cls.collect_classes(Nested, classes)
+
+    def to_bytes(self) -> bytes:
+        versions = self._versions.encode()
+        names = '\n'.join(f'{type_name}\t{cpp_name}\t{header}' for type_name, cpp_name, header in
+                          zip(self._typeNames, self._cppNames, self._headers)).encode()
+        mro_counts = array('H', map(len, self._mros))
+        mro_rows = array('I', (row for mro in self._mros for row in mro))
+        header = self._header.pack(self._magic, self._format_version, len(versions), len(self._typeNames),
+                                   len(mro_rows), len(names))
+        return b''.join((header, versions, bytes(self._flags), mro_counts.tobytes(), mro_rows.tobytes(), names))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = memoryview(data)
+        magic, version, versions_size, class_count, mro_row_count, names_size = cls._header.unpack_from(data)
+        if magic != cls._magic or version != cls._format_version:
+            raise ValueError("Not a Qt class index of this format version")
+
+        offset = cls._header.size
+        versions = bytes(data[offset:offset + versions_size]).decode()
+        offset += versions_size
+        flags = array('B', data[offset:offset + class_count])
+        offset += class_count
+        mro_counts = array('H')
+        mro_counts.frombytes(data[offset:offset + 2 * class_count])
+        offset += 2 * class_count
+        mro_rows = array('I')
+        mro_rows.frombytes(data[offset:offset + 4 * mro_row_count])
+        offset += 4 * mro_row_count
+        lines = bytes(data[offset:offset + names_size]).decode().split('\n')
+
+        type_names = []
+        cpp_names = []
+        headers = []
+        for line in lines:
+            type_name, cpp_name, header = line.split('\t')
+            type_names.append(type_name)
+            cpp_names.append(cpp_name)
+            headers.append(header)
+
+        mros = []
+        k = 0
+        for count in mro_counts:
+            mros.append(mro_rows[k:k + count])
+            k += count
+        return cls(versions, type_names, cpp_names, headers, flags, mros)
+
+    def save(self, filename: str):
+        temp_filename = f'{filename}.{os.getpid()}.tmp'
+        with open(temp_filename, 'wb') as index_file:
+            index_file.write(self.to_bytes())
+        os.replace(temp_filename, filename)
+
+    @classmethod
+    def load(cls, filename: str):
+        with open(filename, 'rb') as index_file:
+            return cls.from_bytes(index_file.read())
+
+
+default_index_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'qt_class_index.bin')
+_index = None
+
+def qt_class_index(filename=default_index_filename) -> QtClassIndex:
+    """
+    The index of the installed PyQt6, loaded once per process.  A missing
+    index, or one built for another PyQt6 / Qt version, is built again and
+    saved if the folder is writable.
+    """
+    global _index
+    if _index is None:
+        try:
+            _index = QtClassIndex.load(filename)
+            if _index.versions() != QtClassIndex.installed_versions():
+                _index = None
+        except (OSError, ValueError, struct.error):
+            _index = None
+
+        if _index is None:
+            _index = QtClassIndex.build()
+            try:
+                _index.save(filename)
+            except OSError:
+                pass
+    return _index
+
+
+if __name__ == '__main__':
+    # (Re)builds the index of the installed PyQt6 and times loading it
+    import time
+
+    start = time.perf_counter()
+    index = QtClassIndex.build()
+    index.save(default_index_filename)
+    print(f'built {index.class_count()} classes in {(time.perf_counter() - start) * 1000:.0f} ms, '
+          f'{os.path.getsize(default_index_filename)} bytes, PyQt6/Qt {index.versions()}')
+
+    start = time.perf_counter()
+    index = QtClassIndex.load(default_index_filename)
+    print(f'loaded in {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    for type_name in ('PyQt6.QtWidgets.QLabel', 'PyQt6.QtWidgets.QSizePolicy.Policy', 'PyQt6.QtCore.Qt.AlignmentFlag',
+                      'PyQt6.QtGui.QColor'):
+        print(f'{type_name}: {index.cpp_name(type_name)} <{index.header(type_name)}> '
+              f'qobject={index.is_qobject(type_name)} mro={index.mro(type_name)}')
@@ -1,6 +1,269 @@
 from PyQt6.QtCore import QObject
+from collections import deque
+from itertools import islice
+from array import array
+from types import GenericAlias
+import rtti_trace
+import threading
+import traceback
+import weakref
 
 singleton = None
+singleton_lock = threading.RLock()
+
+def type_name(Type) -> str:
+    if isinstance(Type, GenericAlias):
+        args = ', '.join('...' if arg is Ellipsis else type_name(arg) for arg in Type.__args__)
+        return f'{type_name(Type.__origin__)}[{args}]'
+    return f'{Type.__module__}.{Type.__qualname__}'
+
+
+# Container element samplers: each looks at no more than about 2 * sample_size
+# elements and returns the container's parameterized types, e.g. {list[int],
+# list[str]}, or just its plain type when it is empty.  Sequences are sampled
+# at a stride whose offset rotates from call to call.
+
+def strided_sample(sequence, sample_size: int, rotation: int):
+    size = len(sequence)
+    if size <= sample_size:
+        return sequence
+    step = size // sample_size
+    return sequence[rotation % step::step]
+
+def sample_list(value, sample_size: int, rotation: int):
+    Type = type(value)
+    return {Type[Element] for Element in {type(element) for element in strided_sample(value, sample_size, rotation)}} or {Type}
+
+def sample_tuple(value, sample_size: int, rotation: int):
+    # Taken as homogeneous, tuple[T, ...]
+    return {tuple[Element, ...] for Element in {type(element) for element in strided_sample(value, sample_size, rotation)}} or {tuple}
+
+def sample_iterable(value, sample_size: int, rotation: int):
+    Type = type(value)
+    return {Type[Element] for Element in {type(element) for element in islice(value, sample_size)}} or {Type}
+
+def sample_dict(value, sample_size: int, rotation: int):
+    Type = type(value)
+    items = islice(value.items(), sample_size)
+    return {Type[Key, Value] for Key, Value in {(type(key), type(element)) for key, element in items}} or {Type}
+
+element_samplers = {
+    list: sample_list,
+    tuple: sample_tuple,
+    set: sample_iterable,
+    frozenset: sample_iterable,
+    deque: sample_iterable,
+    dict: sample_dict,
+}
+
+
+class RttiThreadBuffer:
+    """
+    One thread's recording state for a site table.  Only the owning thread
+    writes to it, so probes never take a lock; types new to the thread queue
+    up in pending until the registry merges them.
+
+    Containers are recorded as their parameterized types, from a sample of
+    their elements.  sampling[site] counts down the samples left before the
+    site's element types are taken as stable; a new one resets it.
+    """
+    __slots__ = ('hits', 'lastTypes', 'siteTypes', 'streaks', 'sampling', 'pending',
+                 'sampleSize', 'stableSamples', '__weakref__')
+
+    def __init__(self, site_count: int, sample_size=8, stable_samples=16):
+        self.hits = [0] * site_count
+        self.lastTypes = [None] * site_count
+        self.siteTypes = [None] * site_count
+        self.streaks = [0] * site_count
+        self.sampling = [0] * site_count
+        self.pending = deque()
+        self.sampleSize = sample_size
+        self.stableSamples = stable_samples
+
+    def observe(self, site: int, value) -> bool:
+        # Returns whether the value's type is new to the site in this thread
+        Type = type(value)
+        self.lastTypes[site] = Type
+        if self.sampleSize and Type in element_samplers:
+            self.sampling[site] = self.stableSamples
+            return self.sample(site, value)
+        self.sampling[site] = 0
+        return self.add(site, Type)
+
+    def sample(self, site: int, value) -> bool:
+        is_new = False
+        for Type in element_samplers[type(value)](value, self.sampleSize, self.hits[site]):
+            if self.add(site, Type):
+                is_new = True
+        if is_new:
+            self.sampling[site] = self.stableSamples
+        else:
+            self.sampling[site] -= 1
+        return is_new
+
+    def add(self, site: int, Type) -> bool:
+        Types = self.siteTypes[site]
+        if Types is None:
+            Types = self.siteTypes[site] = set()
+        elif Type in Types:
+            return False
+        Types.add(Type)
+        self.pending.append((site, Type))
+        return True
+
+
+class RttiSiteTable:
+    """
+    Per-module table of instrumented assignment sites, preallocated when the
+    module is first executed.  Sites are dense integers local to the module;
+    the table's base turns them into registry-wide site IDs.
+    
+    Each thread records into its own RttiThreadBuffer.  Buffers are merged
+    into the table's type sets by Rtti.merge() and when their thread exits.
+    
+    With a nonzero saturation, a site whose type set hasn't grown for that
+    many consecutive calls in a thread is saturated: its flag in saturated()
+    is set, and instrumented code tests the flag instead of calling the
+    probe.  Every merge clears the flags, so a saturated site samples one
+    value per merge interval; a sample of a new type re-arms it.  Its hits
+    then count the calls until it saturated plus the samples.
+    
+    A nonzero sample_size has containers sampled for their element types (see
+    RttiThreadBuffer), until stable_samples samples in a row add nothing new.
+    """
+    def __init__(self, scoped_names, base: int, saturation=0, sample_size=8, stable_samples=16):
+        site_count = len(scoped_names)
+        self._scopedNames = tuple(scoped_names)
+        self._base = base
+        self._saturation = saturation
+        self._sampleSize = sample_size
+        self._stableSamples = stable_samples
+        self._siteTypeIds = [set() for _ in range(site_count)]
+        self._retiredHits = [0] * site_count
+        self._saturated = bytearray(site_count)
+        self._buffers = weakref.WeakSet()
+        self._local = threading.local()
+
+    def recorder(self):
+        # The probe called by instrumented code; only a new type leaves the fast path
+        local = self._local
+        thread_buffer = self.thread_buffer
+
+        if not self._saturation:
+            def record(value, site):
+                try:
+                    buffer = local.buffer
+                except AttributeError:
+                    buffer = thread_buffer()
+                buffer.hits[site] += 1
+                if buffer.lastTypes[site] is not type(value):
+                    buffer.observe(site, value)
+                elif buffer.sampling[site]:
+                    buffer.sample(site, value)
+                return value
+
+            return record
+
+        saturation = self._saturation
+        saturated = self._saturated
+
+        def record(value, site):
+            # Instrumented code tests the flag before calling; the monitoring backend doesn't
+            if saturated[site]:
+                return value
+            try:
+                buffer = local.buffer
+            except AttributeError:
+                buffer = thread_buffer()
+
+            buffer.hits[site] += 1
+            if buffer.lastTypes[site] is not type(value):
+                is_new = buffer.observe(site, value)
+            else:
+                is_new = buffer.sampling[site] and buffer.sample(site, value)
+            if is_new:
+                buffer.streaks[site] = 0
+            else:
+                streaks = buffer.streaks
+                streaks[site] += 1
+                if streaks[site] >= saturation:
+                    saturated[site] = 1
+            return value
+
+        return record
+
+    def thread_buffer(self) -> RttiThreadBuffer:
+        buffer = RttiThreadBuffer(self.site_count(), self._sampleSize, self._stableSamples)
+        self._local.buffer = buffer
+        with Rtti.lock():
+            self._buffers.add(buffer)
+        # Runs once the thread exits and its thread-local storage is released.  Not at interpreter
+        # exit: the buffer is still live then and counted as such.
+        weakref.finalize(buffer, self._retire, buffer.hits, buffer.pending).atexit = False
+        return buffer
+
+    def _retire(self, hits, pending):
+        with Rtti.lock():
+            for site, count in enumerate(hits):
+                self._retiredHits[site] += count
+            self._merge_pending(pending)
+
+    def merge(self):
+        # Caller holds Rtti.lock()
+        for buffer in list(self._buffers):
+            self._merge_pending(buffer.pending)
+        if self._saturation:
+            # Saturated sites take their next call as a sample
+            self._saturated[:] = bytes(len(self._saturated))
+
+    def _merge_pending(self, pending):
+        registry = Rtti._instance()
+        while pending:
+            site, Type = pending.popleft()
+            type_ids = self._siteTypeIds[site]
+            type_id = registry._type_id(Type)
+            if type_id not in type_ids:
+                type_ids.add(type_id)
+                registry._new_observation(self._base + site, type_id)
+
+    def is_saturated(self, site: int):
+        return self._saturated[site] != 0
+
+    def saturated(self) -> bytearray:
+        # One flag per site, shared by all threads; set while the site's probe is skipped
+        return self._saturated
+
+    def base(self):
+        return self._base
+
+    def site_count(self):
+        return len(self._scopedNames)
+
+    def scoped_name(self, site: int):
+        return self._scopedNames[site]
+
+    def type_ids(self, site: int):
+        # Only what has been merged so far
+        return self._siteTypeIds[site]
+
+    def hits(self, site: int):
+        with Rtti.lock():
+            buffers = list(self._buffers)
+            hits = self._retiredHits[site]
+        return hits + sum(buffer.hits[site] for buffer in buffers)
+
+
+class RttiMergeListener:
+    # A merge listener and how much of the registry it has been sent
+    __slots__ = ('listener', 'tableCount', 'typeCount', 'backlog')
+
+    def __init__(self, listener, backlog):
+        self.listener = listener
+        self.tableCount = 0
+        self.typeCount = 0
+        # Observations made before it was added, sent with its first batch
+        self.backlog = backlog
+
 
 class Rtti(QObject):
     def __new__(cls):
@@ -8,31 +271,229 @@ class Rtti(QObject):
         if singleton is None:
             singleton = super().__new__(cls)
         return singleton
-    
+
     def __init__(self):
         self._rttiTypes = {}
-       
+        self._siteTables = []
+        self._siteCount = 0
+        self._typeIds = {}
+        self._typeList = []
+        self._saturation = 0
+        self._sampleSize = 8
+        self._stableSamples = 16
+        self._merger = None
+        self._mergeListeners = []
+        self._newObservations = array('I')
+        # Held while listeners are called, outside singleton_lock, so batches reach them in order
+        self._publishLock = threading.RLock()
+
     @staticmethod
     def types():
         return Rtti._instance()._types()
-    
+
     def _types(self):
-        return self._rttiTypes
-        
+        self._merge()
+        # Sites sharing a scoped name (e.g. reassignments of one local) are merged
+        types = {scoped_name: set(Types) for scoped_name, Types in self._rttiTypes.items()}
+        for table in self._siteTables:
+            for site in range(table.site_count()):
+                type_ids = table.type_ids(site)
+                if type_ids:
+                    Types = types.setdefault(table.scoped_name(site), set())
+                    Types.update(self._typeList[type_id] for type_id in type_ids)
+        return types
+
     @staticmethod
     def add_type(scoped_name: str, Type):
         Rtti._instance()._add_type(scoped_name, Type)
-        
-    def _add_type(self, scoped_name: str, Type):        
-        if scoped_name not in self._rttiTypes:
-            self._rttiTypes[scoped_name] = set()
-        self._rttiTypes[scoped_name].add(Type)
-        
+
+    def _add_type(self, scoped_name: str, Type):
+        with singleton_lock:
+            if scoped_name not in self._rttiTypes:
+                self._rttiTypes[scoped_name] = set()
+            self._rttiTypes[scoped_name].add(Type)
+
+    @staticmethod
+    def register_sites(scoped_names) -> RttiSiteTable:
+        return Rtti._instance()._register_sites(scoped_names)
+
+    def _register_sites(self, scoped_names) -> RttiSiteTable:
+        with singleton_lock:
+            table = RttiSiteTable(scoped_names, self._siteCount, self._saturation, self._sampleSize,
+                                  self._stableSamples)
+            self._siteCount += table.site_count()
+            self._siteTables.append(table)
+        return table
+
+    @staticmethod
+    def merge():
+        Rtti._instance()._merge()
+
+    def _merge(self):
+        # Moves every thread's new observations into the site tables in one batch
+        with self._publishLock:
+            with singleton_lock, rtti_trace.span('merge', 'recorder'):
+                for table in self._siteTables:
+                    table.merge()
+                batches = self._publish_batches()
+            # A listener may block (e.g. on a socket); imports and threads only wait for singleton_lock
+            for merge_listener, batch in batches:
+                try:
+                    merge_listener.listener(*batch)
+                except Exception:
+                    # Merging, and the other listeners, go on without it; it has missed this batch anyway
+                    traceback.print_exc()
+                    with singleton_lock:
+                        if merge_listener in self._mergeListeners:
+                            self._mergeListeners.remove(merge_listener)
+
+    def _new_observation(self, site: int, type_id: int):
+        if self._mergeListeners:
+            self._newObservations.append(site)
+            self._newObservations.append(type_id)
+
+    def _publish_batches(self):
+        # With the lock held: each listener's (site_tables, first_type_id, Types, observations) since its last batch
+        observations = self._newObservations
+        self._newObservations = array('I')
+        batches = []
+        for merge_listener in self._mergeListeners:
+            site_tables = self._siteTables[merge_listener.tableCount:]
+            first_type_id = merge_listener.typeCount
+            Types = self._typeList[first_type_id:]
+            listener_observations = observations
+            if merge_listener.backlog is not None:
+                listener_observations = merge_listener.backlog + observations
+                merge_listener.backlog = None
+            if site_tables or Types or listener_observations:
+                merge_listener.tableCount = len(self._siteTables)
+                merge_listener.typeCount = len(self._typeList)
+                batches.append((merge_listener, (site_tables, first_type_id, Types, listener_observations)))
+        return batches
+
+    @staticmethod
+    def add_merge_listener(listener):
+        """
+        listener(site_tables, first_type_id, Types, observations) is called
+        after each merge with what is new since the previous one: newly
+        registered site tables, newly interned types and a flat array of
+        (registry-wide site ID, type ID) pairs.  It is called without the
+        registry's lock, so a slow listener only holds up merging.
+        """
+        Rtti._instance()._add_merge_listener(listener)
+
+    def _add_merge_listener(self, listener):
+        with singleton_lock:
+            # A new listener starts from scratch; the others carry on from their last batch
+            backlog = array('I')
+            for table in self._siteTables:
+                for site in range(table.site_count()):
+                    for type_id in table.type_ids(site):
+                        backlog.extend((table.base() + site, type_id))
+            self._mergeListeners.append(RttiMergeListener(listener, backlog))
+
+    @staticmethod
+    def remove_merge_listener(listener):
+        Rtti._instance()._remove_merge_listener(listener)
+
+    def _remove_merge_listener(self, listener):
+        with singleton_lock:
+            self._mergeListeners[:] = [merge_listener for merge_listener in self._mergeListeners
+                                       if merge_listener.listener != listener]
+
+    @staticmethod
+    def start_merging(interval=0.5):
+        Rtti._instance()._start_merging(interval)
+
+    def _start_merging(self, interval=0.5):
+        if self._merger is not None:
+            return
+        stopped = threading.Event()
+
+        def merge_periodically():
+            while not stopped.wait(interval):
+                self._merge()
+
+        self._merger = threading.Thread(target=merge_periodically, name='RttiMerger', daemon=True)
+        self._merger.stopped = stopped
+        self._merger.start()
+
+    @staticmethod
+    def stop_merging():
+        Rtti._instance()._stop_merging()
+
+    def _stop_merging(self):
+        if self._merger is not None:
+            self._merger.stopped.set()
+            self._merger.join()
+            self._merger = None
+        self._merge()
+
+    @staticmethod
+    def lock():
+        return singleton_lock
+
+    @staticmethod
+    def set_adaptive(saturation: int):
+        # Applies to modules registered from now on; a saturation of 0 turns adaptive probes off
+        Rtti._instance()._set_adaptive(saturation)
+
+    def _set_adaptive(self, saturation: int):
+        self._saturation = saturation
+
+    @staticmethod
+    def set_element_sampling(sample_size: int, stable_samples=16):
+        # Applies to modules registered from now on; a sample size of 0 records containers' plain types
+        Rtti._instance()._set_element_sampling(sample_size, stable_samples)
+
+    def _set_element_sampling(self, sample_size: int, stable_samples=16):
+        self._sampleSize = sample_size
+        self._stableSamples = stable_samples
+
+    @staticmethod
+    def site_summaries():
+        return Rtti._instance()._site_summaries()
+
+    def _site_summaries(self):
+        # {scoped_name: [hits, set of types]}, merging sites that share a scoped name
+        self._merge()
+        summaries = {}
+        with singleton_lock:
+            for table in self._siteTables:
+                for site in range(table.site_count()):
+                    summary = summaries.setdefault(table.scoped_name(site), [0, set()])
+                    summary[0] += table.hits(site)
+                    summary[1].update(self._typeList[type_id] for type_id in table.type_ids(site))
+        return summaries
+
+    @staticmethod
+    def site_tables():
+        return Rtti._instance()._siteTables
+
+    @staticmethod
+    def type_id(Type) -> int:
+        return Rtti._instance()._type_id(Type)
+
+    def _type_id(self, Type) -> int:
+        type_id = self._typeIds.get(Type)
+        if type_id is None:
+            with singleton_lock:
+                type_id = self._typeIds.get(Type)
+                if type_id is None:
+                    type_id = self._typeIds[Type] = len(self._typeList)
+                    self._typeList.append(Type)
+        return type_id
+
+    @staticmethod
+    def type_of(type_id: int):
+        return Rtti._instance()._typeList[type_id]
+
     @staticmethod
     def _instance():
         global singleton
-        if singleton is None:
-            singleton = Rtti()
-        return singleton
-        
-        
\ No newline at end of file
+        # Not on the probes' path, so always locking is cheap enough
+        with singleton_lock:
+            if singleton is None:
+                singleton = Rtti()
+            return singleton
+
@@ -0,0 +1,135 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from rtti_importer import RttiImportFinder, instrument_source, debug_source_dir_name
+from rtti_transformer import RttiTransformer
+from rtti_cache import RttiCodeCache
+from rtti_monitoring import RttiSiteCollector
+from rtti_store import RttiTypeStore
+import rtti_trace
+import ast
+import os
+import traceback
+
+def project_source_files(finder: RttiImportFinder):
+    # Every file under the project root the import hook would instrument
+    # Debug copies of instrumented modules would otherwise be instrumented and indexed as project modules
+    skipped_dirs = {'__pycache__', RttiCodeCache._cache_dir_name, debug_source_dir_name, '.git'}
+
+    for dirpath, dirnames, filenames in os.walk(finder.project_root()):
+        dirnames[:] = sorted(d for d in dirnames if d not in skipped_dirs)
+        for filename in sorted(filenames):
+            filename = os.path.join(dirpath, filename)
+            if filename.endswith('.py') and finder.is_instrumented(filename):
+                yield filename
+
+
+def _instrument_files(files, cache_folder: str, transformer_type):
+    """
+    Runs in a worker process; the compiled code goes straight into the shared
+    cache.  files are (filename, source key of its site index) pairs; a file
+    whose index is out of date also gets its sites collected.  Returns
+    (filename, traceback, source key, sites) for each file, sites being None
+    or (scoped names, scopes, local IDs, line numbers).
+    """
+    cache = RttiCodeCache(cache_folder)
+    results = []
+    rtti_trace.set_process_name('instrument worker')
+
+    for filename, indexed_key in files:
+        try:
+            with open(filename, 'rb') as source_file:
+                source = source_file.read()
+
+            key = cache.key(filename, source, transformer_type.version())
+
+            if not os.path.exists(cache.cache_filename(key)):
+                instrument_source(source, filename, transformer_type, cache)
+
+            sites = None
+            if key != indexed_key:
+                with rtti_trace.span('collect sites', 'instrument', filename=filename):
+                    collector = RttiSiteCollector(filename)
+                    collector.visit(ast.parse(source, filename))
+                sites = (collector.site_names(), collector.site_scopes(), collector.site_local_ids(),
+                         [lineno for lineno, _ in collector.site_locations()])
+            results.append((filename, None, key, sites))
+        except:
+            results.append((filename, traceback.format_exc(), None, None))
+
+    rtti_trace.flush()
+    return results
+
+
+def instrument_project(project_root: str, cache_folder: str, include=None, exclude=None,
+                       transformer_type=RttiTransformer, max_workers=None, chunk_size=8,
+                       progress=None, cancelled=None):
+    """
+    Instruments every project module ahead of time on a process pool, filling
+    the code cache so the app later imports them without transforming.
+    progress(done, total) is called as chunks complete, and pending chunks are
+    dropped once cancelled() returns true.  Returns {filename: traceback} for
+    the files that failed.
+
+    The type store in the cache folder gets every module's sites indexed, for
+    coverage reports.
+    """
+    instrument_span = rtti_trace.span('instrument project')
+    finder = RttiImportFinder(project_root, include, exclude, transformer_type)
+    filenames = list(project_source_files(finder))
+    store = RttiTypeStore(cache_folder)
+    indexed_keys = store.module_keys()
+    files = [(filename, indexed_keys.get(filename)) for filename in filenames]
+    chunks = [files[k:k + chunk_size] for k in range(0, len(files), chunk_size)]
+    total = len(filenames)
+    done = 0
+    errors = {}
+
+    if progress is not None:
+        progress(done, total)
+
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        pending = {executor.submit(_instrument_files, chunk, cache_folder, transformer_type) for chunk in chunks}
+
+        while pending:
+            if cancelled is not None and cancelled():
+                break
+
+            # Wake up periodically so a cancel request is noticed even on a slow chunk
+            finished, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                for filename, error, key, sites in future.result():
+                    if error is not None:
+                        errors[filename] = error
+                    elif sites is not None:
+                        store.record_module_sites(filename, key, *sites)
+                    done += 1
+
+            if finished and progress is not None:
+                progress(done, total)
+        else:
+            store.retain_modules(filenames)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        store.close()
+        instrument_span.finish()
+
+    return errors
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Instrument every module of a project into the code cache.")
+    parser.add_argument('project_root')
+    parser.add_argument('runtime_check_folder')
+    parser.add_argument('-j', '--jobs', type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    errors = instrument_project(args.project_root, args.runtime_check_folder, max_workers=args.jobs)
+
+    for filename, error in errors.items():
+        print(f'{filename}:\n{error}')
+    print(f'Instrumented in {time.perf_counter() - start:.3f}s, {len(errors)} failed')
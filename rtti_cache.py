@@ -0,0 +1,67 @@
+from importlib.util import MAGIC_NUMBER
+import hashlib
+import marshal
+import os
+import sys
+
+class RttiCodeCache:
+    """
+    Stores instrumented code objects (marshalled, like __pycache__) in the
+    runtime check folder.  An entry is keyed by the source filename and
+    contents, the transformer version and the interpreter's bytecode magic,
+    so any of those changing simply misses the cache.
+    """
+    _cache_dir_name = '__rtticache__'
+    _file_ext = '.rtti.pyc'
+
+    def __init__(self, runtime_check_folder: str):
+        self._cacheDir = os.path.join(runtime_check_folder, self._cache_dir_name)
+
+    def cache_dir(self):
+        return self._cacheDir
+
+    def key(self, filename: str, source: bytes, transformer_version) -> str:
+        digest = hashlib.sha256()
+        digest.update(MAGIC_NUMBER)
+        digest.update(f'{sys.implementation.cache_tag}:{transformer_version}:{filename}'.encode())
+        digest.update(b'\0')
+        digest.update(source)
+        return digest.hexdigest()
+
+    def cache_filename(self, key: str):
+        return os.path.join(self._cacheDir, key + self._file_ext)
+
+    def load(self, key: str):
+        try:
+            with open(self.cache_filename(key), 'rb') as cache_file:
+                data = cache_file.read()
+        except OSError:
+            return None
+
+        if not data.startswith(MAGIC_NUMBER):
+            return None
+        try:
+            return marshal.loads(memoryview(data)[len(MAGIC_NUMBER):])
+        except (EOFError, ValueError, TypeError):
+            return None
+
+    def store(self, key: str, code):
+        # Written to a temporary file first so concurrent runs never read a partial entry
+        cache_filename = self.cache_filename(key)
+        temp_filename = f'{cache_filename}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self._cacheDir, exist_ok=True)
+            with open(temp_filename, 'wb') as cache_file:
+                cache_file.write(MAGIC_NUMBER)
+                cache_file.write(marshal.dumps(code))
+            os.replace(temp_filename, cache_filename)
+        except OSError:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+
+    def clear(self):
+        if not os.path.isdir(self._cacheDir):
+            return
+        for name in os.listdir(self._cacheDir):
+            if name.endswith(self._file_ext):
+                os.remove(os.path.join(self._cacheDir, name))
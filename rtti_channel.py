@@ -0,0 +1,236 @@
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtNetwork import QLocalServer
+from rtti import Rtti, type_name
+import rtti_trace
+from array import array
+import os
+import socket
+import struct
+
+# Frames are a (kind, payload length) header followed by the payload:
+#   SITES:         base, count, then the scoped names joined by newlines
+#   TYPES:         first type ID, count, then the type names joined by newlines
+#   OBSERVATIONS:  (site, type ID) uint32 pairs; only pairs new to the app
+SITES, TYPES, OBSERVATIONS = range(3)
+
+frame_header = struct.Struct('<BI')
+range_header = struct.Struct('<II')
+
+def encode_frame(kind: int, payload: bytes) -> bytes:
+    return frame_header.pack(kind, len(payload)) + payload
+
+
+class RttiChannelWriter:
+    """
+    The instrumented app's end of the channel.  It is fed by Rtti's merge
+    listeners, so frames are written from the merger thread in batches and
+    never from the probes.  Only the standard library is used since the app
+    may not have a Qt event loop (yet) when it starts.
+    """
+    _max_frame_items = 8192
+    def __init__(self, server_name: str):
+        if os.name == 'nt':
+            self._stream = open(server_name, 'wb', buffering=0)
+            self._socket = None
+        else:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(server_name)
+            self._stream = self._socket.makefile('wb', buffering=0)
+        self._closed = False
+
+    def publish(self, site_tables, first_type_id: int, Types, observations):
+        # Large batches are split so the reader can apply them a few frames at a time
+        if self._closed:
+            return
+        data = bytearray()
+        chunk = self._max_frame_items
+
+        for table in site_tables:
+            for first in range(0, table.site_count(), chunk):
+                count = min(chunk, table.site_count() - first)
+                names = '\n'.join(table.scoped_name(site) for site in range(first, first + count))
+                data += encode_frame(SITES, range_header.pack(table.base() + first, count) + names.encode())
+
+        for first in range(0, len(Types), chunk):
+            names = '\n'.join(type_name(Type) for Type in Types[first:first + chunk])
+            count = min(chunk, len(Types) - first)
+            data += encode_frame(TYPES, range_header.pack(first_type_id + first, count) + names.encode())
+
+        for first in range(0, len(observations), 2 * chunk):
+            data += encode_frame(OBSERVATIONS, array('I', observations[first:first + 2 * chunk]).tobytes())
+
+        if data:
+            try:
+                self._stream.write(data)
+            except OSError:
+                # The GUI closed its end (or went away); the app runs on, and its shard still gets written
+                self.close()
+                Rtti.remove_merge_listener(self.publish)
+
+    def close(self):
+        self._closed = True
+        try:
+            self._stream.close()
+        except OSError:
+            pass
+        if self._socket is not None:
+            self._socket.close()
+
+
+def read_frames(buffer: bytearray):
+    # Yields (kind, payload) for every complete frame and drops them from the buffer
+    offset = 0
+    while len(buffer) - offset >= frame_header.size:
+        kind, length = frame_header.unpack_from(buffer, offset)
+        end = offset + frame_header.size + length
+        if end > len(buffer):
+            break
+        yield kind, memoryview(buffer)[offset + frame_header.size:end].tobytes()
+        offset = end
+    del buffer[:offset]
+
+
+def decode_range(payload: bytes):
+    # SITES / TYPES payloads: returns (first ID, names)
+    first, count = range_header.unpack_from(payload)
+    names = payload[range_header.size:].decode().split('\n') if count else []
+    return first, names
+
+
+def decode_observations(payload: bytes):
+    observations = array('I')
+    observations.frombytes(payload)
+    return observations
+
+
+class RttiChannelConnection:
+    __slots__ = ('buffer', 'siteRows', 'typeIds', 'closing')
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.siteRows = []
+        self.typeIds = []
+        self.closing = False
+
+
+class RttiChannelReader(QObject):
+    """
+    The GUI's end of the channel: a local server instrumented apps connect
+    to.  Frames are folded into a RttiTypeTable, translating each
+    connection's own site and type IDs.
+
+    Incoming data is not decoded as it arrives but on a single-shot refresh
+    timer, so a burst of observations costs one rowsAdded / rowsChanged per
+    tick.  A tick decodes at most _tick_bytes per connection and, with more
+    waiting, the next one is queued behind the pending events.  Each socket's
+    read buffer is capped too: once it is full the app's writes block, which
+    slows its merger thread rather than the GUI.
+    """
+    _refresh_interval_msec = 100
+    _tick_bytes = 128 * 1024
+    _read_buffer_size = 4 * 1024 * 1024
+
+    rowsAdded = pyqtSignal(int, int)
+    rowsChanged = pyqtSignal(list)
+
+    def __init__(self, type_table, parent=None):
+        super().__init__(parent)
+        self._typeTable = type_table
+        self._connections = {}
+        self._refreshTimer = QTimer(self)
+        self._refreshTimer.setSingleShot(True)
+        self._refreshTimer.timeout.connect(self.refresh)
+        self._server = QLocalServer(self)
+        self._server.newConnection.connect(self.accept_connections)
+
+        server_name = f'pyqt-to-cpp-{os.getpid()}-{id(self):x}'
+        QLocalServer.removeServer(server_name)
+        if not self._server.listen(server_name):
+            raise ConnectionError(self._server.errorString())
+
+    def server_name(self):
+        return self._server.fullServerName()
+
+    def accept_connections(self):
+        while self._server.hasPendingConnections():
+            local_socket = self._server.nextPendingConnection()
+            local_socket.setReadBufferSize(self._read_buffer_size)
+            self._connections[local_socket] = RttiChannelConnection()
+            local_socket.readyRead.connect(self.schedule_refresh)
+            local_socket.disconnected.connect(lambda local_socket=local_socket: self.close_connection(local_socket))
+
+    def schedule_refresh(self):
+        if not self._refreshTimer.isActive():
+            self._refreshTimer.start(self._refresh_interval_msec)
+
+    def close_connection(self, local_socket):
+        # Whatever the app sent before disconnecting is still applied, tick by tick
+        if local_socket in self._connections:
+            self._connections[local_socket].closing = True
+            self.schedule_refresh()
+
+    def refresh(self, max_bytes=_tick_bytes):
+        # Applies what arrived since the last tick; a max_bytes of 0 applies all of it
+        type_table = self._typeTable
+        first_new_row = type_table.row_count()
+        changed_rows = set()
+        backlog = False
+        tick_span = rtti_trace.span('apply observations', 'gui')
+        received = False
+
+        for local_socket, connection in list(self._connections.items()):
+            data = local_socket.read(max_bytes) if max_bytes else local_socket.readAll().data()
+            if data:
+                received = True
+                connection.buffer += data
+                self.apply_frames(connection, changed_rows)
+
+            if local_socket.bytesAvailable():
+                backlog = True
+            elif connection.closing:
+                del self._connections[local_socket]
+                local_socket.deleteLater()
+
+        if type_table.row_count() > first_new_row:
+            self.rowsAdded.emit(first_new_row, type_table.row_count() - first_new_row)
+
+        changed_rows = sorted(row for row in changed_rows if row < first_new_row)
+        if changed_rows:
+            self.rowsChanged.emit(changed_rows)
+
+        # Idle ticks would only bury the ones that did something
+        if received:
+            tick_span.finish()
+
+        if backlog:
+            self._refreshTimer.start(0)
+
+    def apply_frames(self, connection: RttiChannelConnection, changed_rows: set):
+        type_table = self._typeTable
+
+        for kind, payload in read_frames(connection.buffer):
+            if kind == SITES:
+                _, names = decode_range(payload)
+                connection.siteRows.extend(type_table.add_sites(names))
+
+            elif kind == TYPES:
+                _, names = decode_range(payload)
+                connection.typeIds.extend(type_table.intern_types(names))
+
+            elif kind == OBSERVATIONS:
+                observations = decode_observations(payload)
+                site_rows = connection.siteRows
+                type_ids = connection.typeIds
+                for k in range(0, len(observations), 2):
+                    row = site_rows[observations[k]]
+                    if type_table.add_type(row, type_ids[observations[k + 1]]):
+                        changed_rows.add(row)
+
+    def close(self):
+        # Applies everything still waiting at once
+        self._refreshTimer.stop()
+        for connection in self._connections.values():
+            connection.closing = True
+        while self._connections:
+            self.refresh(max_bytes=0)
+        self._server.close()
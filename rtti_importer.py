@@ -0,0 +1,269 @@
+from importlib.abc import MetaPathFinder
+from importlib.machinery import PathFinder, SourceFileLoader
+from rtti_transformer import RttiTransformer, RttiLoopTransformer, rtti_globals
+from rtti_cache import RttiCodeCache
+from rtti import Rtti
+from fnmatch import fnmatch
+import rtti_trace
+import ast
+import os
+import sys
+import types
+
+debug_source_dir_name = '__rttisource__'   # Where the runner has the unparsed instrumented sources written
+
+class RttiLoader(SourceFileLoader):
+    """
+    Loads a project module from source, instrumenting it with the
+    transformer before it is compiled.  The interpreter's __pycache__ holds
+    uninstrumented code so it is never used; instrumented code objects go
+    to the optional RttiCodeCache instead.
+    """
+    def __init__(self, fullname, path, transformer_type=RttiTransformer, cache=None, debug_filename=None,
+                 module_sites=None):
+        super().__init__(fullname, path)
+        self._xformerType = transformer_type
+        self._cache = cache
+        self._debugFilename = debug_filename
+        self._moduleSites = module_sites
+
+    def get_code(self, fullname):
+        source_path = self.get_filename(fullname)
+        source = self.get_data(source_path)
+        return instrument_source(source, source_path, self._xformerType, self._cache, self._debugFilename,
+                                 self._moduleSites)
+
+    def source_to_code(self, data, path, *, _optimize=-1):
+        return instrument_source(data, path, self._xformerType)
+
+    def exec_module(self, module):
+        module.__dict__.update(rtti_globals())
+        super().exec_module(module)
+
+
+class RttiImportFinder(MetaPathFinder):
+    """
+    Meta path finder that hands modules inside the project root to an
+    RttiLoader the first time they are imported.  Paths are matched relative
+    to the project root using fnmatch-style globs.
+    """
+    _default_include = ('*.py',)
+    _default_exclude = ('ui_*.py', '*/ui_*.py', 'venv/*', '.venv/*', '*/site-packages/*')
+
+    def __init__(self, project_root: str, include=None, exclude=None, transformer_type=RttiTransformer,
+                 cache=None, debug_source_folder=None, loader_factory=None, module_sites=None):
+        super().__init__()
+        self._projectRoot = os.path.abspath(project_root)
+        self._include = tuple(self._default_include if include is None else include)
+        self._exclude = tuple(self._default_exclude if exclude is None else exclude)
+        self._xformerType = transformer_type
+        self._cache = cache
+        self._debugSourceFolder = debug_source_folder
+        self._loaderFactory = loader_factory
+        self._moduleSites = module_sites
+
+    def find_spec(self, fullname, path=None, target=None):
+        spec = PathFinder.find_spec(fullname, path)
+
+        if spec is None or not isinstance(spec.loader, SourceFileLoader):
+            return spec
+
+        if not self.is_instrumented(spec.origin):
+            pass
+        elif self._loaderFactory is not None:
+            spec.loader = self._loaderFactory(fullname, spec.origin)
+        else:
+            spec.loader = RttiLoader(fullname, spec.origin, self._xformerType, self._cache,
+                                     self.debug_source_filename(spec.origin), self._moduleSites)
+
+        return spec
+
+    def is_instrumented(self, filename: str) -> bool:
+        filename = os.path.abspath(filename)
+
+        if os.path.commonpath([filename, self._projectRoot]) != self._projectRoot:
+            return False
+
+        rel_path = os.path.relpath(filename, self._projectRoot).replace(os.sep, '/')
+
+        if not any(fnmatch(rel_path, pattern) for pattern in self._include):
+            return False
+        return not any(fnmatch(rel_path, pattern) for pattern in self._exclude)
+
+    def debug_source_filename(self, filename: str):
+        if self._debugSourceFolder is None:
+            return None
+        rel_path = os.path.relpath(os.path.abspath(filename), self._projectRoot)
+        return os.path.join(self._debugSourceFolder, rel_path)
+
+    def project_root(self):
+        return self._projectRoot
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+def instrument_source(source, filename: str, transformer_type=RttiTransformer, cache=None, debug_filename=None,
+                      module_sites=None):
+    """
+    Parses, instruments and compiles source straight from the AST, keeping the
+    original filename and line numbers for tracebacks.  The instrumented tree
+    is only unparsed back to source when a debug filename is given.
+
+    With a cache, a module that gets transformed has its site index appended
+    to module_sites, if given: (filename, cache key, scoped names, scopes,
+    local IDs, line numbers), as RttiTypeStore.record_module_sites() takes.
+    """
+    key = None if cache is None else cache.key(filename, source, transformer_type.version())
+    if key is not None and debug_filename is None:
+        code = cache.load(key)
+        if code is not None:
+            return code
+        
+    with rtti_trace.span('parse', 'instrument', filename=filename):
+        ast_tree = ast.parse(source, filename)
+    with rtti_trace.span('transform', 'instrument', filename=filename):
+        transformer = transformer_type(filename)
+        ast_tree = transformer.visit(ast_tree)
+        ast.fix_missing_locations(ast_tree)
+    
+    if debug_filename is not None:
+        with rtti_trace.span('unparse', 'instrument', filename=filename):
+            write_debug_source(ast_tree, debug_filename)
+        
+    with rtti_trace.span('compile', 'instrument', filename=filename):
+        code = compile(ast_tree, filename, 'exec', dont_inherit=True)
+    
+    if key is not None:
+        cache.store(key, code)
+        if module_sites is not None:
+            module_sites.append((filename, key, transformer.site_names(), transformer.site_scopes(),
+                                 transformer.site_local_ids(), [lineno for lineno, _ in transformer.site_locations()]))
+    return code
+
+
+def write_debug_source(ast_tree, debug_filename: str):
+    import astunparse
+    
+    os.makedirs(os.path.dirname(debug_filename), exist_ok=True)
+    with open(debug_filename, 'wt') as debug_file:
+        debug_file.write(astunparse.unparse(ast_tree))
+
+
+def run_instrumented(app_entry_filename: str, include=None, exclude=None, cache_folder=None,
+                     debug_source_folder=None, backend='ast', transformer_type=RttiTransformer, module_sites=None):
+    """
+    Runs the app entry file as __main__ with every project module it imports
+    instrumented.  The 'ast' backend rewrites each module with the
+    transformer; the 'monitoring' backend (Python 3.12+) runs the modules
+    unchanged and records through sys.monitoring.  With a cache folder,
+    module_sites collects the site index of every module either backend
+    instruments (see instrument_source()).
+    """
+    app_entry_filename = os.path.abspath(app_entry_filename)
+    project_root = os.path.dirname(app_entry_filename)
+
+    with open(app_entry_filename, 'rb') as app_entry_source:
+        source = app_entry_source.read()
+
+    main_module = types.ModuleType('__main__')
+    main_module.__file__ = app_entry_filename
+    sys.path.insert(0, project_root)
+    cache = None if cache_folder is None else RttiCodeCache(cache_folder)
+
+    if backend == 'monitoring':
+        from rtti_monitoring import RttiMonitor, RttiMonitorLoader
+
+        monitor = RttiMonitor(cache, module_sites)
+        monitor.install()
+        finder = RttiImportFinder(project_root, include, exclude,
+                                  loader_factory=lambda fullname, path: RttiMonitorLoader(fullname, path, monitor))
+        code = compile(source, app_entry_filename, 'exec', dont_inherit=True)
+        monitor.add_module(code, source, app_entry_filename)
+
+    elif backend == 'ast':
+        finder = RttiImportFinder(project_root, include, exclude, transformer_type, cache=cache,
+                                  debug_source_folder=debug_source_folder, module_sites=module_sites)
+        code = instrument_source(source, app_entry_filename, transformer_type, cache,
+                                 finder.debug_source_filename(app_entry_filename), module_sites)
+        main_module.__dict__.update(rtti_globals())
+
+    else:
+        raise ValueError(f"Unknown recording backend {backend!r}")
+
+    finder.install()
+    sys.modules['__main__'] = main_module
+    exec(code, main_module.__dict__)
+
+
+if __name__ == '__main__':
+    from rtti_channel import RttiChannelWriter
+    from rtti_store import write_shard
+    import time
+    import argparse
+    import atexit
+
+    parser = argparse.ArgumentParser(description="Run a Python app with runtime type recording.")
+    parser.add_argument('app_entry_filename')
+    parser.add_argument('--include', action='append', default=None)
+    parser.add_argument('--exclude', action='append', default=None)
+    parser.add_argument('--cache-folder', default=None)
+    parser.add_argument('--backend', choices=('ast', 'monitoring'), default='ast',
+                        help="Rewrite modules (ast) or record through sys.monitoring (Python 3.12+)")
+    parser.add_argument('--hoist-loop-probes', action='store_true',
+                        help="Only record assignments in loops on their first iterations and on exit")
+    parser.add_argument('--saturation', type=int, default=0,
+                        help="Consecutive calls without a new type after which a site is only sampled, once per merge")
+    parser.add_argument('--element-sample-size', type=int, default=8,
+                        help="Container elements sampled per call for their types (0 turns it off)")
+    parser.add_argument('--stable-samples', type=int, default=16,
+                        help="Samples in a row without a new element type after which a site stops sampling")
+    parser.add_argument('--type-store', default=None,
+                        help="Runtime check folder to leave this run's observations in, as a shard for its type store")
+    parser.add_argument('--channel', default=None,
+                        help="Local server name to stream new type observations to")
+    parser.add_argument('--debug-source-folder', default=None,
+                        help="Also write the unparsed instrumented source of each module here")
+    args, app_args = parser.parse_known_args()
+    # Interpreter startup and the imports above, until the app's own code runs
+    startup_span = rtti_trace.startup_span()
+
+    # The app sees its own argv and import path rather than ours
+    sys.argv = [args.app_entry_filename] + app_args
+    sys.path.append(sys.path.pop(0))
+    Rtti.set_adaptive(args.saturation)
+    Rtti.set_element_sampling(args.element_sample_size, args.stable_samples)
+
+    if args.channel is not None:
+        channel = RttiChannelWriter(args.channel)
+        Rtti.add_merge_listener(channel.publish)
+
+    started = time.time()
+    # Modules instrumented on import, indexed through the shard for coverage reports
+    module_sites = []
+
+    def finish_run():
+        # Whatever the last timer tick missed is merged (and streamed) on the way out
+        try:
+            with rtti_trace.span('final merge', 'recorder'):
+                Rtti.stop_merging()
+        finally:
+            if args.type_store is not None:
+                with rtti_trace.span('write shard', 'recorder'):
+                    write_shard(args.type_store, os.path.abspath(args.app_entry_filename), started,
+                                Rtti.site_summaries(), module_sites)
+
+    Rtti.start_merging()
+    atexit.register(finish_run)
+
+    rtti_trace.set_process_name('app')
+    startup_span.finish()
+    with rtti_trace.span('app run', 'app'):
+        run_instrumented(args.app_entry_filename, args.include, args.exclude, args.cache_folder,
+                         args.debug_source_folder, args.backend,
+                         RttiLoopTransformer if args.hoist_loop_probes else RttiTransformer, module_sites)
@@ -0,0 +1,187 @@
+from importlib.machinery import SourceFileLoader
+from rtti_transformer import RttiTransformer
+from rtti import Rtti
+import ast
+import dis
+import sys
+import threading
+
+class RttiSiteCollector(RttiTransformer):
+    # Same scope naming and site numbering as RttiTransformer, without rewriting anything
+    def visit_Module(self, node):
+        self.generic_visit(node)
+        return node
+
+    def visit_Assign(self, node):
+        self.generic_visit(node)
+        for target in node.targets:
+            for name in self.name_targets(target):
+                self.add_site(self.scoped_name(name), name)
+        return node
+
+
+class RttiMonitor:
+    """
+    Records assignment types through sys.monitoring (PEP 669, Python 3.12+)
+    instead of rewriting source.  Each store instruction of an assignment
+    site is matched to its site by source position; an INSTRUCTION event on
+    the instruction right after it reads the stored variable back from the
+    frame.  Every other instruction disables its own event the first time it
+    fires, so only the store sites keep calling back.
+
+    The instruction after a store can also be a jump target (e.g. a while
+    loop's test, jumped to when an if in the body is false), where the
+    variable holds an earlier value.  Such stores get an event of their
+    own that arms the next instruction for the frame, and only an armed
+    instruction records.  The armed instruction runs right after its store,
+    so each thread only keeps the last one armed.
+    """
+    _tool_name = 'PyQtToCpp'
+    _store_opnames = ('STORE_NAME', 'STORE_FAST', 'STORE_GLOBAL', 'STORE_DEREF',
+                      'STORE_FAST_STORE_FAST', 'STORE_FAST_LOAD_FAST')
+
+    def __init__(self, cache=None, module_sites=None):
+        self._toolId = None
+        self._codeSites = {}
+        self._local = threading.local()
+        # With a cache (for its source keys), module_sites collects each module's site index as instrument_source() does
+        self._cache = cache
+        self._moduleSites = module_sites
+
+    def install(self):
+        if not hasattr(sys, 'monitoring'):
+            raise RuntimeError("The sys.monitoring backend needs Python 3.12 or newer")
+
+        monitoring = sys.monitoring
+        for tool_id in (monitoring.PROFILER_ID, 3, 4):
+            if monitoring.get_tool(tool_id) is None:
+                break
+        else:
+            raise RuntimeError("No free sys.monitoring tool ID")
+
+        monitoring.use_tool_id(tool_id, self._tool_name)
+        monitoring.register_callback(tool_id, monitoring.events.INSTRUCTION, self.instruction)
+        self._toolId = tool_id
+
+    def uninstall(self):
+        if self._toolId is not None:
+            sys.monitoring.register_callback(self._toolId, sys.monitoring.events.INSTRUCTION, None)
+            sys.monitoring.free_tool_id(self._toolId)
+            self._toolId = None
+
+    def add_module(self, code, source, filename: str):
+        # Precomputes which instruction offsets follow a site's store, for every code object in the module
+        collector = RttiSiteCollector(filename)
+        collector.visit(ast.parse(source, filename))
+        site_names = collector.site_names()
+
+        record = Rtti.register_sites(site_names).recorder()
+        local_ids = collector.site_local_ids()
+        if self._cache is not None and self._moduleSites is not None:
+            key = self._cache.key(filename, source, RttiTransformer.version())
+            self._moduleSites.append((filename, key, site_names, collector.site_scopes(), local_ids,
+                                      [lineno for lineno, _ in collector.site_locations()]))
+        sites_by_position = {}
+        sites_by_line_name = {}
+
+        for site, (lineno, col_offset) in enumerate(collector.site_locations()):
+            sites_by_position[lineno, col_offset] = site
+            sites_by_line_name.setdefault((lineno, local_ids[site]), []).append(site)
+
+        self.add_code(code, record, local_ids, sites_by_position, sites_by_line_name)
+
+    def add_code(self, code, record, local_ids, sites_by_position, sites_by_line_name):
+        instructions = list(dis.get_instructions(code))
+        after_store = {}
+        # Store offsets whose next instruction is a jump target, to that instruction's offset
+        arming_stores = {}
+
+        for k, instruction in enumerate(instructions[:-1]):
+            if instruction.opname not in self._store_opnames:
+                continue
+
+            names = instruction.argval if isinstance(instruction.argval, tuple) else (instruction.argval,)
+            if instruction.opname == 'STORE_FAST_LOAD_FAST':
+                names = names[:1]
+
+            positions = instruction.positions
+            is_global = instruction.opname == 'STORE_GLOBAL'
+            entries = []
+
+            for n, name in enumerate(names):
+                if n == 0:
+                    site = sites_by_position.get((positions.lineno, positions.col_offset))
+                    # Compiler-generated stores (e.g. __static_attributes__) can share a target's position
+                    if site is not None and not self.is_store_of(name, local_ids[site]):
+                        site = None
+                else:
+                    # Superinstructions only carry the first store's position
+                    sites = sites_by_line_name.get((positions.lineno, name), ())
+                    site = sites[0] if len(sites) == 1 else None
+                if site is not None:
+                    entries.append((record, site, name, is_global))
+
+            if entries:
+                after = instructions[k + 1]
+                after_store.setdefault(after.offset, []).extend(entries)
+                if after.is_jump_target:
+                    arming_stores[instruction.offset] = after.offset
+
+        if after_store:
+            self._codeSites[code] = (after_store, arming_stores, frozenset(arming_stores.values()))
+            sys.monitoring.set_local_events(self._toolId, code, sys.monitoring.events.INSTRUCTION)
+
+        for const in code.co_consts:
+            if isinstance(const, type(code)):
+                self.add_code(const, record, local_ids, sites_by_position, sites_by_line_name)
+
+    @staticmethod
+    def is_store_of(name: str, local_id: str):
+        # Allows for private names mangled in class bodies (__x stored as _Class__x)
+        return name == local_id or (local_id.startswith('__') and name.endswith(local_id))
+
+    def instruction(self, code, offset):
+        code_sites = self._codeSites.get(code)
+        if code_sites is None:
+            return sys.monitoring.DISABLE
+        after_store, arming_stores, armed_offsets = code_sites
+        entries = after_store.get(offset)
+        armed_offset = arming_stores.get(offset)
+        if entries is None and armed_offset is None:
+            return sys.monitoring.DISABLE
+
+        frame = sys._getframe(1)
+        if entries is not None:
+            if offset not in armed_offsets or self.take_armed() == (id(frame), code, offset):
+                self.record(frame, entries)
+        # Checked after recording: with a = b = ..., the instruction after a store is the next store
+        if armed_offset is not None:
+            self._local.armed = (id(frame), code, armed_offset)
+
+    def take_armed(self):
+        # (frame ID, code, offset) the thread's last arming store armed, disarmed once taken
+        armed = getattr(self._local, 'armed', None)
+        self._local.armed = None
+        return armed
+
+    @staticmethod
+    def record(frame, entries):
+        for record, site, name, is_global in entries:
+            namespace = frame.f_globals if is_global else frame.f_locals
+            try:
+                value = namespace[name]
+            except KeyError:
+                continue
+            record(value, site)
+
+
+class RttiMonitorLoader(SourceFileLoader):
+    # Loads a project module unchanged (__pycache__ included) and hands its code to the monitor
+    def __init__(self, fullname, path, monitor: RttiMonitor):
+        super().__init__(fullname, path)
+        self._monitor = monitor
+
+    def exec_module(self, module):
+        code = self.get_code(module.__name__)
+        self._monitor.add_module(code, self.get_data(self.path), self.path)
+        exec(code, module.__dict__)
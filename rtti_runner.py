@@ -1,31 +1,156 @@
-from PyQt6.QtCore import QThread
+from PyQt6.QtCore import QThread, QProcess, QProcessEnvironment, QTimer, pyqtSignal
 from rtti import Rtti
+from rtti_batch import instrument_project
+from rtti_importer import debug_source_dir_name
+import rtti_trace
 import ast
 import os
 import shutil
+import sys
 
 class RttiRunner(QThread):
-    def __init__(self, app_entry_filename: str, transformer: ast.NodeTransformer, parent=None):
+    """
+    Runs one type-check session of the app.  The thread itself only does the
+    optional ahead-of-time instrumentation; the app then runs in a QProcess
+    owned by the runner's thread (normally the GUI's), so no thread blocks
+    on it and several runners can have their apps running at once.
+    """
+    _debug_source_dir_name = debug_source_dir_name
+    _importer_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rtti_importer.py')
+    _kill_timeout_msec = 3000
+
+    progressChanged = pyqtSignal(int, int)
+    instrumentErrors = pyqtSignal(dict)
+    appStarted = pyqtSignal()
+    appOutput = pyqtSignal(str)
+    appErrorOutput = pyqtSignal(str)
+    appFinished = pyqtSignal(int)
+
+    def __init__(self, app_entry_filename: str, transformer: ast.NodeTransformer, parent=None,
+                 include=None, exclude=None, runtime_check_folder=None, write_debug_source=False,
+                 instrument_ahead=False, saturation=0, channel_name=None,
+                 environment=None, backend='ast'):
         super().__init__(parent)
         self._xformer = transformer
-        self._appEntryFile = app_entry_filename
-        
+        # Absolute up front: nothing here depends on the GUI's working directory
+        self._appEntryFile = os.path.abspath(app_entry_filename)
+        self._include = include
+        self._exclude = exclude
+        self._runtimeCheckFolder = None if runtime_check_folder is None else os.path.abspath(runtime_check_folder)
+        self._writeDebugSource = write_debug_source
+        self._instrumentAhead = instrument_ahead
+        self._saturation = saturation
+        self._channelName = channel_name
+        self._environment = environment or {}
+        self._backend = backend
+        self._process = None
+        self._cancelled = False
+        self._appSpan = None
+        self.finished.connect(self.start_app_after_instrumenting)
+
+    def launch(self):
+        if self._instrumentAhead and self._runtimeCheckFolder is not None:
+            self.start()
+        else:
+            self.start_app()
+
     def run(self):
-        app_entry_filename = self.entry_point_filename()        
-        xformer = self.transformer(app_entry_filename)
-        
-        with open(app_entry_filename, 'rt') as app_entry_source:
-            ast_tree = ast.parse(app_entry_source)
-            xformer.visit(ast_tree)
-        
-        exec_file = xformer.output_app_entry_filename()
-        exec_dir = os.path.dirname(exec_file)
-        exec_file = os.path.basename(exec_file)
-        os.chdir(exec_dir)
-        os.system(f'python {exec_file}')                
-        
+        self.instrument_project(os.path.dirname(self._appEntryFile))
+
+    def start_app_after_instrumenting(self):
+        if not self._cancelled:
+            self.start_app()
+        else:
+            self.appFinished.emit(-1)
+
+    def start_app(self):
+        # Project modules are instrumented lazily by the import hook as the app imports them
+        process = QProcess(self)
+        process.setWorkingDirectory(os.path.dirname(self._appEntryFile))
+
+        environment = QProcessEnvironment.systemEnvironment()
+        # Otherwise the app's prints arrive in blocks instead of as they happen
+        environment.insert('PYTHONUNBUFFERED', '1')
+        for name, value in {**self._environment, **rtti_trace.launch_environment()}.items():
+            environment.insert(name, value)
+        process.setProcessEnvironment(environment)
+
+        self._appSpan = rtti_trace.span('app', 'app')
+        process.readyReadStandardOutput.connect(self.read_app_output)
+        process.readyReadStandardError.connect(self.read_app_error_output)
+        process.started.connect(self.appStarted)
+        process.finished.connect(self.app_finished)
+        process.errorOccurred.connect(self.app_error_occurred)
+        self._process = process
+        process.start(sys.executable, self.app_arguments())
+
+    def app_arguments(self):
+        arguments = [self._importer_script, self._appEntryFile, '--backend', self._backend]
+        for pattern in self._include or ():
+            arguments += ['--include', pattern]
+        for pattern in self._exclude or ():
+            arguments += ['--exclude', pattern]
+        if self._channelName is not None:
+            arguments += ['--channel', self._channelName]
+        if self._xformer.loop_iterations() is not None:
+            arguments.append('--hoist-loop-probes')
+        if self._saturation:
+            arguments += ['--saturation', str(self._saturation)]
+        if self._runtimeCheckFolder is not None:
+            arguments += ['--cache-folder', self._runtimeCheckFolder, '--type-store', self._runtimeCheckFolder]
+            if self._writeDebugSource:
+                debug_folder = os.path.join(self._runtimeCheckFolder, self._debug_source_dir_name)
+                arguments += ['--debug-source-folder', debug_folder]
+        return arguments
+
+    def read_app_output(self):
+        self.appOutput.emit(bytes(self._process.readAllStandardOutput()).decode(errors='replace'))
+
+    def read_app_error_output(self):
+        self.appErrorOutput.emit(bytes(self._process.readAllStandardError()).decode(errors='replace'))
+
+    def app_finished(self, exit_code, exit_status):
+        self._appSpan.finish()
+        if exit_status != QProcess.ExitStatus.NormalExit:
+            exit_code = -1
+        self.appFinished.emit(exit_code)
+
+    def app_error_occurred(self, error):
+        # A crash is reported through finished(); failing to start is not
+        if error == QProcess.ProcessError.FailedToStart:
+            self.appErrorOutput.emit(f'Failed to start {sys.executable}: {self._process.errorString()}\n')
+            self.appFinished.emit(-1)
+
+    def instrument_project(self, project_root: str):
+        # Fills the code cache on a process pool so the app's imports don't transform anything
+        errors = instrument_project(
+            project_root, self._runtimeCheckFolder, self._include, self._exclude, self._xformer,
+            progress=self.progressChanged.emit, cancelled=self.isInterruptionRequested)
+
+        if errors:
+            self.instrumentErrors.emit(errors)
+
+    def cancel(self):
+        # Asks the app to terminate and kills it if it hasn't exited in time
+        self._cancelled = True
+        self.requestInterruption()
+
+        if self.is_app_running():
+            self._process.terminate()
+            QTimer.singleShot(self._kill_timeout_msec, self.kill)
+
+    def kill(self):
+        if self.is_app_running():
+            self._process.kill()
+
+    def is_app_running(self):
+        return self._process is not None and self._process.state() != QProcess.ProcessState.NotRunning
+
+    def is_cancelled(self):
+        return self._cancelled
+
     def entry_point_filename(self):
         return self._appEntryFile
-        
+
     def transformer(self):
-        return self._xformer
\ No newline at end of file
+        return self._xformer
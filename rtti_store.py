@@ -0,0 +1,304 @@
+from rtti import type_name
+from rtti_table import RttiTypeTable
+from itertools import chain
+from operator import add
+import json
+import os
+import sqlite3
+import struct
+import time
+import uuid
+
+# A shard is one session's observations: magic, start time, the sizes of the
+# app's filename and of its RttiTypeTable.to_bytes(), those two, then the site
+# index of the modules the session instrumented, as JSON.  Shards of the first
+# format, without the index, have their table run to the end.
+shard_header = struct.Struct('<4sdII')
+shard_magic = b'RTS2'
+shard_header_v1 = struct.Struct('<4sdI')
+shard_magic_v1 = b'RTSH'
+shard_dir_name = '__rttishards__'
+shard_ext = '.rttishard'
+
+def write_shard(runtime_check_folder: str, app: str, started: float, summaries, module_sites=()):
+    """
+    Writes a session's Rtti.site_summaries() as a new shard in the runtime
+    check folder.  Sessions never share a file, so any number of them can
+    finish at once; RttiTypeStore.merge_shards() folds the shards in later.
+    module_sites are the arguments of record_module_sites() for the modules
+    the session instrumented on import.
+    """
+    type_table = RttiTypeTable()
+    rows = type_table.add_sites(summaries)
+    for row, (hits, Types) in zip(rows, summaries.values()):
+        type_table.set_hits(row, hits)
+        for type_id in type_table.intern_types(Type if isinstance(Type, str) else type_name(Type) for Type in Types):
+            type_table.add_type(row, type_id)
+
+    shard_dir = os.path.join(runtime_check_folder, shard_dir_name)
+    os.makedirs(shard_dir, exist_ok=True)
+    shard_filename = os.path.join(shard_dir, f'{os.getpid()}-{uuid.uuid4().hex}{shard_ext}')
+    app = (app or '').encode()
+    table = type_table.to_bytes()
+
+    # Only complete shards carry the extension the merge looks for
+    with open(shard_filename + '.tmp', 'wb') as shard_file:
+        shard_file.write(shard_header.pack(shard_magic, started, len(app), len(table)) + app)
+        shard_file.write(table)
+        shard_file.write(json.dumps(list(module_sites)).encode())
+    os.replace(shard_filename + '.tmp', shard_filename)
+    return shard_filename
+
+class RttiTypeStore:
+    """
+    Durable, append-only history of observed types in the runtime check
+    folder, so coverage builds up over many sessions.  It is an SQLite
+    database in WAL mode: every session appends one run and upserts its
+    sites (scoped names), interned type names, hit counts and the first and
+    last run each site / type was seen in.
+
+    It also indexes every instrumentable site of every project module, as
+    found when the module is instrumented, so sites that never ran can be
+    reported.
+    """
+    _db_filename = 'rtti_types.sqlite3'
+    _schema_version = 2
+    _schema = '''
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            started REAL NOT NULL,
+            app TEXT
+        );
+        CREATE TABLE IF NOT EXISTS sites (
+            id INTEGER PRIMARY KEY,
+            scoped_name TEXT NOT NULL UNIQUE,
+            hits INTEGER NOT NULL DEFAULT 0,
+            first_run INTEGER NOT NULL,
+            last_run INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS types (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS site_types (
+            site_id INTEGER NOT NULL,
+            type_id INTEGER NOT NULL,
+            first_run INTEGER NOT NULL,
+            last_run INTEGER NOT NULL,
+            PRIMARY KEY (site_id, type_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS modules (
+            filename TEXT PRIMARY KEY,
+            source_key TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS module_sites (
+            filename TEXT NOT NULL,
+            site INTEGER NOT NULL,
+            scoped_name TEXT NOT NULL,
+            scope TEXT NOT NULL,
+            local_id TEXT NOT NULL,
+            lineno INTEGER NOT NULL,
+            PRIMARY KEY (filename, site)
+        ) WITHOUT ROWID;
+    '''
+
+    def __init__(self, runtime_check_folder: str):
+        os.makedirs(runtime_check_folder, exist_ok=True)
+        self._shardDir = os.path.join(runtime_check_folder, shard_dir_name)
+        self._filename = os.path.join(runtime_check_folder, self._db_filename)
+        self._db = sqlite3.connect(self._filename, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+
+        # Every table is created if missing, so older versions upgrade in place
+        if self._db.execute('PRAGMA user_version').fetchone()[0] < self._schema_version:
+            with self._db:
+                self._db.executescript(self._schema)
+                self._db.execute(f'PRAGMA user_version = {self._schema_version}')
+
+    def filename(self):
+        return self._filename
+
+    def begin_run(self, app: str = None) -> int:
+        with self._db:
+            return self._db.execute('INSERT INTO runs (started, app) VALUES (?, ?)', (time.time(), app)).lastrowid
+
+    def record_run(self, run_id: int, summaries):
+        """
+        Appends a run's observations; summaries is {scoped_name: (hits, Types)}
+        as returned by Rtti.site_summaries() (types may also be given by name).
+        """
+        with self._db:
+            self._record({scoped_name: (hits, run_id, run_id) for scoped_name, (hits, _) in summaries.items()},
+                         {(scoped_name, Type if isinstance(Type, str) else type_name(Type)): (run_id, run_id)
+                          for scoped_name, (_, Types) in summaries.items() for Type in Types})
+
+    def _record(self, sites, site_types):
+        # sites is {scoped_name: (hits, first_run, last_run)}, site_types {(scoped_name, type name): (first_run, last_run)}
+        db = self._db
+        db.executemany(
+            'INSERT INTO sites (scoped_name, hits, first_run, last_run) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (scoped_name) DO UPDATE SET hits = hits + excluded.hits, last_run = excluded.last_run',
+            ((scoped_name, *runs) for scoped_name, runs in sites.items()))
+
+        names = {name for _, name in site_types}
+        db.executemany('INSERT OR IGNORE INTO types (name) VALUES (?)', ((name,) for name in names))
+
+        site_ids = dict(db.execute('SELECT scoped_name, id FROM sites'))
+        type_ids = dict(db.execute('SELECT name, id FROM types'))
+
+        db.executemany(
+            'INSERT INTO site_types (site_id, type_id, first_run, last_run) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (site_id, type_id) DO UPDATE SET last_run = excluded.last_run',
+            ((site_ids[scoped_name], type_ids[name], *runs) for (scoped_name, name), runs in site_types.items()))
+
+    def shard_filenames(self):
+        if not os.path.isdir(self._shardDir):
+            return []
+        return sorted(os.path.join(self._shardDir, name) for name in os.listdir(self._shardDir)
+                      if name.endswith(shard_ext))
+
+    def merge_shards(self) -> int:
+        """
+        Folds every finished session's shard into the store and deletes it;
+        returns how many were merged.  The shards are first unioned in memory
+        (hits summed) and then written in one transaction, each becoming a
+        run; a site's or type's first / last run are those of the first / last
+        shard it's in.  The site index the shards carry replaces that of their
+        modules.
+        """
+        # Shards are claimed by renaming them, so concurrent merges never take the same one
+        claimed = []
+        for shard_filename in self.shard_filenames():
+            try:
+                os.replace(shard_filename, shard_filename + '.merging')
+                claimed.append(shard_filename)
+            except FileNotFoundError:
+                pass
+        if not claimed:
+            return 0
+
+        try:
+            merged = RttiTypeTable()
+            runs = []
+            # Merged row, or (row, type ID): indexes of the first and last shard it's in
+            first_shards = {}
+            last_shards = {}
+            module_sites = {}
+            for shard_index, shard_filename in enumerate(claimed):
+                with open(shard_filename + '.merging', 'rb') as shard_file:
+                    data = shard_file.read()
+                magic = data[:4]
+                if magic == shard_magic:
+                    _, started, app_size, table_size = shard_header.unpack_from(data)
+                    offset = shard_header.size + app_size
+                    end = offset + table_size
+                    for module in json.loads(data[end:]):
+                        module_sites[module[0]] = module
+                elif magic == shard_magic_v1:
+                    _, started, app_size = shard_header_v1.unpack_from(data)
+                    offset = shard_header_v1.size + app_size
+                    end = len(data)
+                else:
+                    raise ValueError(f"{shard_filename} is not a type shard")
+                runs.append((started, data[offset - app_size:offset].decode() or None))
+                rows, row_types = merged.load_bytes(memoryview(data)[offset:end], combine_hits=add)
+                for key in chain(rows, row_types):
+                    first_shards.setdefault(key, shard_index)
+                    last_shards[key] = shard_index
+
+            with self._db:
+                run_ids = [self._db.execute('INSERT INTO runs (started, app) VALUES (?, ?)', run).lastrowid
+                           for run in runs]
+                sites = {merged.scoped_name(row): (merged.hits(row), run_ids[first_shards[row]],
+                                                   run_ids[last_shards[row]])
+                         for row in range(merged.row_count())}
+                site_types = {(merged.scoped_name(key[0]), merged.type_name(key[1])):
+                              (run_ids[first_shard], run_ids[last_shards[key]])
+                              for key, first_shard in first_shards.items() if isinstance(key, tuple)}
+                self._record(sites, site_types)
+                for module in module_sites.values():
+                    self._record_module_sites(*module)
+        except Exception:
+            # Left for the next merge
+            for shard_filename in claimed:
+                os.replace(shard_filename + '.merging', shard_filename)
+            raise
+
+        for shard_filename in claimed:
+            os.remove(shard_filename + '.merging')
+        return len(claimed)
+
+    def load(self, type_table):
+        # Fills a RttiTypeTable with the whole history
+        db = self._db
+        site_rows = {}
+        sites = db.execute('SELECT id, scoped_name, hits FROM sites ORDER BY id').fetchall()
+        rows = type_table.add_sites(scoped_name for _, scoped_name, _ in sites)
+
+        for (site_id, _, hits), row in zip(sites, rows):
+            site_rows[site_id] = row
+            type_table.set_hits(row, hits)
+
+        types = db.execute('SELECT id, name FROM types ORDER BY id').fetchall()
+        type_ids = dict(zip((type_id for type_id, _ in types), type_table.intern_types(name for _, name in types)))
+
+        for site_id, type_id in db.execute('SELECT site_id, type_id FROM site_types'):
+            type_table.add_type(site_rows[site_id], type_ids[type_id])
+
+    def module_keys(self):
+        # {filename: source key} of the indexed modules
+        return dict(self._db.execute('SELECT filename, source_key FROM modules'))
+
+    def record_module_sites(self, filename: str, source_key: str, scoped_names, scopes, local_ids, linenos):
+        # Replaces a module's site index, as given by a transformer's site_*() lists
+        with self._db:
+            self._record_module_sites(filename, source_key, scoped_names, scopes, local_ids, linenos)
+
+    def _record_module_sites(self, filename, source_key, scoped_names, scopes, local_ids, linenos):
+        self._db.execute('DELETE FROM module_sites WHERE filename = ?', (filename,))
+        self._db.executemany(
+            'INSERT INTO module_sites (filename, site, scoped_name, scope, local_id, lineno) VALUES (?, ?, ?, ?, ?, ?)',
+            ((filename, site, *row) for site, row in enumerate(zip(scoped_names, scopes, local_ids, linenos))))
+        self._db.execute('INSERT OR REPLACE INTO modules (filename, source_key) VALUES (?, ?)',
+                         (filename, source_key))
+
+    def retain_modules(self, filenames):
+        # Drops the index of modules that are gone from the project
+        removed = [(filename,) for filename in set(self.module_keys()) - set(filenames)]
+        with self._db:
+            self._db.executemany('DELETE FROM module_sites WHERE filename = ?', removed)
+            self._db.executemany('DELETE FROM modules WHERE filename = ?', removed)
+
+    def site_coverage(self):
+        """
+        Returns (filename, scope, local_id, lineno, hits) for every indexed
+        scoped name, hits being 0 for those that never ran.  Sites sharing a
+        scoped name are one row, at the first one's line.
+        """
+        return self._db.execute(
+            'SELECT m.filename, m.scope, m.local_id, MIN(m.lineno), COALESCE(s.hits, 0) '
+            'FROM module_sites m LEFT JOIN sites s ON s.scoped_name = m.scoped_name '
+            'GROUP BY m.scoped_name ORDER BY m.filename, MIN(m.lineno)').fetchall()
+
+    def site_locations(self):
+        """
+        Returns (scoped_name, filename, local_id, lineno) for every indexed
+        scoped name, at its first site's line.
+        """
+        return self._db.execute(
+            'SELECT scoped_name, filename, local_id, MIN(lineno) FROM module_sites GROUP BY scoped_name').fetchall()
+
+    def run_count(self):
+        return self._db.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    def clear(self):
+        # Forgets every observation, unmerged shards included; the site index stays, it only depends on the sources
+        with self._db:
+            for table in ('site_types', 'types', 'sites', 'runs'):
+                self._db.execute(f'DELETE FROM {table}')
+        for shard_filename in self.shard_filenames():
+            os.remove(shard_filename)
+
+    def close(self):
+        self._db.close()
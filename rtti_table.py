@@ -0,0 +1,141 @@
+from array import array
+import struct
+
+class RttiTypeTable:
+    """
+    The GUI's compact store of observed types: one row per scoped name, with
+    type names interned to integer IDs.  Sites sharing a scoped name, and
+    sites reported by different app sessions, all feed the same row.
+
+    revision() changes whenever the table does, e.g. to tell whether it
+    needs saving again.
+    """
+    # Row count, type count, type ID count, then the byte sizes of the scoped and type names
+    _header = struct.Struct('<IIIII')
+
+    def __init__(self):
+        self._revision = 0
+        self._rowIds = {}
+        self._scopedNames = []
+        self._rowTypeIds = []
+        self._rowHits = []
+        self._typeIds = {}
+        self._typeNames = []
+
+    def add_sites(self, scoped_names) -> list:
+        # Returns the row of each scoped name, appending rows for new names
+        rows = []
+        for scoped_name in scoped_names:
+            row = self._rowIds.get(scoped_name)
+            if row is None:
+                row = self._rowIds[scoped_name] = len(self._scopedNames)
+                self._revision += 1
+                self._scopedNames.append(scoped_name)
+                self._rowTypeIds.append(set())
+                self._rowHits.append(0)
+            rows.append(row)
+        return rows
+
+    def intern_types(self, type_names) -> list:
+        type_ids = []
+        for type_name in type_names:
+            type_id = self._typeIds.get(type_name)
+            if type_id is None:
+                type_id = self._typeIds[type_name] = len(self._typeNames)
+                self._revision += 1
+                self._typeNames.append(type_name)
+            type_ids.append(type_id)
+        return type_ids
+
+    def add_type(self, row: int, type_id: int) -> bool:
+        # Returns whether the row's type set grew
+        type_ids = self._rowTypeIds[row]
+        type_count = len(type_ids)
+        type_ids.add(type_id)
+        if len(type_ids) == type_count:
+            return False
+        self._revision += 1
+        return True
+
+    def set_hits(self, row: int, hits: int):
+        if self._rowHits[row] != hits:
+            self._rowHits[row] = hits
+            self._revision += 1
+
+    def hits(self, row: int):
+        return self._rowHits[row]
+
+    def row_count(self):
+        return len(self._scopedNames)
+
+    def row(self, scoped_name: str):
+        return self._rowIds.get(scoped_name)
+
+    def scoped_name(self, row: int):
+        return self._scopedNames[row]
+
+    def type_ids(self, row: int):
+        return self._rowTypeIds[row]
+
+    def type_name(self, type_id: int):
+        return self._typeNames[type_id]
+
+    def type_count(self):
+        return len(self._typeNames)
+
+    def type_names(self, row: int):
+        return sorted(self._typeNames[type_id] for type_id in self._rowTypeIds[row])
+
+    def revision(self):
+        return self._revision
+
+    def clear(self):
+        revision = self._revision + 1
+        self.__init__()
+        self._revision = revision
+
+    def to_bytes(self) -> bytes:
+        type_counts = array('I', map(len, self._rowTypeIds))
+        type_ids = array('I', (type_id for row_type_ids in self._rowTypeIds for type_id in row_type_ids))
+        scoped_names = '\n'.join(self._scopedNames).encode()
+        type_names = '\n'.join(self._typeNames).encode()
+        header = self._header.pack(len(self._scopedNames), len(self._typeNames), len(type_ids),
+                                   len(scoped_names), len(type_names))
+        return b''.join((header, array('Q', self._rowHits).tobytes(), type_counts.tobytes(), type_ids.tobytes(),
+                         scoped_names, type_names))
+
+    def load_bytes(self, data, combine_hits=max):
+        # Merges in a table saved by to_bytes(); data may be any buffer, e.g. a memoryview of a mapped file.
+        # Returns the rows it held and their (row, type ID) pairs, in this table's terms
+        data = memoryview(data)
+        row_count, type_count, type_id_count, scoped_names_size, type_names_size = self._header.unpack_from(data)
+        offset = self._header.size
+        arrays = []
+        for typecode, count in (('Q', row_count), ('I', row_count), ('I', type_id_count)):
+            values = array(typecode)
+            values.frombytes(data[offset:offset + count * values.itemsize])
+            offset += count * values.itemsize
+            arrays.append(values)
+        hits, type_counts, saved_type_ids = arrays
+
+        scoped_names = str(data[offset:offset + scoped_names_size], 'utf-8').split('\n') if row_count else []
+        offset += scoped_names_size
+        type_names = str(data[offset:offset + type_names_size], 'utf-8').split('\n') if type_count else []
+
+        rows = self.add_sites(scoped_names)
+        type_ids = self.intern_types(type_names)
+        row_types = []
+        k = 0
+        for row, row_hits, count in zip(rows, hits, type_counts):
+            self.set_hits(row, combine_hits(self._rowHits[row], row_hits))
+            for saved_type_id in saved_type_ids[k:k + count]:
+                self.add_type(row, type_ids[saved_type_id])
+                row_types.append((row, type_ids[saved_type_id]))
+            k += count
+        return rows, row_types
+
+    @classmethod
+    def from_bytes(cls, data):
+        table = cls()
+        table.load_bytes(data)
+        return table
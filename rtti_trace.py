@@ -0,0 +1,198 @@
+"""
+Named timing spans across the pipeline (instrumenting, the app run, the
+recorder, GUI updates), written as a Chrome trace (chrome://tracing or
+https://ui.perfetto.dev):
+
+    with rtti_trace.span('transform', filename=filename):
+        ...
+
+Tracing is off unless enable() was called or PYQT_TO_CPP_TRACE names a
+trace folder; a span then costs one global lookup.  The variable is
+inherited, so the app process and pool workers trace into the same folder.
+Every process appends its events to a file of its own there, and
+merge_trace() joins them into one trace and sums up the time per span.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+trace_env_name = 'PYQT_TO_CPP_TRACE'
+launch_env_name = 'PYQT_TO_CPP_LAUNCHED'
+trace_dir_name = '__rttitrace__'
+_part_ext = '.tracepart'
+
+_events = None      # None while tracing is off
+_folder = None
+_processName = None
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def finish(self):
+        pass
+
+
+_null_span = NullSpan()
+
+
+class Span:
+    # A Chrome trace complete ('X') event, appended when the span finishes
+    __slots__ = ('name', 'category', 'args', 'start')
+
+    def __init__(self, name: str, category: str, args: dict):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = time.time_ns()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.finish()
+        return False
+
+    def finish(self):
+        if _events is not None:
+            start = self.start // 1000
+            _events.append({'name': self.name, 'cat': self.category, 'ph': 'X', 'ts': start,
+                            'dur': time.time_ns() // 1000 - start, 'pid': os.getpid(),
+                            'tid': threading.get_ident(), 'args': self.args})
+
+
+def span(name: str, category='pipeline', **args):
+    """
+    Times a with block, or until finish() for phases that don't fit one
+    (e.g. between two signals).
+    """
+    if _events is None:
+        return _null_span
+    return Span(name, category, args)
+
+
+def launch_environment():
+    # Environment variables for a process started now, so it can time its own startup
+    return {} if _events is None else {launch_env_name: str(time.time_ns())}
+
+
+def startup_span(name='app startup', category='app'):
+    # From when the parent launched this process (see launch_environment()) until finish()
+    launched = os.environ.get(launch_env_name)
+    if _events is None or launched is None:
+        return _null_span
+    startup = Span(name, category, {})
+    startup.start = int(launched)
+    return startup
+
+
+def counter(name: str, **values):
+    if _events is not None:
+        _events.append({'name': name, 'ph': 'C', 'ts': time.time_ns() // 1000, 'pid': os.getpid(),
+                        'args': values})
+
+
+def set_process_name(name: str):
+    # Labels this process's track in the trace
+    global _processName
+    if _events is not None and _processName != name:
+        _processName = name
+        _events.append({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': name}})
+
+
+def trace_folder(runtime_check_folder: str):
+    return os.path.join(runtime_check_folder, trace_dir_name)
+
+
+def enable(folder: str):
+    # Traces this process, and the processes it starts from now on, into folder
+    global _events, _folder
+    os.makedirs(folder, exist_ok=True)
+    os.environ[trace_env_name] = folder
+    if _events is None:
+        _events = []
+    _folder = folder
+
+
+def disable():
+    global _events, _folder
+    flush()
+    os.environ.pop(trace_env_name, None)
+    _events = None
+    _folder = None
+
+
+def is_enabled():
+    return _events is not None
+
+
+def flush():
+    # Appends the events so far to this process's part file; pool workers call this after each task
+    if not _events:
+        return
+    events = _events[:]
+    del _events[:len(events)]
+    with open(os.path.join(_folder, f'{os.getpid()}{_part_ext}'), 'a') as part_file:
+        for event in events:
+            part_file.write(json.dumps(event))
+            part_file.write('\n')
+
+
+def merge_trace(folder: str):
+    """
+    Joins every process's events in folder into one Chrome trace file,
+    trace-<date>-<time>.json, removing the parts.  Returns the trace's
+    filename (None without events) and {span name: total seconds}.
+    """
+    flush()
+    events = []
+    for filename in sorted(os.listdir(folder)) if os.path.isdir(folder) else ():
+        if filename.endswith(_part_ext):
+            part_filename = os.path.join(folder, filename)
+            with open(part_filename) as part_file:
+                events.extend(json.loads(line) for line in part_file if line.strip())
+            os.remove(part_filename)
+
+    if not events:
+        return None, {}
+
+    totals = {}
+    for event in events:
+        if event['ph'] == 'X':
+            totals[event['name']] = totals.get(event['name'], 0) + event['dur'] / 1e6
+
+    trace_filename = os.path.join(folder, time.strftime('trace-%Y%m%d-%H%M%S.json'))
+    with open(trace_filename, 'w') as trace_file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+    return trace_filename, totals
+
+
+def format_summary(totals: dict, count=6):
+    # The phases that took longest, e.g. 'app 3.2 s, instrument project 1.1 s, ...'
+    phases = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:count]
+    return ', '.join(f'{name} {seconds:.2f} s' if seconds >= 0.1 else f'{name} {seconds * 1000:.0f} ms'
+                     for name, seconds in phases)
+
+
+def _forget_parent_events():
+    # A forked child (e.g. a pool worker) starts with a copy of its parent's unflushed events
+    global _processName
+    if _events is not None:
+        del _events[:]
+    _processName = None
+
+
+if os.environ.get(trace_env_name):
+    enable(os.environ[trace_env_name])
+atexit.register(flush)
+# Windows has no fork
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_parent_events)
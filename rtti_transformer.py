@@ -1,98 +1,100 @@
 import ast
 import astunparse
 from rtti import Rtti
-import itertools
 import os
 
 class RttiTransformer(ast.NodeTransformer):
     _output_filename_suffix = "PyQt6ToCpp"   # TODO: delete
     _scope_node_types = (ast.If, ast.For, ast.While, ast.With, ast.FunctionDef, ast.ClassDef, ast.Module)
     _anon_scope_node_types = (ast.If, ast.For, ast.While, ast.With)
+    _recorder_name = '__rtti_record__'
+    _saturated_name = '__rtti_saturated__'
+    _version = 6    # Bump whenever the instrumented output changes; invalidates cached code
     
     def __init__(self, app_entry_filename: str):
         super().__init__()
-        self._parents = {}
         self._entryModuleName = app_entry_filename
+        self._scopePrefixes = ['']
+        self._qualnames = ['']
+        self._anonScopeCounts = []
+        self._siteNames = []
+        self._siteLocations = []
+        self._siteLocalIds = []
+        self._siteScopes = []
         
-    def _get_scope_siblings(self, node, include_node=True, upto_node=False):
+    def visit(self, node):
+        prefix = self._scope_prefix(node)
+        if prefix is None:
+            return super().visit(node)
+        
+        self._scopePrefixes.append(self._scopePrefixes[-1] + prefix)
+        # The readable scope of a site, e.g. 'MyClass.test', for reports only
+        is_named = isinstance(node, (ast.FunctionDef, ast.ClassDef))
+        if is_named:
+            self._qualnames.append(f'{self._qualnames[-1]}.{node.name}'.lstrip('.'))
+        try:
+            return super().visit(node)
+        finally:
+            self._scopePrefixes.pop()
+            if is_named:
+                self._qualnames.pop()
+            
+    def _scope_prefix(self, node):
         """
-        Returns a list of sibling nodes for the given node within its parent.
-        If the node has no parent or is not found within the parent's children,
-        an empty list is returned.
+        Returns the scoped-name part contributed by the given node, or None
+        if the node does not open a scope.  Anonymous scopes are numbered by
+        their position among same-typed siblings of the enclosing node, so
+        this must be called in traversal order.
         """
-        parent = self.parent(node)        
-        for child in self._scope_child_nodes(parent):
-            if include_node or child is not node:
-                yield child
-            if upto_node:
-                if child is node:
-                    break
-    
-    def _scope_child_nodes(self, parent):
-        child_nodes = list(ast.iter_child_nodes(parent))
-        if not isinstance(parent, ast.If):
-            return child_nodes
-        return itertools.chain(child_nodes, parent.orelse)
-            
-    def _count_anon_scopes_up_to_node_pos(self, node, scope_type=None):
-        if scope_type is None:
-            scope_type = type(node)
-        count = -1
-        siblings = self._get_scope_siblings(node, upto_node=True)
-        for sibling in siblings:
-            if isinstance(sibling, scope_type):
-                count += 1
-            if sibling is node:
-                break
-        return count
+        if isinstance(node, self._anon_scope_node_types):
+            counts = self._anonScopeCounts[-1] if self._anonScopeCounts else {}
+            node_type = type(node)
+            count = counts.get(node_type, -1) + 1
+            counts[node_type] = count
+            return f'{node_type.__name__}{count}'
+        if isinstance(node, self._scope_node_types):
+            return f'{self.ident(node)}'
+        return None
         
     def generic_visit(self, node):
-        for child in ast.iter_child_nodes(node):
-            self._parents[child] = node
-        return super().generic_visit(node)
-            
-    def parent(self, node):
-        return self._parents.get(node, None)
+        # Each node numbers the anonymous scopes among its own children
+        self._anonScopeCounts.append({})
+        try:
+            for field, old_value in ast.iter_fields(node):
+                if field == 'orelse':
+                    self.enter_orelse(node)
+                    
+                if isinstance(old_value, list):
+                    new_values = []
+                    for value in old_value:
+                        if isinstance(value, ast.AST):
+                            value = self.visit(value)
+                            if value is None:
+                                continue
+                            elif not isinstance(value, ast.AST):
+                                new_values.extend(value)
+                                continue
+                        new_values.append(value)
+                    old_value[:] = new_values
+                    
+                elif isinstance(old_value, ast.AST):
+                    new_node = self.visit(old_value)
+                    if new_node is None:
+                        delattr(node, field)
+                    else:
+                        setattr(node, field, new_node)
+        finally:
+            self._anonScopeCounts.pop()
+        return node
     
-    def scope(self, node) -> tuple:
-        ancestor = node
-        scope = []
-        while (ancestor := self.parent(ancestor)) is not None:
-            if isinstance(ancestor, self._scope_node_types):
-                scope = [ancestor] + scope
-        return tuple(scope)
+    def enter_orelse(self, node):
+        # Called before the orelse of an If, loop or try is visited
+        if isinstance(node, ast.If):
+            self._scopePrefixes[-1] += 'Else'
     
     def scoped_name(self, node) -> str:
-        scope_str = ''               
-        for outer_scope in self.scope(node):
-            if isinstance(outer_scope, ast.If):
-                count = self._count_anon_scopes_up_to_node_pos(outer_scope)                
-                scope_str += f'{outer_scope.__class__.__name__}{count}'
-                
-                if self._has_ancestor_in(outer_scope.orelse, node):
-                    scope_str += "Else"
-                    
-            elif isinstance(outer_scope, self._anon_scope_node_types):
-                count = self._count_anon_scopes_up_to_node_pos(outer_scope)                
-                scope_str += f'{outer_scope.__class__.__name__}{count}'
-            elif isinstance(outer_scope, ast.Module):
-                scope_str += f'{self.module_name()}'
-            else:
-                scope_str += f'{self.ident(outer_scope)}'
-        return f"{scope_str}{node.id}"
-    
-    def _has_ancestor_in(self, list_, node):
-        for x in list_:
-            if self._is_ancestor_of(node, query=x):
-                return True
-        return False
-    
-    def _is_ancestor_of(self, node, query):
-        parent = node
-        while (parent := self.parent(parent)) is not None:
-            if parent is query:
-                return True
-        return False
+        # Only valid while the transformer is visiting the node's enclosing scopes
+        return f"{self._scopePrefixes[-1]}{node.id}"
     
     def ident(self, node):
         if isinstance(node, ast.Module):
@@ -107,33 +109,369 @@ class RttiTransformer(ast.NodeTransformer):
             return ""
         return self._entryModuleName
         
+    def visit_Module(self, node):
+        self.generic_visit(node)
+        # The site table goes after the docstring and __future__ imports, which must come first
+        position = 0
+        for stmt in node.body:
+            is_docstring = (position == 0 and isinstance(stmt, ast.Expr) and
+                            isinstance(stmt.value, ast.Constant) and isinstance(stmt.value.value, str))
+            if is_docstring or (isinstance(stmt, ast.ImportFrom) and stmt.module == '__future__'):
+                position += 1
+            else:
+                break
+        node.body[position:position] = self.prologue_statements()
+        return node
+        
     def visit_Assign(self, node):
-        # Wraps all assignments with a custom function call
+        """
+        Wraps the value with a probe call per plain name target, skipped
+        while the sites are saturated:
+
+            x = value if __rtti_saturated__[site] else __rtti_record__(value, site)
+
+        Names unpacked from it (a, *b = ...) are probed in statements right
+        after the assignment.
+        """
         self.generic_visit(node)
-        scoped_names = []
+        wrapped_value = node.value
+        sites = []
+        unpacked = []
         
         for target in node.targets:
-            scoped_names.append(self.scoped_name(target))
+            for name in self.name_targets(target):
+                site = self.add_site(self.scoped_name(name), name)
+                if name is target:
+                    wrapped_value = ast.copy_location(self.probe_call(wrapped_value, site), node.value)
+                    sites.append(site)
+                else:
+                    probe = ast.Expr(value=self.site_probe(ast.Name(id=name.id, ctx=ast.Load()), site))
+                    unpacked.append(ast.copy_location(probe, name))
             
-        scoped_names = [ast.Constant(value=s, kind=None) for s in scoped_names]
-        
-        wrapped_value = ast.Call(
-                func=ast.Name(id='record_rtti', ctx=ast.Load()),
-                args=[
-                    node.value,
-                    ast.List(elts=scoped_names,
-                             ctx=ast.Load())               
-                ],
-                keywords=[]
-            )
-        wrapped_value = ast.copy_location(wrapped_value, node.value)
-        new_node = ast.Assign(targets=node.targets, value=wrapped_value)
-        return  new_node #ast.copy_location(new_node, node)
+        new_node = ast.Assign(targets=node.targets, value=self.probed_value(node.value, wrapped_value, sites),
+                              type_comment=node.type_comment)
+        new_node = ast.copy_location(new_node, node)
+        return [new_node, *self.probed_statements(unpacked)] if unpacked else new_node
+    
+    def name_targets(self, target) -> list:
+        # The plain names a target binds; attributes and subscripts (self.x, d[k]) aren't sites
+        if isinstance(target, ast.Name):
+            return [target]
+        if isinstance(target, (ast.Tuple, ast.List)):
+            return [name for element in target.elts for name in self.name_targets(element)]
+        if isinstance(target, ast.Starred):
+            return self.name_targets(target.value)
+        return []
+    
+    def probe_call(self, value, site: int):
+        return ast.Call(func=ast.Name(id=self._recorder_name, ctx=ast.Load()),
+                        args=[value, ast.Constant(value=site)], keywords=[])
+    
+    def site_probe(self, value, site: int):
+        # __rtti_saturated__[site] or __rtti_record__(value, site), for statements
+        return ast.BoolOp(op=ast.Or(), values=[self.saturated_flag(site), self.probe_call(value, site)])
+    
+    def saturated_flag(self, site: int):
+        return ast.Subscript(value=ast.Name(id=self._saturated_name, ctx=ast.Load()),
+                             slice=ast.Constant(value=site), ctx=ast.Load())
+    
+    def probed_value(self, value, wrapped_value, sites):
+        # The value an assignment stores, given its plain and its probed form
+        if not sites:
+            return value
+        # Chained targets share one test, so the value is never copied more than twice
+        saturated = self.saturated_flag(sites[0]) if len(sites) == 1 else \
+            ast.BoolOp(op=ast.And(), values=[self.saturated_flag(site) for site in sites])
+        return ast.copy_location(ast.IfExp(test=saturated, body=value, orelse=wrapped_value), value)
+    
+    def probed_statements(self, probes) -> list:
+        return probes
+    
+    def add_site(self, scoped_name: str, target) -> int:
+        self._siteNames.append(scoped_name)
+        self._siteLocations.append((target.lineno, target.col_offset))
+        self._siteLocalIds.append(target.id)
+        self._siteScopes.append(self._qualnames[-1])
+        return len(self._siteNames) - 1
+    
+    def site_names(self):
+        return self._siteNames
+    
+    def site_locations(self):
+        # (lineno, col_offset) of each site's target
+        return self._siteLocations
+    
+    def site_local_ids(self):
+        return self._siteLocalIds
+    
+    def site_scopes(self):
+        # Dotted class / function scope of each site, '' at module level
+        return self._siteScopes
+    
+    def prologue_statements(self) -> list:
+        # Statements run before the module's own code
+        return [self.site_table_statement()]
+    
+    def site_table_statement(self):
+        # __rtti_record__, __rtti_saturated__ = rtti_site_recorder((scoped_name0, scoped_name1, ...))
+        site_names = ast.Tuple(elts=[ast.Constant(value=s) for s in self._siteNames], ctx=ast.Load())
+        return ast.Assign(
+            targets=[ast.Tuple(elts=[ast.Name(id=self._recorder_name, ctx=ast.Store()),
+                                     ast.Name(id=self._saturated_name, ctx=ast.Store())], ctx=ast.Store())],
+            value=ast.Call(
+                func=ast.Name(id='rtti_site_recorder', ctx=ast.Load()),
+                args=[site_names],
+                keywords=[]),
+            lineno=1, col_offset=0)
+    
+    @classmethod
+    def version(cls):
+        return cls._version
+    
+    @classmethod
+    def loop_iterations(cls):
+        # Loop iterations whose assignments are recorded, None for all of them
+        return None
     
     def app_entry_filename(self):
         return self._entryModuleName
 
 
+class RttiLoopFrame:
+    # A loop being instrumented by RttiLoopTransformer
+    __slots__ = ('node', 'guard', 'prefix', 'bindings', 'exit_sites', 'used')
+
+    def __init__(self, node, guard, prefix: str, bindings: dict):
+        self.node = node
+        self.guard = guard
+        self.prefix = prefix
+        self.bindings = bindings
+        self.exit_sites = []
+        self.used = False
+
+
+class RttiLoopTransformer(RttiTransformer):
+    """
+    Records the assignments in for / while bodies on the loop's first
+    _loop_iterations iterations only, plus the values they left when the
+    loop exits.  Each loop gets a countdown local, so past the first
+    iterations an assignment costs a test of it instead of a probe call:
+
+        __rtti_loop0__ = 4
+        try:
+            __rtti_loop1__ = x
+        except NameError:
+            __rtti_loop1__ = None
+        for item in items:
+            if __rtti_loop0__:
+                __rtti_loop0__ -= 1
+            x = __rtti_record__(f(item), 7) if __rtti_loop0__ else f(item)
+        if __rtti_loop0__ == 0:
+            try:
+                if x is not __rtti_loop1__:
+                    __rtti_record__(x, 7)
+            except NameError:
+                pass
+        __rtti_loop1__ = None
+
+    Only assignments directly in the body, to a name nothing else in the
+    loop binds, are recorded on exit; otherwise the value left could be
+    another site's.  Nor is a value the name already held before the loop
+    (e.g. when continue skipped the assignment).  Loops nested in a loop past its first iterations
+    record nothing (their countdown starts at None).  Sites are the same
+    as RttiTransformer's, though their hit counts become sample counts.
+
+    Outside functions these locals would be module globals or class
+    attributes, so there they are the items of a list the module creates
+    after its site table, __rtti_loops__[n].
+    """
+    _loop_iterations = 3
+    _loop_guard_name = '__rtti_loop{}__'
+    _loop_counters_name = '__rtti_loops__'
+    
+    def __init__(self, app_entry_filename: str):
+        super().__init__(app_entry_filename)
+        self._loopCount = 0
+        self._loopCounterCount = 0
+        # Innermost loop last; None where a function or class body starts, its loops are its own
+        self._loops = [None]
+        # Whether the innermost function or class body is a function's
+        self._inFunction = [False]
+        
+    @classmethod
+    def version(cls):
+        return f'{cls._version}-loop{cls._loop_iterations}'
+    
+    @classmethod
+    def loop_iterations(cls):
+        return cls._loop_iterations
+    
+    def prologue_statements(self) -> list:
+        statements = super().prologue_statements()
+        if self._loopCounterCount:
+            # __rtti_loops__ = [None] * loop_count
+            counters = ast.BinOp(left=ast.List(elts=[ast.Constant(value=None)], ctx=ast.Load()), op=ast.Mult(),
+                                 right=ast.Constant(value=self._loopCounterCount))
+            statements.append(ast.Assign(targets=[ast.Name(id=self._loop_counters_name, ctx=ast.Store())],
+                                         value=counters, lineno=1, col_offset=0))
+        return statements
+    
+    def visit_FunctionDef(self, node):
+        return self.visit_body_scope(node, True)
+            
+    def visit_ClassDef(self, node):
+        return self.visit_body_scope(node, False)
+    
+    visit_AsyncFunctionDef = visit_FunctionDef
+    
+    def visit_body_scope(self, node, is_function: bool):
+        self._loops.append(None)
+        self._inFunction.append(is_function)
+        try:
+            return self.generic_visit(node)
+        finally:
+            self._loops.pop()
+            self._inFunction.pop()
+    
+    def new_local(self):
+        # A local's name in functions, else an index into __rtti_loops__
+        if self._inFunction[-1]:
+            self._loopCount += 1
+            return self._loop_guard_name.format(self._loopCount - 1)
+        self._loopCounterCount += 1
+        return self._loopCounterCount - 1
+    
+    def visit_For(self, node):
+        guard = self.new_local()
+        frame = RttiLoopFrame(node, guard, self._scopePrefixes[-1], self.loop_bindings(node))
+        outer = self._loops[-1]
+        self._loops.append(frame)
+        try:
+            self.generic_visit(node)
+        finally:
+            if self._loops[-1] is frame:
+                self._loops.pop()
+            
+        if not frame.used:
+            return node
+        
+        # Counts down from one past the iterations recorded, so 0 means the loop ran past them
+        start = ast.Constant(value=self._loop_iterations + 1)
+        if outer is not None:
+            outer.used = True
+            start = ast.IfExp(test=self.guard_name(outer.guard), body=start, orelse=ast.Constant(value=None))
+        init = ast.Assign(targets=[self.guard_name(guard, ast.Store())], value=start)
+        countdown = ast.If(
+            test=self.guard_name(guard),
+            body=[ast.AugAssign(target=self.guard_name(guard, ast.Store()), op=ast.Sub(),
+                                value=ast.Constant(value=1))],
+            orelse=[])
+        node.body.insert(0, countdown)
+        statements = [init, node]
+        
+        if frame.exit_sites:
+            # The value each name held before the loop, None if unbound, isn't the loop's to record
+            befores = [self.new_local() for _ in frame.exit_sites]
+            captures = [self.name_error_try([ast.Assign(targets=[self.guard_name(before, ast.Store())],
+                                                        value=ast.Name(id=local_id, ctx=ast.Load()))],
+                                            [ast.Assign(targets=[self.guard_name(before, ast.Store())],
+                                                        value=ast.Constant(value=None))])
+                        for (local_id, _), before in zip(frame.exit_sites, befores)]
+            statements[1:1] = captures
+
+            records = []
+            for (local_id, site), before in zip(frame.exit_sites, befores):
+                assigned = ast.Compare(left=ast.Name(id=local_id, ctx=ast.Load()), ops=[ast.IsNot()],
+                                       comparators=[self.guard_name(before)])
+                probe = ast.Expr(value=self.site_probe(ast.Name(id=local_id, ctx=ast.Load()), site))
+                records.append(self.name_error_try([ast.If(test=assigned, body=[probe], orelse=[])], [ast.Pass()]))
+            exited = ast.Compare(left=self.guard_name(guard), ops=[ast.Eq()], comparators=[ast.Constant(value=0)])
+            statements.append(ast.If(test=exited, body=records, orelse=[]))
+            # Doesn't keep the values alive, __rtti_loops__ lives as long as the module
+            statements += [ast.Assign(targets=[self.guard_name(before, ast.Store())], value=ast.Constant(value=None))
+                           for before in befores]
+            
+        for statement in statements:
+            ast.copy_location(statement, node)
+        return statements
+    
+    visit_AsyncFor = visit_For
+    visit_While = visit_For
+    
+    def enter_orelse(self, node):
+        # A loop's else runs once, after the loop: it belongs to the enclosing loop
+        super().enter_orelse(node)
+        if self._loops[-1] is not None and self._loops[-1].node is node:
+            self._loops.pop()
+            
+    def loop_bindings(self, node) -> dict:
+        # How often each name is bound in the loop, by its target, in its body or in functions and classes there
+        bindings = {}
+        nodes = [node.target] if isinstance(node, (ast.For, ast.AsyncFor)) else []
+        for child in ast.walk(ast.Module(body=nodes + node.body, type_ignores=[])):
+            if isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Load):
+                names = [child.id]
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                names = [child.name]
+            elif isinstance(child, ast.ExceptHandler) and child.name is not None:
+                names = [child.name]
+            elif isinstance(child, (ast.Import, ast.ImportFrom)):
+                names = [(alias.asname or alias.name).partition('.')[0] for alias in child.names]
+            else:
+                continue
+            for name in names:
+                bindings[name] = bindings.get(name, 0) + 1
+        return bindings
+    
+    def add_site(self, scoped_name: str, target) -> int:
+        site = super().add_site(scoped_name, target)
+        frame = self._loops[-1]
+        if frame is not None:
+            frame.used = True
+            if self._scopePrefixes[-1] == frame.prefix and frame.bindings.get(target.id) == 1:
+                frame.exit_sites.append((target.id, site))
+        return site
+    
+    def probed_value(self, value, wrapped_value, sites):
+        probed_value = super().probed_value(value, wrapped_value, sites)
+        frame = self._loops[-1]
+        if frame is None or probed_value is value:
+            return probed_value
+        # The value is evaluated in one branch only
+        guarded_value = ast.IfExp(test=self.guard_name(frame.guard), body=probed_value, orelse=value)
+        return ast.copy_location(guarded_value, value)
+    
+    def probed_statements(self, probes) -> list:
+        frame = self._loops[-1]
+        if frame is None:
+            return probes
+        return [ast.copy_location(ast.If(test=self.guard_name(frame.guard), body=probes, orelse=[]), probes[0])]
+    
+    @staticmethod
+    def name_error_try(body: list, handler_body: list):
+        return ast.Try(body=body, handlers=[ast.ExceptHandler(type=ast.Name(id='NameError', ctx=ast.Load()), name=None,
+                                                              body=handler_body)],
+                       orelse=[], finalbody=[])
+    
+    def guard_name(self, guard, ctx=None):
+        ctx = ast.Load() if ctx is None else ctx
+        if isinstance(guard, int):
+            counters = ast.Name(id=self._loop_counters_name, ctx=ast.Load())
+            return ast.Subscript(value=counters, slice=ast.Constant(value=guard), ctx=ctx)
+        return ast.Name(id=guard, ctx=ctx)
+
+
+def rtti_site_recorder(scoped_names):
+    # Called once per instrumented module; returns the probe its sites call and their saturated flags
+    table = Rtti.register_sites(scoped_names)
+    return table.recorder(), table.saturated()
+
+
+def rtti_globals():
+    # Names the instrumented code expects in its module globals
+    return {'record_rtti': record_rtti, 'rtti_site_recorder': rtti_site_recorder}
+
+
 def record_rtti(values, scoped_names):
     # TODO put on mutex-lock
     if len(scoped_names) == 1:
@@ -182,15 +520,42 @@ o.test()
     # Transform the AST
     transformer = RttiTransformer(app_entry_filename='rtti_xformer_test1.py')
     new_ast = transformer.visit(parsed_ast)
-    #ast.fix_missing_locations(new_ast)
+    ast.fix_missing_locations(new_ast)
     
-    #print(astor.dump_tree(new_ast))
-    # Convert AST back to source code
+    # Convert AST back to source code, for display only
     modified_code = astunparse.unparse(new_ast)
     print(modified_code)
     
-    # Execute the modified code
-    globals_dict = {'record_rtti': record_rtti, 'Rtii' : Rtti}
-    exec(modified_code, globals_dict)
+    # Execute the transformed tree directly so line numbers match the original source
+    globals_dict = {**rtti_globals(), 'Rtii' : Rtti}
+    exec(compile(new_ast, transformer.app_entry_filename(), 'exec'), globals_dict)
+    
+    print(Rtti.types())
+    
+    # Per-call cost of the old name-list probe vs. the site table probe
+    import timeit
+    
+    record, _ = rtti_site_recorder(('benchmark.pyx',))
+    calls = 1000000
+    list_time = timeit.timeit(lambda: record_rtti(1, ['benchmark.pyx']), number=calls)
+    site_time = timeit.timeit(lambda: record(1, 0), number=calls)
+    Rtti.set_adaptive(saturation=1000)
+    record, saturated = rtti_site_recorder(('benchmark.pyx',))
+    adaptive_time = timeit.timeit(lambda: record(1, 0), number=calls)
+    # Once saturated, instrumented code only tests the flag
+    saturated_time = timeit.timeit(lambda: 1 if saturated[0] else record(1, 0), number=calls)
+    empty_time = timeit.timeit(lambda: 1, number=calls)
+    print(f'record_rtti(value, [name]): {(list_time - empty_time) / calls * 1e9:.0f} ns/call')
+    print(f'__rtti_record__(value, site): {(site_time - empty_time) / calls * 1e9:.0f} ns/call')
+    print(f'__rtti_record__(value, site), adaptive: {(adaptive_time - empty_time) / calls * 1e9:.0f} ns/call')
+    print(f'saturated site: {(saturated_time - empty_time) / calls * 1e9:.0f} ns/call')
     
-    print(Rtti.types())
\ No newline at end of file
+    # Container probes cost the same whatever the container's size, and drop to the plain cost once stable
+    Rtti.set_adaptive(saturation=0)
+    for size in (10, 1000000):
+        container = list(range(size))
+        record, _ = rtti_site_recorder(('benchmark.pyx',))
+        sampling_time = timeit.timeit(lambda: record(container, 0), number=16)
+        stable_time = timeit.timeit(lambda: record(container, 0), number=calls)
+        print(f'__rtti_record__(list of {size}, site): {sampling_time / 16 * 1e9:.0f} ns/call sampling, '
+              f'{(stable_time - empty_time) / calls * 1e9:.0f} ns/call stable')
@@ -0,0 +1,182 @@
+from PyQt6.QtCore import QAbstractTableModel, QSortFilterProxyModel, QModelIndex, Qt
+from cpp_type_lattice import CppTypeLattice
+
+class RttiTypeModel(QAbstractTableModel):
+    """
+    Table model over a RttiTypeTable.  Nothing is stored per cell: the view
+    asks for the rows on screen and they are read from the table's compact
+    lists, so memory doesn't grow with a row count in the 100ks.  The table
+    is filled elsewhere (e.g. by RttiChannelReader); add_rows() and
+    update_rows() then tell the views in batches.
+
+    Sorting is done here, once per sort, as a permutation of the table's
+    rows: a proxy sorting through data() costs a Python call per comparison.
+    Rows added later are appended after the sorted ones.
+
+    The C++ type column joins each row's types through a CppTypeLattice,
+    which resolves every distinct type set only once.  The local ID and
+    editor link (filename:lineno) columns come from the store's site index,
+    see set_site_locations(); rows it doesn't know show empty.
+    """
+    _headers = ('Local ID', 'Scope ID', 'Editor Link', 'Assigned Types', 'C++ Type')
+    _local_id_column = 0
+    _scoped_name_column = 1
+    _editor_link_column = 2
+    _types_column = 3
+    _cpp_type_column = 4
+
+    def __init__(self, type_table, parent=None, lattice=None):
+        super().__init__(parent)
+        self._typeTable = type_table
+        self._lattice = CppTypeLattice() if lattice is None else lattice
+        self._rowCount = type_table.row_count()
+        self._order = None
+        self._modelRows = None
+        self._siteLocations = {}
+
+    def set_site_locations(self, locations):
+        # (scoped_name, filename, local_id, lineno) rows, as RttiTypeStore.site_locations() returns them
+        self._siteLocations = {scoped_name: (local_id, f'{filename}:{lineno}')
+                               for scoped_name, filename, local_id, lineno in locations}
+        if self._rowCount:
+            self.dataChanged.emit(self.index(0, self._local_id_column),
+                                  self.index(self._rowCount - 1, self._editor_link_column))
+
+    def type_table(self):
+        return self._typeTable
+
+    def lattice(self):
+        return self._lattice
+
+    def set_lattice(self, lattice):
+        # E.g. one knowing the project's classes; their C++ types are joined again
+        self._lattice = lattice
+        if self._rowCount:
+            self.dataChanged.emit(self.index(0, self._cpp_type_column),
+                                  self.index(self._rowCount - 1, self._cpp_type_column))
+
+    def table_row(self, row: int):
+        return row if self._order is None else self._order[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._rowCount
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self._headers[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        return self.display_text(self.table_row(index.row()), index.column())
+
+    def display_text(self, table_row: int, column: int):
+        if column == self._scoped_name_column:
+            return self._typeTable.scoped_name(table_row)
+        if column in (self._local_id_column, self._editor_link_column):
+            location = self._siteLocations.get(self._typeTable.scoped_name(table_row))
+            if location is None:
+                return ''
+            local_id, editor_link = location
+            return local_id if column == self._local_id_column else editor_link
+        if column == self._types_column:
+            return ', '.join(self._typeTable.type_names(table_row))
+        if column == self._cpp_type_column:
+            type_table = self._typeTable
+            return self._lattice.join(type_table.type_name(type_id) for type_id in type_table.type_ids(table_row))
+        return None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        if not 0 <= column < len(self._headers):
+            return
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        table_rows = [self.table_row(index.row()) for index in persistent]
+
+        if column == self._cpp_type_column:
+            keys = self._lattice.resolve_table(self._typeTable)[:self._rowCount]
+        else:
+            keys = [self.display_text(table_row, column) for table_row in range(self._rowCount)]
+        self._order = sorted(range(self._rowCount), key=keys.__getitem__,
+                             reverse=order == Qt.SortOrder.DescendingOrder)
+        self._modelRows = [0] * self._rowCount
+        for row, table_row in enumerate(self._order):
+            self._modelRows[table_row] = row
+
+        self.changePersistentIndexList(
+            persistent, [self.index(self._modelRows[table_row], index.column())
+                         for index, table_row in zip(persistent, table_rows)])
+        self.layoutChanged.emit()
+
+    def add_rows(self, first_row: int, count: int):
+        # The rows are already in the type table; views only learn about them now
+        if count:
+            self.beginInsertRows(QModelIndex(), first_row, first_row + count - 1)
+            self._rowCount = first_row + count
+            if self._order is not None:
+                self._modelRows.extend(range(first_row, first_row + count))
+                self._order.extend(range(first_row, first_row + count))
+            self.endInsertRows()
+
+    def update_rows(self, table_rows):
+        # One dataChanged per run of consecutive rows
+        rows = sorted(table_rows if self._modelRows is None else (self._modelRows[row] for row in table_rows))
+        k = 0
+        while k < len(rows):
+            first = last = rows[k]
+            k += 1
+            while k < len(rows) and rows[k] == last + 1:
+                last = rows[k]
+                k += 1
+            self.dataChanged.emit(self.index(first, self._types_column), self.index(last, self._cpp_type_column))
+
+    def reload(self):
+        # After the type table was cleared or refilled wholesale
+        self.beginResetModel()
+        self._rowCount = self._typeTable.row_count()
+        self._order = None
+        self._modelRows = None
+        self.endResetModel()
+
+
+class RttiTypeFilterModel(QSortFilterProxyModel):
+    """
+    Filters a RttiTypeModel's rows by module (a substring of the scoped
+    name, which starts with the module's filename) and optionally to the
+    unresolved sites: those without exactly one observed type.  Sorting is
+    left to the source model.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._moduleFilter = ''
+        self._unresolvedOnly = False
+
+    def set_module_filter(self, text: str):
+        self._moduleFilter = text
+        self.invalidateFilter()
+
+    def module_filter(self):
+        return self._moduleFilter
+
+    def set_unresolved_only(self, unresolved_only: bool):
+        self._unresolvedOnly = unresolved_only
+        self.invalidateFilter()
+
+    def is_unresolved_only(self):
+        return self._unresolvedOnly
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        # Straight from the type table, without building display strings
+        source_model = self.sourceModel()
+        type_table = source_model.type_table()
+        source_row = source_model.table_row(source_row)
+        if self._unresolvedOnly and len(type_table.type_ids(source_row)) == 1:
+            return False
+        return not self._moduleFilter or self._moduleFilter in type_table.scoped_name(source_row)
@@ -0,0 +1,53 @@
+from rtti_store import RttiTypeStore, shard_dir_name
+from rtti_table import RttiTypeTable
+import os
+import socket
+import subprocess
+import sys
+import pytest
+
+importer_script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'rtti_importer.py')
+
+# New types keep arriving for a few merge intervals, so the app writes again after the reader is gone
+app_source = '''
+import time
+for k in range(30):
+    value = type(f'Type{k}', (), {})()
+    time.sleep(0.05)
+done = True
+'''
+
+@pytest.mark.skipif(os.name == 'nt', reason="The writer connects through a Unix domain socket")
+def test_shard_is_written_when_the_reader_goes_away(tmp_path):
+    app_filename = tmp_path / 'main.py'
+    app_filename.write_text(app_source)
+    server_name = str(tmp_path / 'channel')
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(server_name)
+    server.listen(1)
+
+    app = subprocess.Popen([sys.executable, importer_script, str(app_filename), '--channel', server_name,
+                            '--type-store', str(tmp_path)], cwd=tmp_path, stderr=subprocess.PIPE, text=True)
+    try:
+        connection, _ = server.accept()
+        # The first frames, then the reader closes mid-run
+        assert connection.recv(1)
+        connection.close()
+        server.close()
+        _, error_output = app.communicate(timeout=60)
+    finally:
+        app.kill()
+
+    assert app.returncode == 0, error_output
+    assert len(os.listdir(tmp_path / shard_dir_name)) == 1
+
+    store = RttiTypeStore(str(tmp_path))
+    try:
+        store.merge_shards()
+        type_table = RttiTypeTable()
+        store.load(type_table)
+    finally:
+        store.close()
+    types = {type_table.scoped_name(row): type_table.type_names(row) for row in range(type_table.row_count())}
+    assert len(types[f'{app_filename}For0value']) == 30
+    assert types[f'{app_filename}done'] == ['builtins.bool']
@@ -0,0 +1,44 @@
+from cpp_generator import CppModuleGenerator, generate_project
+
+
+def test_lines_shared_by_statements_are_commented_once():
+    source = ('def f(a):\n'
+              '    x = a; y = a\n'
+              '    if x: y = 1\n'
+              '    return y\n'
+              'x = 1; z = 2\n'
+              'if x: z = 3\n')
+    lines = list(CppModuleGenerator('/project/m.py', source, {}, 'm.py').source_lines())
+    comments = [line.strip() for line in lines if line.strip().startswith('//') and 'Generated' not in line]
+    assert comments == ['// x = a; y = a', '// if x: y = 1', '// return y',
+                        '// Module-level code:', '// x = 1; z = 2', '// if x: z = 3']
+
+
+def test_project_classes_join_the_same_in_every_module(tmp_path):
+    # The entry script's classes are recorded as __main__'s, their bases may be in another module
+    project_root = tmp_path / 'app'
+    project_root.mkdir()
+    (project_root / 'base.py').write_text('from PyQt6.QtCore import QObject\nclass Base(QObject): pass\n')
+    (project_root / 'main.py').write_text('from PyQt6.QtWidgets import QWidget\nfrom base import Base\n'
+                                          'class W(QWidget): pass\nclass B(Base): pass\n')
+    for name in ('a', 'z'):
+        (project_root / f'{name}.py').write_text('w = None\nb = None\n')
+    types = {f'{project_root / name}.py{local_id}': [f'__main__.{local_id.upper()}']
+             for name in ('a', 'z') for local_id in ('w', 'b')}
+
+    def generate():
+        return generate_project(str(project_root), str(tmp_path / 'cpp'), types, max_workers=1, chunk_size=1,
+                                entry_filename=str(project_root / 'main.py'))
+
+    def declarations(name):
+        return [line for line in (tmp_path / 'cpp' / f'{name}.h').read_text().splitlines()
+                if line.startswith('extern')]
+
+    generate()
+    assert declarations('a') == declarations('z') == ['extern W* w;', 'extern B* b;']
+
+    # The base no longer being a QObject changes the modules using its subclass
+    (project_root / 'base.py').write_text('class Base: pass\n')
+    results = generate()
+    assert results[str(project_root / 'a.py')][0] == 'written'
+    assert declarations('a') == ['extern W* w;', 'extern B b;']
@@ -0,0 +1,43 @@
+from rtti import Rtti
+from rtti_monitoring import RttiMonitor
+import itertools
+import sys
+import pytest
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 12), reason="sys.monitoring is new in Python 3.12")
+
+_module_numbers = itertools.count()
+
+def monitored_hits(source: str, call=None):
+    # Runs source under the monitor, then call(module globals); returns {scoped name minus the module: hits}
+    filename = f'monitored{next(_module_numbers)}.py'
+    monitor = RttiMonitor()
+    monitor.install()
+    try:
+        code = compile(source, filename, 'exec')
+        monitor.add_module(code, source, filename)
+        module_globals = {}
+        exec(code, module_globals)
+        if call is not None:
+            call(module_globals)
+    finally:
+        monitor.uninstall()
+    table = Rtti.site_tables()[-1]
+    return {table.scoped_name(site)[len(filename):]: table.hits(site) for site in range(table.site_count())}
+
+
+def test_loop_body_ending_in_an_assignment():
+    source = 'total = 0\nfor i in range(7):\n    total = total + i\n'
+    assert monitored_hits(source) == {'total': 1, 'For0total': 7}
+
+
+def test_store_followed_by_a_jump_target():
+    # After y = n comes the while loop's test, which the if jumps to when n is even
+    source = 'def f(n):\n    y = 0\n    while n:\n        n = n - 1\n        if n % 2:\n            y = n\n    return y\n'
+    assert monitored_hits(source, lambda module: module['f'](10)) == {'fy': 1, 'fWhile0n': 10, 'fWhile0If0y': 5}
+
+
+def test_chained_assignment_in_a_loop():
+    source = 'def f(n):\n    while n:\n        n = n - 1\n        if n % 3:\n            a = b = n\n'
+    assert monitored_hits(source, lambda module: module['f'](9)) == {'fWhile0n': 9, 'fWhile0If0a': 6,
+                                                                     'fWhile0If0b': 6}
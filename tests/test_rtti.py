@@ -0,0 +1,157 @@
+from rtti import Rtti
+from rtti_importer import instrument_source
+from rtti_store import RttiTypeStore
+from rtti_table import RttiTypeTable
+from rtti_transformer import rtti_globals, rtti_site_recorder
+import gc
+import itertools
+import os
+import subprocess
+import sys
+import threading
+
+_module_numbers = itertools.count()
+
+def run_counting_probe_calls(source: str):
+    # Runs source instrumented; returns its site table and how often it called the probe
+    filename = f'recording{next(_module_numbers)}.py'
+    tables = []
+    calls = [0]
+
+    def counting_site_recorder(scoped_names):
+        record, saturated = rtti_site_recorder(scoped_names)
+        tables.append(Rtti.site_tables()[-1])
+
+        def counting_record(value, site):
+            calls[0] += 1
+            return record(value, site)
+
+        return counting_record, saturated
+
+    module_globals = {**rtti_globals(), 'rtti_site_recorder': counting_site_recorder}
+    exec(instrument_source(source.encode(), filename), module_globals)
+    return tables[0], calls[0], module_globals
+
+
+def test_saturated_sites_skip_the_probe_call():
+    Rtti.set_adaptive(saturation=10)
+    try:
+        table, calls, module_globals = run_counting_probe_calls('def f(v):\n    x = v\nfor i in range(1000):\n    f(i)\n')
+    finally:
+        Rtti.set_adaptive(saturation=0)
+    # x's first call finds a new type, the 10 after it don't; the other 989 only test the flag
+    assert calls == 11
+    assert table.is_saturated(0)
+    assert table.hits(0) == 11
+
+    # A merge re-arms the site: the next call is a sample, and a new type shows up
+    Rtti.merge()
+    assert not table.is_saturated(0)
+    module_globals['f']('text')
+    Rtti.merge()
+    assert {Rtti.type_of(type_id) for type_id in table.type_ids(0)} == {int, str}
+    assert table.hits(0) == 12
+
+
+def test_threads_record_exact_hits():
+    # Every thread records into its own buffer; the merged hit counts must add up exactly
+    thread_count = 16
+    iterations = 2000
+    source = 'def f(n):\n    for i in range(n):\n        x = i\n        y = str(i) if i % 2 else None\n'
+    table, _, module_globals = run_counting_probe_calls(source)
+    Rtti.start_merging(interval=0.001)
+    try:
+        threads = [threading.Thread(target=module_globals['f'], args=(iterations,)) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        module_globals['f'](iterations)
+        for thread in threads:
+            thread.join()
+        del threads
+        gc.collect()
+
+        # Exited threads' buffers have been retired, the main thread's is still live
+        assert table.hits(0) == table.hits(1) == (thread_count + 1) * iterations
+    finally:
+        Rtti.stop_merging()
+
+    assert table.hits(0) == table.hits(1) == (thread_count + 1) * iterations
+    assert {Rtti.type_of(type_id) for type_id in table.type_ids(1)} == {str, type(None)}
+    summaries = Rtti.site_summaries()
+    assert summaries[table.scoped_name(1)][0] == (thread_count + 1) * iterations
+
+
+def test_hits_at_exit_are_counted_once(tmp_path):
+    # Threads still running at exit used to have their hits retired and then merged again
+    app_filename = tmp_path / 'main.py'
+    app_filename.write_text(
+        'import threading\n'
+        'def f(n):\n'
+        '    for i in range(n):\n'
+        '        x = i\n'
+        'stop = threading.Event()\n'
+        'def background():\n'
+        '    f(3)\n'
+        '    stop.wait()\n'
+        'thread = threading.Thread(target=background, daemon=True)\n'
+        'thread.start()\n'
+        'f(5)\n')
+    importer_script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'rtti_importer.py')
+    subprocess.run([sys.executable, importer_script, str(app_filename), '--type-store', str(tmp_path)],
+                   cwd=tmp_path, check=True)
+
+    store = RttiTypeStore(str(tmp_path))
+    try:
+        store.merge_shards()
+        type_table = RttiTypeTable()
+        store.load(type_table)
+    finally:
+        store.close()
+    hits = {type_table.scoped_name(row): type_table.hits(row) for row in range(type_table.row_count())}
+    assert hits[f'{app_filename}fFor0x'] == 8
+
+
+def test_blocked_merge_listener_doesnt_hold_up_registration():
+    # E.g. the channel writer blocked on a socket the GUI doesn't read
+    entered = threading.Event()
+    release = threading.Event()
+
+    def blocking_listener(site_tables, first_type_id, Types, observations):
+        entered.set()
+        release.wait(10)
+
+    Rtti.add_merge_listener(blocking_listener)
+    merger = threading.Thread(target=Rtti.merge)
+    try:
+        merger.start()
+        assert entered.wait(5)
+        registering = threading.Thread(target=run_counting_probe_calls, args=('x = 1\n',))
+        registering.start()
+        registering.join(5)
+        assert not registering.is_alive()
+    finally:
+        release.set()
+        merger.join()
+        Rtti.remove_merge_listener(blocking_listener)
+
+
+def test_adding_a_merge_listener_doesnt_resend_to_the_others():
+    first_batches = []
+    second_batches = []
+    first_listener = lambda *batch: first_batches.append(batch)
+    second_listener = lambda *batch: second_batches.append(batch)
+    Rtti.add_merge_listener(first_listener)
+    try:
+        run_counting_probe_calls('x = 1\n')
+        Rtti.merge()
+        assert len(first_batches) == 1
+
+        Rtti.add_merge_listener(second_listener)
+        Rtti.merge()
+        # Only the new listener gets the whole registry
+        assert len(first_batches) == 1
+        assert len(second_batches) == 1
+        assert len(second_batches[0][0]) == len(Rtti.site_tables())
+    finally:
+        Rtti.remove_merge_listener(first_listener)
+        Rtti.remove_merge_listener(second_listener)
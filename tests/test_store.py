@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from rtti_store import RttiTypeStore, write_shard
+from rtti_table import RttiTypeTable
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_merged_sites_keep_the_runs_of_their_own_shards(tmp_path):
+    write_shard(str(tmp_path), 'a.py', 1.0, {'s1': (1, [int]), 's2': (2, [int])})
+    write_shard(str(tmp_path), 'b.py', 2.0, {'s2': (3, [str])})
+    store = RttiTypeStore(str(tmp_path))
+    try:
+        assert store.merge_shards() == 2
+    finally:
+        store.close()
+
+    db = sqlite3.connect(tmp_path / 'rtti_types.sqlite3')
+    try:
+        run_ids = dict(db.execute('SELECT app, id FROM runs'))
+        sites = {name: (hits, first, last)
+                 for name, hits, first, last in db.execute('SELECT scoped_name, hits, first_run, last_run FROM sites')}
+        site_types = {(site, name): (first, last) for site, name, first, last in db.execute(
+            'SELECT s.scoped_name, t.name, st.first_run, st.last_run FROM site_types st '
+            'JOIN sites s ON s.id = st.site_id JOIN types t ON t.id = st.type_id')}
+    finally:
+        db.close()
+    a, b = run_ids['a.py'], run_ids['b.py']
+    assert sites == {'s1': (1, a, a), 's2': (5, min(a, b), max(a, b))}
+    assert site_types == {('s1', 'builtins.int'): (a, a), ('s2', 'builtins.int'): (a, a),
+                          ('s2', 'builtins.str'): (b, b)}
+
+
+@pytest.mark.parametrize('backend', [
+    'ast',
+    pytest.param('monitoring', marks=pytest.mark.skipif(sys.version_info < (3, 12), reason="needs sys.monitoring")),
+])
+def test_run_indexes_the_modules_it_instruments(tmp_path, backend):
+    # Coverage used to need the project instrumented ahead; a plain run indexes the modules it imports
+    (tmp_path / 'helper.py').write_text(
+        'def used(v):\n'
+        '    x = v\n'
+        'def unused(v):\n'
+        '    y = v\n')
+    (tmp_path / 'main.py').write_text(
+        'import helper\n'
+        'helper.used(1)\n')
+    subprocess.run([sys.executable, os.path.join(repo_root, 'rtti_importer.py'), str(tmp_path / 'main.py'),
+                    '--cache-folder', str(tmp_path), '--type-store', str(tmp_path), '--backend', backend],
+                   cwd=tmp_path, check=True)
+
+    store = RttiTypeStore(str(tmp_path))
+    try:
+        store.merge_shards()
+        coverage = {(os.path.basename(filename), scope, local_id): hits
+                    for filename, scope, local_id, _, hits in store.site_coverage()}
+    finally:
+        store.close()
+    assert coverage == {('helper.py', 'used', 'x'): 1, ('helper.py', 'unused', 'y'): 0}
+
+
+def test_coverage_report_needs_a_site_index(tmp_path):
+    RttiTypeStore(str(tmp_path)).close()
+    result = subprocess.run([sys.executable, os.path.join(repo_root, 'pyqt_to_cpp.py'), 'report', str(tmp_path),
+                             '--coverage', '--unexecuted'],
+                            capture_output=True, text=True)
+    assert result.returncode == 1
+    assert 'No modules are indexed' in result.stderr
+
+
+def test_type_model_shows_the_indexed_location_of_each_site(tmp_path):
+    from rtti_type_model import RttiTypeModel
+
+    write_shard(str(tmp_path), 'main.py', 1.0, {'m.f.x': (1, [int]), 'm.f.y': (1, [str])},
+                [('m.py', 'key', ['m.f.x', 'm.f.x'], ['f', 'f'], ['x', 'x'], [4, 2])])
+    store = RttiTypeStore(str(tmp_path))
+    try:
+        store.merge_shards()
+        type_table = RttiTypeTable()
+        store.load(type_table)
+        model = RttiTypeModel(type_table)
+        model.set_site_locations(store.site_locations())
+    finally:
+        store.close()
+
+    rows = {model.display_text(row, 1): (model.display_text(row, 0), model.display_text(row, 2))
+            for row in range(model.rowCount())}
+    assert rows == {'m.f.x': ('x', 'm.py:2'), 'm.f.y': ('', '')}
@@ -0,0 +1,117 @@
+from benchmarks import nested_module_source
+from rtti import Rtti
+from rtti_importer import instrument_source
+from rtti_monitoring import RttiSiteCollector
+from rtti_transformer import RttiTransformer, RttiLoopTransformer, rtti_globals
+import ast
+import asyncio
+import itertools
+import timeit
+import pytest
+
+_module_numbers = itertools.count()
+
+def recorded_types(source: str, transformer_type=RttiTransformer):
+    # Runs source instrumented as a module of its own; returns {scoped name minus the module: type names}
+    filename = f'shapes{next(_module_numbers)}.py'
+    exec(instrument_source(source.encode(), filename, transformer_type), rtti_globals())
+    return {scoped_name[len(filename):]: sorted(Type.__name__ for Type in Types)
+            for scoped_name, Types in Rtti.types().items() if scoped_name.startswith(filename)}
+
+
+def transform_time(line_count: int):
+    source = nested_module_source(line_count)
+    trees = [ast.parse(source) for _ in range(3)]
+    return min(timeit.repeat(lambda: RttiTransformer('big.py').visit(trees.pop()), repeat=3, number=1))
+
+
+def test_transform_time_is_linear():
+    # 5x the lines may take 5x the time; twice that leaves room for noise, quadratic would be 25x
+    small = transform_time(4000)
+    large = transform_time(20000)
+    assert large / small < 10
+
+
+def test_nested_scoped_names():
+    transformer = RttiTransformer('m.py')
+    transformer.visit(ast.parse(nested_module_source(1, depth=3)))
+    assert transformer.site_names() == ['m.pyf0x0', 'm.pyf0If0y0', 'm.pyf0If0x1', 'm.pyf0If0For0y1',
+                                        'm.pyf0If0For0x2', 'm.pyf0If0For0While0y2']
+
+
+@pytest.mark.parametrize('source, expected', [
+    ('x = 1', {'x': ['int']}),
+    ('x = y = 1.5', {'x': ['float'], 'y': ['float']}),
+    ('a, b = 1, "b"', {'a': ['int'], 'b': ['str']}),
+    ('[a, b] = [1, None]', {'a': ['int'], 'b': ['NoneType']}),
+    ('a, *rest = 1, 2, 3', {'a': ['int'], 'rest': ['list']}),
+    ('(a, (b, c)), d = (1, ("b", 2.0)), None', {'a': ['int'], 'b': ['str'], 'c': ['float'], 'd': ['NoneType']}),
+    ('t = a, b = 1, 2', {'t': ['tuple'], 'a': ['int'], 'b': ['int']}),
+])
+def test_name_targets(source, expected):
+    assert recorded_types(source) == expected
+
+
+@pytest.mark.parametrize('source, expected', [
+    ('class C:\n    pass\nc = C()\nc.x = 1', {'c': ['C']}),
+    ('d = {}\nd["k"] = 1', {'d': ['dict']}),
+    ('class C:\n    def __init__(self):\n        self.x, y = 1, 2\nc = C()', {'C__init__y': ['int'], 'c': ['C']}),
+])
+def test_attribute_and_subscript_targets_are_not_sites(source, expected):
+    assert recorded_types(source) == expected
+
+
+def test_site_collector_matches_transformer():
+    source = 'a, (b, *c) = 1, (2, 3)\nx = y = 0\nclass C:\n    def f(self):\n        self.z, w = 1, 2\n'
+    transformer = RttiTransformer('m.py')
+    transformer.visit(ast.parse(source))
+    collector = RttiSiteCollector('m.py')
+    collector.visit(ast.parse(source))
+    assert collector.site_names() == transformer.site_names() == \
+        ['m.pya', 'm.pyb', 'm.pyc', 'm.pyx', 'm.pyy', 'm.pyCfw']
+    assert collector.site_locations() == transformer.site_locations()
+
+
+def test_loop_countdowns_stay_out_of_module_and_class_namespaces():
+    filename = f'loops{next(_module_numbers)}.py'
+    source = ('for i in range(5):\n'
+              '    x = i\n'
+              'class A:\n'
+              '    for j in range(5):\n'
+              '        y = j\n')
+    module_globals = rtti_globals()
+    exec(instrument_source(source.encode(), filename, RttiLoopTransformer), module_globals)
+    assert [name for name in module_globals if name.startswith('__rtti_loop')] == ['__rtti_loops__']
+    assert not [name for name in vars(module_globals['A']) if name.startswith('__rtti')]
+    summaries = Rtti.site_summaries()
+    assert summaries[f'{filename}For0x'][0] == summaries[f'{filename}AFor0y'][0] == 4
+
+
+def test_async_for_is_guarded():
+    filename = f'loops{next(_module_numbers)}.py'
+    source = ('async def f(items):\n'
+              '    async for item in items:\n'
+              '        x = item\n')
+    module_globals = rtti_globals()
+    exec(instrument_source(source.encode(), filename, RttiLoopTransformer), module_globals)
+
+    async def items():
+        for item in range(10):
+            yield item
+
+    asyncio.run(module_globals['f'](items()))
+    # The first 3 iterations, then the value left on exit
+    assert Rtti.site_summaries()[f'{filename}x'][0] == 4
+
+
+def test_loop_exit_records_only_values_the_loop_assigned():
+    # continue skips the assignment, so x still holds the value from before the loop
+    assert recorded_types('x = "before"\n'
+                          'for i in range(10):\n'
+                          '    continue\n'
+                          '    x = 1\n', RttiLoopTransformer) == {'x': ['str']}
+    # Past the recorded iterations only the exit record sees the str
+    assert recorded_types('x = 0\n'
+                          'for i in range(10):\n'
+                          '    x = i if i < 5 else str(i)\n', RttiLoopTransformer) == \
+        {'x': ['int'], 'For0x': ['int', 'str']}
@@ -98,32 +98,36 @@ class Ui_MainWindow(object):
         self.resetTypeCheckButton = QtWidgets.QPushButton(parent=self.tab_2)
         self.resetTypeCheckButton.setObjectName("resetTypeCheckButton")
         self.gridLayout_2.addWidget(self.resetTypeCheckButton, 1, 1, 1, 1)
-        spacerItem2 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
-        self.gridLayout_2.addItem(spacerItem2, 1, 2, 1, 1)
-        self.runtimeTypeCheckTable = QtWidgets.QTableWidget(parent=self.tab_2)
+        self.typeFilterLine = QtWidgets.QLineEdit(parent=self.tab_2)
+        self.typeFilterLine.setClearButtonEnabled(True)
+        self.typeFilterLine.setObjectName("typeFilterLine")
+        self.gridLayout_2.addWidget(self.typeFilterLine, 1, 2, 1, 1)
+        self.unresolvedOnlyCheck = QtWidgets.QCheckBox(parent=self.tab_2)
+        self.unresolvedOnlyCheck.setObjectName("unresolvedOnlyCheck")
+        self.gridLayout_2.addWidget(self.unresolvedOnlyCheck, 1, 3, 1, 1)
+        self.traceRunCheck = QtWidgets.QCheckBox(parent=self.tab_2)
+        self.traceRunCheck.setObjectName("traceRunCheck")
+        self.gridLayout_2.addWidget(self.traceRunCheck, 1, 4, 1, 1)
+        self.runtimeTypeCheckTable = QtWidgets.QTableView(parent=self.tab_2)
         self.runtimeTypeCheckTable.setEnabled(True)
         self.runtimeTypeCheckTable.setObjectName("runtimeTypeCheckTable")
-        self.runtimeTypeCheckTable.setColumnCount(5)
-        self.runtimeTypeCheckTable.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.runtimeTypeCheckTable.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.runtimeTypeCheckTable.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.runtimeTypeCheckTable.setHorizontalHeaderItem(2, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.runtimeTypeCheckTable.setHorizontalHeaderItem(3, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.runtimeTypeCheckTable.setHorizontalHeaderItem(4, item)
         self.runtimeTypeCheckTable.horizontalHeader().setStretchLastSection(True)
         self.runtimeTypeCheckTable.verticalHeader().setStretchLastSection(False)
-        self.gridLayout_2.addWidget(self.runtimeTypeCheckTable, 0, 0, 1, 3)
+        self.gridLayout_2.addWidget(self.runtimeTypeCheckTable, 0, 0, 1, 5)
         self.startTypeCheckButton = QtWidgets.QPushButton(parent=self.tab_2)
         self.startTypeCheckButton.setObjectName("startTypeCheckButton")
         self.gridLayout_2.addWidget(self.startTypeCheckButton, 1, 0, 1, 1)
         spacerItem3 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Policy.Minimum, QtWidgets.QSizePolicy.Policy.Expanding)
-        self.gridLayout_2.addItem(spacerItem3, 2, 0, 1, 3)
+        self.gridLayout_2.addItem(spacerItem3, 2, 0, 1, 5)
         self.tabWidget.addTab(self.tab_2, "")
+        self.tab_4 = QtWidgets.QWidget()
+        self.tab_4.setObjectName("tab_4")
+        self.gridLayout_6 = QtWidgets.QGridLayout(self.tab_4)
+        self.gridLayout_6.setObjectName("gridLayout_6")
+        self.typeCoverageTree = QtWidgets.QTreeWidget(parent=self.tab_4)
+        self.typeCoverageTree.setObjectName("typeCoverageTree")
+        self.gridLayout_6.addWidget(self.typeCoverageTree, 0, 0, 1, 1)
+        self.tabWidget.addTab(self.tab_4, "")
         self.tab_3 = QtWidgets.QWidget()
         self.tab_3.setObjectName("tab_3")
         self.gridLayout_5 = QtWidgets.QGridLayout(self.tab_3)
@@ -213,19 +217,19 @@ class Ui_MainWindow(object):
         self.stlStandardLibRadio.setText(_translate("MainWindow", "STL"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab), _translate("MainWindow", "Configuration"))
         self.resetTypeCheckButton.setText(_translate("MainWindow", "Reset Type Check"))
+        self.typeFilterLine.setPlaceholderText(_translate("MainWindow", "Filter by module..."))
+        self.unresolvedOnlyCheck.setText(_translate("MainWindow", "Unresolved Only"))
+        self.traceRunCheck.setToolTip(_translate("MainWindow", "Write a timing trace of each phase of the run into the runtime check folder"))
+        self.traceRunCheck.setText(_translate("MainWindow", "Trace Run"))
         self.runtimeTypeCheckTable.setSortingEnabled(True)
-        item = self.runtimeTypeCheckTable.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Local ID"))
-        item = self.runtimeTypeCheckTable.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Scope ID"))
-        item = self.runtimeTypeCheckTable.horizontalHeaderItem(2)
-        item.setText(_translate("MainWindow", "Editor Link"))
-        item = self.runtimeTypeCheckTable.horizontalHeaderItem(3)
-        item.setText(_translate("MainWindow", "Assigned Types"))
-        item = self.runtimeTypeCheckTable.horizontalHeaderItem(4)
-        item.setText(_translate("MainWindow", "C++ Type"))
         self.startTypeCheckButton.setText(_translate("MainWindow", "Start Type Check"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_2), _translate("MainWindow", "Runtime Type Check"))
+        self.typeCoverageTree.setSortingEnabled(True)
+        self.typeCoverageTree.headerItem().setText(0, _translate("MainWindow", "Scope"))
+        self.typeCoverageTree.headerItem().setText(1, _translate("MainWindow", "Sites Run"))
+        self.typeCoverageTree.headerItem().setText(2, _translate("MainWindow", "Hits"))
+        self.typeCoverageTree.headerItem().setText(3, _translate("MainWindow", "Line"))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_4), _translate("MainWindow", "Type Coverage"))
         self.tableWidget.setSortingEnabled(True)
         item = self.tableWidget.horizontalHeaderItem(0)
         item.setText(_translate("MainWindow", "Python Side"))